@@ -0,0 +1,600 @@
+import pandas as pd
+import os
+import re
+import sys
+import json
+import time
+import random
+import sqlite3
+import threading
+from datetime import datetime
+import urllib.error
+import urllib.request
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import google.generativeai as genai
+    GENAI_AVAILABLE = True
+except ImportError:
+    GENAI_AVAILABLE = False
+
+# --- Configuration ---
+# Transactions are sent to the model in batches: the category list and the
+# heuristics go into one prompt followed by dozens of numbered transactions, and
+# the model answers with one JSON object per transaction. Rows the answer does
+# not cover (or gives an unknown category for) are asked about one at a time.
+MODEL_NAME = 'gemini-1.5-flash'
+MODEL_URL_ENV = 'AI_MODEL_URL' # e.g. http://localhost:8765 to use a local stand-in model server
+BATCH_SIZE = 40
+REQUEST_TIMEOUT_SECONDS = 30
+PROMPT_VERSION = 'batch-v1' # Bump when the prompts change
+FALLBACK_CATEGORY = 'NEEDS REVIEW'
+STUB_PORT = 8765
+
+# Batches are dispatched from a thread pool. Every request first takes a token
+# from the model's token bucket (REQUESTS_PER_MINUTE, with bursts of up to
+# MAX_CONCURRENT_REQUESTS), and transient failures (rate limits, server errors,
+# timeouts, dropped connections) are retried with exponential backoff and jitter.
+MAX_CONCURRENT_REQUESTS = 4
+REQUESTS_PER_MINUTE = 60
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+TRANSIENT_HTTP_CODES = {408, 429, 500, 502, 503, 504}
+TRANSIENT_ERROR_NAMES = { # google.api_core exceptions, matched by name so the import stays optional
+    'ResourceExhausted', 'ServiceUnavailable', 'DeadlineExceeded', 'InternalServerError', 'TooManyRequests',
+}
+
+# Answers are cached in SQLite per normalized description and sign of the amount,
+# so a recurring merchant is only ever sent to the model once. An entry is only
+# used for the model and prompt version that produced it.
+AI_CACHE_PATH = "ai_cache.sqlite"
+AI_CACHE_TTL_DAYS = 180
+AI_CACHE_MAX_ENTRIES = 50000 # Least recently used entries are dropped beyond this
+
+# Each categorize_transactions() call is one run. The token counts the model
+# reports (or len/4 estimates when it reports none), request latencies, cache
+# hits and cost of every run are appended to AI_METRICS_PATH. A run stops sending
+# requests once the next one could take it over AI_BUDGET_USD, if that is set:
+# each request holds its prompt's cost plus the expected answer's until it
+# finishes, and is then charged what it actually cost.
+AI_METRICS_PATH = "ai_metrics.jsonl"
+AI_BUDGET_ENV = 'AI_BUDGET_USD' # e.g. 0.50
+PRICE_PER_MILLION_INPUT_TOKENS = 0.075
+PRICE_PER_MILLION_OUTPUT_TOKENS = 0.30
+CHARS_PER_TOKEN = 4 # For estimating tokens the model did not report
+ESTIMATED_OUTPUT_TOKENS_PER_TX = 15 # Per transaction answered; once AI_METRICS_PATH has recorded a run, the measured average is used instead
+
+HEURISTICS = """* **Reimbursements:** If the transaction is income from 'ZELLE', 'VENMO', 'PAYPAL', or a person's name, it is likely a reimbursement. Categorize it as **'Income: Reimbursement'**.
+    * **Transfers vs. Income:** Deposits from major banks like 'BANK OF AMERICA', 'CHASE', etc. are likely a **'Transfer'**.
+    * **Credit Card Payments:** Payments made to credit cards (e.g., 'AMEX EPAYMENT', 'CHASE CREDIT CRD') are always a **'Transfer'**.
+    * **Waived Fees/Refunds:** Transactions with 'WAIVED', 'REVERSAL', or 'REFUND' are not income. Categorize these as **'Transfer'**.
+    * **Ambiguous Checks:** If the description is just 'CHECK', it must be **'NEEDS REVIEW'** unless a specific rule applies."""
+
+class BudgetExceededError(Exception):
+    """Raised instead of sending a request that could take a run over its AI budget."""
+
+# --- Models ---
+# A model is {'name', 'url'} for a local HTTP stand-in (POST {"prompt"} -> {"text"})
+# or {'name', 'client'} for the Gemini API, plus the 'bucket' that rate-limits it.
+
+def get_model(model_name=MODEL_NAME):
+    """The model to use: the local server named by AI_MODEL_URL if set, otherwise Gemini."""
+    url = os.environ.get(MODEL_URL_ENV)
+    if url:
+        return {'name': f"{model_name}@{url}", 'url': url, 'bucket': token_bucket()}
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    if not api_key:
+        raise KeyError("GOOGLE_API_KEY not found.")
+    if not GENAI_AVAILABLE:
+        raise ImportError("google-generativeai is not installed.")
+    genai.configure(api_key=api_key)
+    return {'name': model_name, 'client': genai.GenerativeModel(model_name), 'bucket': token_bucket()}
+
+def token_bucket(per_minute=REQUESTS_PER_MINUTE, burst=MAX_CONCURRENT_REQUESTS):
+    """A token bucket shared by every request to one model."""
+    return {'rate': per_minute / 60.0, 'capacity': float(burst), 'tokens': float(burst),
+            'updated': time.monotonic(), 'lock': threading.Lock()}
+
+def _take_token(bucket):
+    """Blocks until the bucket has a token and takes it."""
+    while True:
+        with bucket['lock']:
+            now = time.monotonic()
+            bucket['tokens'] = min(bucket['capacity'], bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+            bucket['updated'] = now
+            if bucket['tokens'] >= 1:
+                bucket['tokens'] -= 1
+                return
+            wait = (1 - bucket['tokens']) / bucket['rate']
+        time.sleep(wait)
+
+def is_transient(error):
+    """True for failures worth retrying: rate limits, server errors, timeouts and dropped connections."""
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in TRANSIENT_HTTP_CODES
+    if isinstance(error, (urllib.error.URLError, TimeoutError, ConnectionError)):
+        return True
+    return type(error).__name__ in TRANSIENT_ERROR_NAMES
+
+def generate(model, prompt, timeout=REQUEST_TIMEOUT_SECONDS, transactions=1):
+    """
+    Sends one prompt (asking about this many transactions) and returns the response
+    text. Waits for the model's rate limit and retries transient failures with
+    exponential backoff; other errors (and the last transient one) are raised.
+    """
+    metrics = model.get('metrics')
+    for attempt in range(MAX_RETRIES + 1):
+        if model.get('bucket') is not None:
+            _take_token(model['bucket'])
+        reserved = _reserve(metrics, prompt, transactions) if metrics is not None else 0.0
+        start = time.perf_counter()
+        try:
+            text, usage = _send(model, prompt, timeout)
+        except Exception as e:
+            if metrics is not None:
+                _record(metrics, reserved, time.perf_counter() - start, retry=attempt < MAX_RETRIES and is_transient(e))
+            if attempt == MAX_RETRIES or not is_transient(e):
+                raise
+            delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+            print(f"  -> Transient AI error ({type(e).__name__}: {e}); retrying in {delay:.1f}s...")
+            time.sleep(delay)
+        else:
+            if metrics is not None:
+                _record(metrics, reserved, time.perf_counter() - start, prompt, text, usage, transactions=transactions)
+            return text
+
+def _send(model, prompt, timeout):
+    """One request, with a timeout. Returns (text, (input_tokens, output_tokens) or None if not reported)."""
+    if 'url' in model:
+        request = urllib.request.Request(
+            model['url'], data=json.dumps({'prompt': prompt}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            answer = json.loads(response.read().decode('utf-8'))
+        usage = answer.get('usage')
+        return answer['text'], (usage['input_tokens'], usage['output_tokens']) if usage else None
+    response = model['client'].generate_content(prompt, request_options={'timeout': timeout})
+    usage = getattr(response, 'usage_metadata', None)
+    return response.text, (usage.prompt_token_count, usage.candidates_token_count) if usage else None
+
+# --- Usage accounting ---
+
+def token_cost(input_tokens, output_tokens):
+    """The price of a request in dollars."""
+    return (input_tokens * PRICE_PER_MILLION_INPUT_TOKENS + output_tokens * PRICE_PER_MILLION_OUTPUT_TOKENS) / 1_000_000
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+def run_budget():
+    """The per-run budget in dollars from AI_BUDGET_USD, or None for no limit."""
+    value = os.environ.get(AI_BUDGET_ENV, '').strip()
+    return float(value) if value else None
+
+def new_run_metrics(budget=None, output_tokens_per_tx=ESTIMATED_OUTPUT_TOKENS_PER_TX):
+    """The counters for one run, shared by its request threads."""
+    return {
+        'lock': threading.Lock(), 'budget': budget, 'budget_exceeded': False, 'reserved': 0.0, 'cost': 0.0,
+        'output_tokens_per_tx': output_tokens_per_tx, 'sent': 0,
+        'requests': 0, 'failed_requests': 0, 'retries': 0, 'estimated_requests': 0,
+        'input_tokens': 0, 'output_tokens': 0, 'latencies': [],
+    }
+
+def _reserve(metrics, prompt, transactions=1):
+    """
+    Checks the budget before a request and holds its estimated cost (the prompt plus
+    an answer for each of its transactions) until it completes, so requests in
+    flight on other threads count against the budget too.
+    """
+    cost = token_cost(estimate_tokens(prompt), transactions * metrics['output_tokens_per_tx'])
+    with metrics['lock']:
+        if metrics['budget'] is not None and metrics['cost'] + metrics['reserved'] + cost > metrics['budget']:
+            metrics['budget_exceeded'] = True
+            raise BudgetExceededError(f"the AI budget of ${metrics['budget']:.4f} for this run is spent")
+        metrics['reserved'] += cost
+    return cost
+
+def _record(metrics, reserved, latency, prompt=None, text=None, usage=None, retry=False, transactions=0):
+    """
+    Adds one finished request (text is None for a failed one) to the run's
+    counters, charging its actual cost in place of the reservation.
+    """
+    with metrics['lock']:
+        metrics['reserved'] -= reserved
+        metrics['requests'] += 1
+        metrics['latencies'].append(latency)
+        if text is None:
+            metrics['failed_requests'] += 1
+            metrics['retries'] += int(retry)
+            return
+        if usage is None:
+            usage = (estimate_tokens(prompt), estimate_tokens(text))
+            metrics['estimated_requests'] += 1
+        metrics['sent'] += transactions
+        metrics['input_tokens'] += usage[0]
+        metrics['output_tokens'] += usage[1]
+        metrics['cost'] += token_cost(*usage)
+
+def budget_spent(model):
+    """True once a request of the model's current run was refused for going over budget."""
+    metrics = model.get('metrics')
+    return metrics is not None and metrics['budget_exceeded']
+
+def finish_run(metrics, model_name, rows, keys, cached_rows, answered, seconds, path=AI_METRICS_PATH):
+    """
+    Appends the run's usage to the metrics file, prints a summary and returns the
+    record. 'sent' counts the transactions in requests that completed (one asked
+    again on its own counts again), so tokens / sent is the cost of asking about one.
+    """
+    latencies = sorted(metrics['latencies'])
+    record = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'tool': os.path.basename(sys.argv[0]) or 'python',
+        'model': model_name,
+        'prompt_version': PROMPT_VERSION,
+        'batch_size': BATCH_SIZE,
+        'rows': rows,
+        'distinct': keys,
+        'cache_hit_rows': cached_rows,
+        'cache_hit_rate': round(cached_rows / rows, 4) if rows else 0.0,
+        'sent': metrics['sent'],
+        'answered': answered,
+        'requests': metrics['requests'],
+        'failed_requests': metrics['failed_requests'],
+        'retries': metrics['retries'],
+        'estimated_requests': metrics['estimated_requests'],
+        'input_tokens': metrics['input_tokens'],
+        'output_tokens': metrics['output_tokens'],
+        'cost': round(metrics['cost'], 6),
+        'budget': metrics['budget'],
+        'budget_exceeded': metrics['budget_exceeded'],
+        'latency_mean_ms': round(1000 * sum(latencies) / len(latencies), 1) if latencies else 0.0,
+        'latency_p95_ms': round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 1) if latencies else 0.0,
+        'seconds': round(seconds, 2),
+    }
+    if path:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+    estimated = f" ({record['estimated_requests']} estimated)" if record['estimated_requests'] else ''
+    print(f"  -> AI usage: {record['requests']} request(s), {record['input_tokens']} input / {record['output_tokens']} output tokens{estimated}, "
+          f"${record['cost']:.4f}; cache hit rate {record['cache_hit_rate']:.0%}; mean latency {record['latency_mean_ms']:.0f} ms.")
+    if record['budget_exceeded']:
+        print(f"⚠️ The AI budget of ${record['budget']:.4f} was reached; transactions not yet sent were marked '{FALLBACK_CATEGORY}'.")
+    return record
+
+def read_metrics(path=AI_METRICS_PATH):
+    """Reads the recorded runs, oldest first."""
+    if not os.path.exists(path):
+        return []
+    runs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                runs.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return runs
+
+def measured_tokens_per_transaction(path=AI_METRICS_PATH):
+    """Average (input, output) tokens per transaction sent, over every recorded run, or None before the first."""
+    runs = [run for run in read_metrics(path) if run['sent']]
+    sent = sum(run['sent'] for run in runs)
+    if not sent:
+        return None
+    return sum(run['input_tokens'] for run in runs) / sent, sum(run['output_tokens'] for run in runs) / sent
+
+def print_metrics_report(path=AI_METRICS_PATH, last=20):
+    """Prints the most recent runs and the totals over all of them."""
+    runs = read_metrics(path)
+    if not runs:
+        print(f"No AI runs recorded in '{path}' yet.")
+        return
+    print(f"{'Time':<19} | {'Tool':<24} | {'Rows':>5} | {'Cache':>5} | {'Sent':>5} | {'Reqs':>4} | {'Fail':>4} | {'In tok':>8} | {'Out tok':>7} | {'Cost':>8} | {'Mean ms':>7}")
+    for run in runs[-last:]:
+        print(f"{run['timestamp']:<19} | {run['tool'][:24]:<24} | {run['rows']:>5} | {run['cache_hit_rate']:>5.0%} | {run['sent']:>5} | "
+              f"{run['requests']:>4} | {run['failed_requests']:>4} | {run['input_tokens']:>8} | {run['output_tokens']:>7} | "
+              f"${run['cost']:>7.4f} | {run['latency_mean_ms']:>7.0f}{' (budget reached)' if run['budget_exceeded'] else ''}")
+
+    rows = sum(run['rows'] for run in runs)
+    cost = sum(run['cost'] for run in runs)
+    print(f"\n{len(runs)} run(s): {rows} transaction(s), cache hit rate {sum(run['cache_hit_rows'] for run in runs) / rows if rows else 0:.0%}, "
+          f"{sum(run['requests'] for run in runs)} request(s), total cost ${cost:.4f}.")
+    measured = measured_tokens_per_transaction(path)
+    if measured:
+        sent = sum(run['sent'] for run in runs)
+        print(f"Per transaction sent: {measured[0]:.0f} input / {measured[1]:.0f} output tokens, ${cost / sent:.6f}.")
+
+# --- Prompts ---
+
+def _transaction_type(amount):
+    return "Income" if pd.notna(amount) and amount > 0 else "Expense/Transfer"
+
+def build_single_prompt(description, amount, categories):
+    """The prompt for one transaction; the answer is the bare category name."""
+    return f"""You are an expert financial categorization assistant. Your task is to analyze a transaction and select the single most appropriate category from the provided list. Follow these rules carefully:
+
+1.  **Analyze the Transaction:**
+    * Transaction Type: {_transaction_type(amount)}
+    * Transaction Description: "{description}"
+
+2.  **Apply These Heuristics First:**
+    {HEURISTICS}
+
+3.  **Select a Category:**
+    * Choose the single best category from this list: {', '.join(categories)}
+    * Only return the category name.
+
+Selected Category:"""
+
+def build_batch_prompt(transactions, categories):
+    """The prompt for a batch of (id, description, amount) transactions; the answer is a JSON array."""
+    lines = '\n'.join(
+        f"{transaction_id} | {_transaction_type(amount)} | {json.dumps(str(description))}"
+        for transaction_id, description, amount in transactions
+    )
+    return f"""You are an expert financial categorization assistant. Your task is to select the single most appropriate category for each transaction below from the provided list. Follow these rules carefully:
+
+1.  **Apply These Heuristics First:**
+    {HEURISTICS}
+
+2.  **Categories:** {', '.join(categories)}
+
+3.  **Transactions** (one per line: id | type | description):
+{lines}
+
+4.  **Answer** with only a JSON array holding one object per transaction, e.g. [{{"id": 1, "category": "Food: Restaurants"}}]. Use the category names exactly as listed.
+
+Answer:"""
+
+def parse_batch_response(text, transaction_ids, categories):
+    """Reads {id: category} from a batch answer, keeping only known ids with listed categories."""
+    wanted, allowed = set(transaction_ids), set(categories)
+    entries = []
+    start, end = text.find('['), text.rfind(']')
+    if start != -1 and end > start:
+        try:
+            entries = [(e.get('id'), e.get('category')) for e in json.loads(text[start:end + 1]) if isinstance(e, dict)]
+        except json.JSONDecodeError:
+            entries = []
+    if not entries: # Tolerate "id: category" lines from a model that ignored the format
+        entries = re.findall(r'^\s*(\d+)\s*[:|\-]\s*"?([^"\n]+?)"?\s*$', text, flags=re.MULTILINE)
+
+    results = {}
+    for transaction_id, category in entries:
+        try:
+            transaction_id = int(transaction_id)
+        except (TypeError, ValueError):
+            continue
+        category = str(category).strip()
+        if transaction_id in wanted and category in allowed:
+            results[transaction_id] = category
+    return results
+
+# --- Answer cache ---
+
+def normalize_description(description):
+    """
+    The cache key for a description: upper-cased, with tokens that contain digits
+    (store numbers, dates, reference codes) and punctuation removed. A description
+    made only of such tokens keeps them all, so unrelated references do not share a key.
+    """
+    words = [word for word in re.split(r'[^A-Z0-9&]+', str(description).upper()) if word]
+    return ' '.join(word for word in words if not any(ch.isdigit() for ch in word)) or ' '.join(words)
+
+def amount_sign(amount):
+    """1 for income, -1 for expenses and transfers (the distinction the prompts make)."""
+    return 1 if pd.notna(amount) and amount > 0 else -1
+
+def open_cache(path=AI_CACHE_PATH):
+    """Opens (and if needed creates) the answer cache and drops expired entries."""
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS answers (description TEXT NOT NULL, sign INTEGER NOT NULL, "
+        "category TEXT NOT NULL, model TEXT NOT NULL, prompt_version TEXT NOT NULL, "
+        "created_at REAL NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (description, sign))"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON answers (last_used)")
+    conn.execute("DELETE FROM answers WHERE created_at < ?", (time.time() - AI_CACHE_TTL_DAYS * 86400,))
+    conn.commit()
+    return conn
+
+def cache_lookup(conn, keys, model_name):
+    """Returns {(description, sign): category} for the keys cached by this model and prompt version."""
+    found = {}
+    for description, sign in keys:
+        if not description:
+            continue # A blank description says nothing worth caching
+        row = conn.execute(
+            "SELECT category FROM answers WHERE description = ? AND sign = ? AND model = ? AND prompt_version = ?",
+            (description, sign, model_name, PROMPT_VERSION),
+        ).fetchone()
+        if row:
+            found[(description, sign)] = row[0]
+    now = time.time()
+    conn.executemany("UPDATE answers SET last_used = ? WHERE description = ? AND sign = ?", [(now, d, s) for d, s in found])
+    conn.commit()
+    return found
+
+def cache_store(conn, answers, model_name):
+    """Stores {(description, sign): category} answers and trims the cache to AI_CACHE_MAX_ENTRIES."""
+    now = time.time()
+    conn.executemany(
+        "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(d, s, category, model_name, PROMPT_VERSION, now, now) for (d, s), category in answers.items() if d],
+    )
+    conn.execute(
+        "DELETE FROM answers WHERE rowid IN (SELECT rowid FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+        (AI_CACHE_MAX_ENTRIES,),
+    )
+    conn.commit()
+
+# --- Categorization ---
+
+def _ask_single(model, description, amount, categories):
+    """One single-transaction request: the model's category, or None if it failed or answered off-list."""
+    try:
+        category = generate(model, build_single_prompt(description, amount, categories), transactions=1).strip()
+    except BudgetExceededError:
+        return None
+    except Exception as e:
+        print(f"  -> AI Error ({type(e).__name__}: {e}). Defaulting to '{FALLBACK_CATEGORY}'.")
+        return None
+    return category if category in categories else None
+
+def categorize_single(model, description, amount, categories):
+    """Asks the model about one transaction; an error or unknown answer gives FALLBACK_CATEGORY."""
+    return _ask_single(model, description, amount, categories) or FALLBACK_CATEGORY
+
+def categorize_batch(model, transactions, categories):
+    """
+    Categorizes (id, description, amount) transactions in one request and returns
+    {id: category}; ids the model could not answer for are left out.
+    """
+    if budget_spent(model):
+        return {}
+    try:
+        text = generate(model, build_batch_prompt(transactions, categories), transactions=len(transactions))
+        results = parse_batch_response(text, [t[0] for t in transactions], categories)
+    except BudgetExceededError:
+        return {}
+    except Exception as e:
+        print(f"  -> AI Error on a batch of {len(transactions)} ({type(e).__name__}: {e}). Asking one at a time.")
+        results = {}
+    missing = [t for t in transactions if t[0] not in results]
+    if missing and len(transactions) > 1:
+        print(f"  -> {len(missing)} transaction(s) were missing from the answer. Asking one at a time.")
+    for transaction_id, description, amount in missing:
+        if budget_spent(model):
+            break
+        category = _ask_single(model, description, amount, categories)
+        if category is not None:
+            results[transaction_id] = category
+    return results
+
+def categorize_transactions(model, df, categories, description_column='Description', amount_column='Amount',
+                            batch_size=BATCH_SIZE, cache_path=AI_CACHE_PATH, max_workers=MAX_CONCURRENT_REQUESTS,
+                            budget=None, metrics_path=AI_METRICS_PATH):
+    """
+    Categorizes every row of df and returns a Series of categories. Rows are keyed
+    by normalized description and sign: cached keys are answered locally, and each
+    remaining key is sent once, batch_size per request, with up to max_workers
+    requests in flight. Pass cache_path=None to skip the cache. No request is sent
+    that could take the run over budget dollars (default: AI_BUDGET_USD, if set).
+    The run's usage is appended to metrics_path.
+    """
+    started = time.perf_counter()
+    measured = measured_tokens_per_transaction(metrics_path) if metrics_path else None
+    model['metrics'] = new_run_metrics(budget if budget is not None else run_budget(),
+                                       measured[1] if measured else ESTIMATED_OUTPUT_TOKENS_PER_TX)
+    keys = [(normalize_description(d), amount_sign(a)) for d, a in zip(df[description_column], df[amount_column])]
+    pending = {}
+    for key, description, amount in zip(keys, df[description_column], df[amount_column]):
+        pending.setdefault(key, (description, amount)) # One representative row per key
+
+    conn = open_cache(cache_path) if cache_path else None
+    try:
+        answers = cache_lookup(conn, pending, model['name']) if conn is not None else {}
+        cached_rows = sum(key in answers for key in keys)
+        if answers:
+            print(f"  -> {cached_rows} of {len(keys)} transaction(s) were answered from the AI cache.")
+
+        to_ask = [key for key in pending if key not in answers]
+        transactions = [(i + 1, *pending[key]) for i, key in enumerate(to_ask)]
+        batches = [transactions[i:i + batch_size] for i in range(0, len(transactions), batch_size)]
+        results = {}
+        if batches:
+            print(f"  -> Sending {len(transactions)} transaction(s) to AI in {len(batches)} batch(es), {max_workers} at a time...")
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = [pool.submit(categorize_batch, model, batch, categories) for batch in batches]
+            for done, future in enumerate(as_completed(futures), start=1):
+                results.update(future.result())
+                print(f"  -> {done}/{len(batches)} batch(es) done.")
+        unanswered = len(transactions) - len(results)
+        if unanswered and not budget_spent(model):
+            print(f"⚠️ {unanswered} transaction(s) could not be categorized by AI and were marked '{FALLBACK_CATEGORY}'.")
+        finish_run(model['metrics'], model['name'], len(keys), len(pending), cached_rows, len(results),
+                   time.perf_counter() - started, metrics_path)
+
+        new_answers = {to_ask[transaction_id - 1]: category for transaction_id, category in results.items()}
+        if conn is not None:
+            cache_store(conn, new_answers, model['name'])
+        answers.update(new_answers)
+    finally:
+        model.pop('metrics', None)
+        if conn is not None:
+            conn.close()
+
+    return pd.Series([answers.get(key, FALLBACK_CATEGORY) for key in keys], index=df.index, dtype=object)
+
+# --- Local stand-in model server ---
+
+def _stub_answer(prompt):
+    """A deterministic answer: the first listed category whose first word appears in the description."""
+    categories_line = re.search(r'\*\*Categories:\*\* (.*)', prompt) or re.search(r'from this list: (.*)', prompt)
+    categories = categories_line.group(1).split(', ') if categories_line else []
+    def guess(description):
+        words = set(re.findall(r'[A-Z]+', description.upper()))
+        return next((c for c in categories if c.split(':')[0].split(' ')[0].upper() in words), FALLBACK_CATEGORY)
+
+    rows = re.findall(r'^(\d+) \| [^|]+ \| (".*")$', prompt, flags=re.MULTILINE)
+    if rows:
+        return json.dumps([{'id': int(i), 'category': guess(json.loads(d))} for i, d in rows])
+    single = re.search(r'Transaction Description: "(.*)"', prompt)
+    return guess(single.group(1)) if single else FALLBACK_CATEGORY
+
+def serve_stub(port=STUB_PORT, delay=0.0, failure_rate=0.0):
+    """
+    Runs a local stand-in model server for trying out the AI path without an API key.
+    Each answer can be delayed, and a share of requests can fail with HTTP 503 to
+    exercise the retries.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+            time.sleep(delay)
+            if random.random() < failure_rate:
+                self.send_error(503, "Stand-in model is overloaded")
+                return
+            text = _stub_answer(body['prompt'])
+            usage = {'input_tokens': estimate_tokens(body['prompt']), 'output_tokens': estimate_tokens(text)}
+            answer = json.dumps({'text': text, 'usage': usage}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(answer)))
+            self.end_headers()
+            self.wfile.write(answer)
+
+        def log_message(self, format, *args):
+            pass
+
+    print(f"✅ Stand-in model listening on http://localhost:{port} (set {MODEL_URL_ENV}=http://localhost:{port}).")
+    ThreadingHTTPServer(('localhost', port), Handler).serve_forever()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'serve-stub':
+        serve_stub(
+            int(sys.argv[2]) if len(sys.argv) > 2 else STUB_PORT,
+            float(sys.argv[3]) if len(sys.argv) > 3 else 0.0,
+            float(sys.argv[4]) if len(sys.argv) > 4 else 0.0,
+        )
+    elif command == 'cache':
+        with closing(open_cache()) as conn:
+            total = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            print(f"{total} cached AI answer(s) in '{AI_CACHE_PATH}':")
+            for model_name, version, count in conn.execute("SELECT model, prompt_version, COUNT(*) FROM answers GROUP BY 1, 2"):
+                print(f" {count:>7} | {model_name} | prompt {version}")
+    elif command == 'metrics':
+        print_metrics_report()
+    elif command == 'clear-cache':
+        with closing(open_cache()) as conn:
+            conn.execute("DELETE FROM answers")
+            conn.commit()
+        print("✅ AI answer cache cleared.")
+    else:
+        print("Usage: python ai_categorizer.py serve-stub [port] [delay_seconds] [failure_rate] | metrics | cache | clear-cache")
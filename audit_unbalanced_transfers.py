@@ -2,6 +2,7 @@ import pandas as pd
 import os
 import sys
 from datetime import timedelta
+from ledger_store import load_ledger, ledger_exists, ledger_cents
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -15,17 +16,16 @@ def audit_unbalanced_transfers():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Unbalanced Transfer Auditor ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH)
+        df = load_ledger(MASTER_FILE_PATH, columns=['Date', 'Account', 'Description', 'Amount', 'Category'], for_update=True)
         print(f"✅ Master file loaded. Analyzing {len(df)} transactions...")
 
         # --- Data Preparation ---
-        df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce').fillna(0)
-        df['Date'] = pd.to_datetime(df['Date'])
+        df['Amount'] = df['Amount'].fillna(0)
         df['Category'] = df['Category'].fillna('Uncategorized')
 
     except Exception as e:
@@ -51,21 +51,17 @@ def audit_unbalanced_transfers():
 
     print(f"\nFound {len(outgoing_from_checking)} outgoing transfers from '{CHECKING_ACCOUNT_NAME}'. Searching for matches...")
 
-    unmatched_transfers = []
-
-    for index, row in outgoing_from_checking.iterrows():
-        date_min = row['Date'] - timedelta(days=5)
-        date_max = row['Date'] + timedelta(days=5)
-        amount_to_match = abs(row['Amount'])
-
-        # Search for a matching incoming transfer
-        match = incoming_to_others[
-            (incoming_to_others['Amount'].round(2) == round(amount_to_match, 2)) &
-            (incoming_to_others['Date'].between(date_min, date_max))
-        ]
-
-        if match.empty:
-            unmatched_transfers.append(row)
+    # Join outgoing and incoming transfers on the exact amount in cents, then keep
+    # the pairs that are within 5 days of each other
+    candidates = pd.DataFrame({
+        'row': outgoing_from_checking.index, 'Date': outgoing_from_checking['Date'].values,
+        'cents': (-ledger_cents(outgoing_from_checking)).values,
+    }).merge(
+        pd.DataFrame({'Date_in': incoming_to_others['Date'].values, 'cents': ledger_cents(incoming_to_others).values}),
+        on='cents',
+    )
+    matched = candidates.loc[(candidates['Date_in'] - candidates['Date']).abs() <= timedelta(days=5), 'row']
+    unmatched_transfers = [row for _, row in outgoing_from_checking[~outgoing_from_checking.index.isin(matched)].iterrows()]
 
     # --- Display the Report ---
     if not unmatched_transfers:
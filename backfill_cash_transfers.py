@@ -3,6 +3,7 @@ import os
 import sys
 import hashlib
 from datetime import datetime
+from ledger_store import load_ledger, save_ledger, ledger_exists, ledger_cents, to_cents
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -18,19 +19,17 @@ def backfill_cash_transfers():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Cash Transfer Backfill Tool ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH)
+        df = load_ledger(MASTER_FILE_PATH, for_update=True)
         print(f"✅ Master file loaded. Analyzing {len(df)} transactions...")
 
-        # Prepare data for processing
-        df['Description'] = df['Description'].astype(str)
-        df['Category'] = df['Category'].astype(str)
-        df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce').fillna(0)
-        df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
+        # Prepare data for processing (dates as text, which the deposit IDs are built from)
+        df['Amount'] = df['Amount'].fillna(0)
+        df['Date'] = df['Date'].dt.strftime('%Y-%m-%d')
 
 
     except Exception as e:
@@ -60,7 +59,7 @@ def backfill_cash_transfers():
     # Get a snapshot of existing cash deposits for checking against
     existing_cash_deposits = df[df['Account'] == 'Cash'].copy()
     if not existing_cash_deposits.empty:
-        existing_cash_deposits['Amount'] = existing_cash_deposits['Amount'].abs()
+        existing_cash_deposits['Cents'] = ledger_cents(existing_cash_deposits).abs()
 
 
     for index, row in withdrawals_to_process.iterrows():
@@ -72,7 +71,7 @@ def backfill_cash_transfers():
         if not existing_cash_deposits.empty:
             match_exists = not existing_cash_deposits[
                 (existing_cash_deposits['Date'] == date) &
-                (existing_cash_deposits['Amount'].round(2) == round(amount, 2))
+                (existing_cash_deposits['Cents'] == to_cents(amount))
             ].empty
 
         if match_exists:
@@ -115,7 +114,7 @@ def backfill_cash_transfers():
 
     # Save the updated master file
     if indices_to_update or new_cash_transactions:
-        df.to_csv(MASTER_FILE_PATH, index=False, encoding='utf-8-sig')
+        save_ledger(df, MASTER_FILE_PATH)
         print(f"\n✅ Success! Master file updated. It now contains {len(df)} transactions.")
         print("You can now run 'step4_review.py' to see the new unreviewed cash transfers.")
     else:
@@ -2,7 +2,8 @@ import pandas as pd
 import os
 import sys
 import uuid
-from datetime import timedelta
+from ledger_store import load_ledger, save_ledger, ledger_exists, pair_transactions
+from ledger_history import current_version
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -17,12 +18,12 @@ def backfill_reconciliation_ids():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Reconciliation ID Backfill Utility ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH, parse_dates=['Date'])
+        df = load_ledger(MASTER_FILE_PATH, for_update=True)
         print(f"✅ Master file loaded with {len(df)} transactions.")
 
         # --- Step 1: Add the new column if it doesn't exist ---
@@ -50,39 +51,24 @@ def backfill_reconciliation_ids():
         # --- Step 3: Match pairs and assign IDs ---
         matched_count = 0
         
-        # Iterate through the credits and look for a matching debit
-        for credit_idx, credit_row in credits.iterrows():
+        # Each credit takes the earliest free debit of the exact opposite amount (a hash
+        # join on Amount_Cents) within the date window
+        for credit_idx, debit_idx in pair_transactions(credits, debits, DATE_MATCHING_WINDOW_DAYS):
+            credit_row, match_row = credits.loc[credit_idx], debits.loc[debit_idx]
             
-            # Create a search window for dates
-            min_date = credit_row['Date'] - timedelta(days=DATE_MATCHING_WINDOW_DAYS)
-            max_date = credit_row['Date'] + timedelta(days=DATE_MATCHING_WINDOW_DAYS)
+            # Generate a unique Reconciliation ID
+            rec_id = f"REC-{uuid.uuid4().hex[:12]}"
             
-            # Find potential matches based on amount and date window
-            potential_matches = debits[
-                (debits['Amount'].round(2) == -round(credit_row['Amount'], 2)) &
-                (debits['Date'].between(min_date, max_date))
-            ]
-
-            if not potential_matches.empty:
-                # Get the first available match
-                match_row = potential_matches.iloc[0]
-                
-                # Generate a unique Reconciliation ID
-                rec_id = f"REC-{uuid.uuid4().hex[:12]}"
-                
-                # Get original DataFrame indices for the matched pair
-                original_credit_idx = credit_row['index']
-                original_debit_idx = match_row['index']
-                
-                # Update the main DataFrame with the new ID
-                df.loc[original_credit_idx, 'ReconciliationID'] = rec_id
-                df.loc[original_debit_idx, 'ReconciliationID'] = rec_id
-                
-                print(f" -> Matched credit of {credit_row['Amount']:.2f} on {credit_row['Date'].date()} with debit of {match_row['Amount']:.2f} on {match_row['Date'].date()}. ID: {rec_id}")
-                
-                # Remove the matched debit from the pool to prevent re-matching
-                debits.drop(match_row.name, inplace=True)
-                matched_count += 1
+            # Get original DataFrame indices for the matched pair
+            original_credit_idx = credit_row['index']
+            original_debit_idx = match_row['index']
+            
+            # Update the main DataFrame with the new ID
+            df.loc[original_credit_idx, 'ReconciliationID'] = rec_id
+            df.loc[original_debit_idx, 'ReconciliationID'] = rec_id
+            
+            print(f" -> Matched credit of {credit_row['Amount']:.2f} on {credit_row['Date'].date()} with debit of {match_row['Amount']:.2f} on {match_row['Date'].date()}. ID: {rec_id}")
+            matched_count += 1
         
         # --- Step 4: Report and Save ---
         print(f"\n--- Summary ---")
@@ -94,8 +80,10 @@ def backfill_reconciliation_ids():
         else:
             print("✅ All transfers were successfully paired.")
             
-        df.to_csv(MASTER_FILE_PATH, index=False, encoding='utf-8-sig')
+        undo_version = current_version(MASTER_FILE_PATH)
+        save_ledger(df, MASTER_FILE_PATH)
         print(f"\nMaster file has been updated and saved to '{MASTER_FILE_PATH}'.")
+        print(f"   To undo this run: python ledger_history.py restore {undo_version}")
 
     except Exception as e:
         print(f"\n❌ An unexpected error occurred: {e}")
@@ -2,6 +2,7 @@ import pandas as pd
 import os
 import sys
 import re
+from ledger_store import load_ledger, save_ledger, ledger_exists, filter_new_transactions, ledger_cents, amount_cents
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -43,12 +44,12 @@ def batch_recover_credits():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Batch Missing Credit Recovery Tool ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
     try:
-        df_master = pd.read_csv(MASTER_FILE_PATH, dtype={'Category': 'object', 'ReconciliationID': 'object'})
+        df_master = load_ledger(MASTER_FILE_PATH, for_update=True)
         
         # --- Identify all unmatched debits for the target accounts ---
         df_master_copy = df_master.copy()
@@ -61,7 +62,7 @@ def batch_recover_credits():
             (df_master_copy['Destination'].isin(ACCOUNTS_TO_RECOVER_MAP.keys()))
         )
         target_debits = df_master_copy[unmatched_debits_mask]
-        target_amounts = set(abs(target_debits['Amount']).round(2))
+        target_amounts = set(ledger_cents(target_debits).abs().dropna())
 
         if not target_amounts:
             print("\nNo unmatched debits found for target accounts. Nothing to do.")
@@ -71,7 +72,6 @@ def batch_recover_credits():
 
         # --- Search Source Files for Missing Transactions by Prompting for Each ---
         found_transactions = []
-        existing_ids = set(df_master['TransactionID'])
 
         for simple_name, account_name in ACCOUNTS_TO_RECOVER_MAP.items():
             prompt = f"\nPlease provide the path for the processed '{account_name}' file (or press Enter to skip): "
@@ -94,11 +94,10 @@ def batch_recover_credits():
                     continue
 
                 df_source['Amount'] = pd.to_numeric(df_source['Amount'], errors='coerce')
-                potential_matches = df_source[abs(df_source['Amount']).round(2).isin(target_amounts)]
+                potential_matches = df_source[amount_cents(df_source['Amount']).abs().isin(target_amounts)]
                 
-                for index, row in potential_matches.iterrows():
-                    if row['TransactionID'] not in existing_ids:
-                        found_transactions.append(row)
+                for index, row in filter_new_transactions(potential_matches, MASTER_FILE_PATH).iterrows():
+                    found_transactions.append(row)
             except Exception as e:
                 print(f" -> Warning: Could not process file {os.path.basename(file_path)}. Error: {e}")
 
@@ -114,7 +113,7 @@ def batch_recover_credits():
         confirm = input("\nDo you want to add these transactions to your master file? (y/n): ").lower()
         if confirm == 'y':
             df_final = pd.concat([df_master, df_to_append], ignore_index=True)
-            df_final.to_csv(MASTER_FILE_PATH, index=False, encoding='utf-8-sig')
+            save_ledger(df_final, MASTER_FILE_PATH)
             print(f"\n✅ Success! Added {len(df_to_append)} transactions. Master file now has {len(df_final)} total transactions.")
             print("It's highly recommended to run the 'backfill_reconciliation_ids.py' script now to link these new credits.")
         else:
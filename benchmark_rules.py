@@ -0,0 +1,231 @@
+import pandas as pd
+import os
+import sys
+import time
+import tempfile
+from ledger_store import load_ledger, ledger_exists
+import rule_engine
+
+# --- Configuration ---
+MASTER_FILE_PATH = "master_transactions.csv"
+RULES_FILE_PATH = "rules.json"
+REPEATS = 3 # Each timing is the best of this many runs
+
+def best_time(function):
+    """Runs the function REPEATS times and returns (best seconds, last result)."""
+    best, result = None, None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+# --- Baselines ---
+# Copies of the rule matchers the scripts had before rule_engine.py, kept here so
+# the engine is always timed against what it replaced.
+
+def step3_check_condition(condition, row):
+    """step3_categorizer.py / step4_review.py check_condition, as it was."""
+    if 'field' not in condition:
+        return False
+    field = condition['field']
+    operator = condition['operator']
+    value = condition['value']
+    row_value = row.get(field)
+    if pd.isna(row_value):
+        return False
+    if isinstance(row_value, str):
+        row_value_upper = row_value.upper()
+        value_upper = str(value).upper()
+    else:
+        row_value_upper = row_value
+        value_upper = value
+    if operator == 'contains':
+        return value_upper in row_value_upper
+    elif operator == 'not_contains':
+        return value_upper not in row_value_upper
+    elif operator == 'equals':
+        if isinstance(row_value, float):
+            return abs(row_value - value) < 0.001
+        return row_value == value
+    elif operator == 'greater_than':
+        return row_value > value
+    elif operator == 'less_than':
+        return row_value < value
+    return False
+
+def debugger_check_condition(condition, row):
+    """rule_debugger.py check_condition, as it was (string comparisons, no greater/less than)."""
+    if 'field' not in condition: return False
+    field, operator, value = condition['field'], condition['operator'], condition['value']
+    row_value = row.get(field)
+    if pd.isna(row_value): return False
+
+    row_value_upper = str(row_value).upper()
+    value_upper = str(value).upper()
+
+    if operator == 'contains': return value_upper in row_value_upper
+    if operator == 'not_contains': return value_upper not in row_value_upper
+    if operator == 'equals':
+        if isinstance(row_value, float): return abs(row_value - float(value)) < 0.001
+        return row_value_upper == value_upper
+    return False
+
+def old_evaluate_conditions(conditions, row, check_condition):
+    """The recursive all_of/any_of walk every script carried."""
+    if 'all_of' in conditions:
+        return all(old_evaluate_conditions(cond, row, check_condition) for cond in conditions['all_of'])
+    if 'any_of' in conditions:
+        return any(old_evaluate_conditions(cond, row, check_condition) for cond in conditions['any_of'])
+    return check_condition(conditions, row)
+
+def old_structured_walk(df, rules_data, check_condition):
+    """Index of the first matching rule per row (-1 for none) with one of the old check_condition copies."""
+    first = []
+    for _, row in df.iterrows():
+        first.append(next((i for i, rule in enumerate(rules_data['rules']) if old_evaluate_conditions(rule['conditions'], row, check_condition)), -1))
+    return pd.Series(first, index=df.index, dtype='int64')
+
+def legacy_key_match(row, rules):
+    """generate_rules.py find_matching_rule over "ACCOUNT=NAME&KW1&KW2|AMOUNT=12.34" keys, as it was."""
+    desc_upper = str(row.get('Description', '')).upper()
+    account_upper = str(row.get('Account', '')).upper()
+    amount = row.get('Amount', 0.0)
+
+    for rule_key, category in rules.items():
+        rule_account, rule_keywords_str = None, rule_key
+        amount_condition = None
+
+        if "|AMOUNT=" in rule_keywords_str:
+            rule_keywords_str, amount_str = rule_keywords_str.split("|AMOUNT=", 1)
+            try:
+                amount_condition = float(amount_str)
+            except ValueError:
+                continue
+
+        if "ACCOUNT=" in rule_keywords_str:
+            parts = rule_keywords_str.split('&', 1)
+            rule_account = parts[0].replace('ACCOUNT=', '').strip().upper()
+            rule_keywords_str = parts[1] if len(parts) > 1 else ''
+
+        if rule_account and rule_account != account_upper:
+            continue
+
+        keywords = [k.strip().upper() for k in rule_keywords_str.split('&') if k.strip()]
+
+        if all(k in desc_upper for k in keywords):
+            if amount_condition is None or amount == amount_condition:
+                return rule_key, category
+
+    return None, None
+
+def _legacy_alternatives(conditions):
+    """
+    The ways a condition tree can match, as (account, keywords, amount) tuples, or
+    None if it uses anything a legacy key cannot say.
+    """
+    if 'any_of' in conditions:
+        alternatives = [_legacy_alternatives(cond) for cond in conditions['any_of']]
+        return None if any(a is None for a in alternatives) else [alt for a in alternatives for alt in a]
+    if 'all_of' in conditions:
+        combined = [(None, (), None)]
+        for cond in conditions['all_of']:
+            alternatives = _legacy_alternatives(cond)
+            if alternatives is None:
+                return None
+            merged = []
+            for account, keywords, amount in combined:
+                for other_account, other_keywords, other_amount in alternatives:
+                    if (account and other_account) or (amount is not None and other_amount is not None):
+                        return None
+                    merged.append((account or other_account, keywords + other_keywords, amount if amount is not None else other_amount))
+            combined = merged
+        return combined
+    field, operator, value = conditions.get('field'), conditions.get('operator'), conditions.get('value')
+    if field == 'Description' and operator == 'contains' and '&' not in str(value) and '|' not in str(value):
+        return [(None, (str(value).upper(),), None)]
+    if field == 'Account' and operator == 'equals':
+        return [(str(value).upper(), (), None)]
+    if field == 'Amount' and operator == 'equals':
+        return [(None, (), float(value))]
+    return None
+
+def legacy_keys(rules_data):
+    """The rules that can be written as legacy keys, as the {rule_key: category} mapping the old scripts loaded."""
+    keys = {}
+    for rule in rules_data['rules']:
+        for account, keywords, amount in _legacy_alternatives(rule['conditions']) or []:
+            if not keywords:
+                continue # The old matcher needs at least one keyword to be meaningful
+            key = '&'.join(([f"ACCOUNT={account}"] if account else []) + list(keywords))
+            if amount is not None:
+                key += f"|AMOUNT={amount}"
+            keys.setdefault(key, rule['category'])
+    return keys
+
+def legacy_walk(df, keys):
+    """The category each row gets from the legacy key matcher (None for no match)."""
+    return pd.Series([legacy_key_match(row, keys)[1] for _, row in df.iterrows()], index=df.index, dtype=object)
+
+def row_by_row(df, rules_data, candidate_index=None):
+    """rule_engine's per-row reference walk (optionally over candidate rules only)."""
+    first = [rule_engine.find_matching_rule(row, rules_data, candidate_index)[0] for _, row in df.iterrows()]
+    return pd.Series([-1 if i is None else i for i in first], index=df.index, dtype='int64')
+
+def report(title, results, reference_name):
+    """Prints each path's time, its speed-up over the first one, and whether it agrees with the reference."""
+    print(title)
+    baseline = next(iter(results.values()))[0]
+    reference = results[reference_name][1]
+    for name, (seconds, result) in results.items():
+        same = result.reindex(reference.index).astype(object).fillna('') == reference.astype(object).fillna('')
+        agrees = '✅' if same.all() else f"❌ {int((~same).sum())} row(s) differ"
+        print(f"  {name:<44} {seconds * 1000:>10.1f} ms  {baseline / seconds:>8.1f}x  {agrees}")
+
+def main():
+    """Times the old per-script rule matchers and every rule_engine path over the ledger and checks that they agree."""
+    print("--- Rule Engine Benchmark ---")
+    if not ledger_exists(MASTER_FILE_PATH):
+        print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
+        sys.exit(1)
+
+    df = load_ledger(MASTER_FILE_PATH)
+    accounts = df['Account'].dropna().unique()
+    rules_data = rule_engine.load_rules(RULES_FILE_PATH, accounts)
+    print(f"{len(df)} transactions, {len(rules_data['rules'])} rules, best of {REPEATS} runs.\n")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # The memo is kept in a scratch file so the live rules.cache.json is left alone
+        cache_path = os.path.join(tmp_dir, 'rules.cache.json')
+        results['Old step3/step4 check_condition walk'] = best_time(lambda: old_structured_walk(df, rules_data, step3_check_condition))
+        results['Old rule_debugger check_condition walk'] = best_time(lambda: old_structured_walk(df, rules_data, debugger_check_condition))
+        results['Engine row by row'] = best_time(lambda: row_by_row(df, rules_data))
+        results['Engine row by row, candidate index'] = best_time(lambda: row_by_row(df, rules_data, rule_engine.build_candidate_index(rules_data)))
+        results['Engine compiled masks'] = best_time(lambda: rule_engine.first_matching_rules(df, rules_data))
+        rule_engine.cached_first_matching_rules(df, rules_data, path=cache_path) # Fill the memo once
+        results['Engine compiled masks + memo (warm)'] = best_time(lambda: rule_engine.cached_first_matching_rules(df, rules_data, path=cache_path))
+
+        new_rule = {"category": "NEEDS REVIEW", "conditions": {"all_of": [{"field": "Description", "operator": "contains", "value": "BENCHMARK"}]}}
+        extended = {"rules": rules_data['rules'] + [new_rule]}
+        session = rule_engine.first_match_state(df, rules_data, cache_path=cache_path)
+        def incremental():
+            state = {**session, 'signatures': list(session['signatures'])}
+            return rule_engine.refresh_first_matches(state, df, extended)
+        results['Engine incremental rescan (one new rule)'] = best_time(incremental)
+    report("Structured rules (rules.json):", results, 'Engine row by row')
+
+    keys = legacy_keys(rules_data)
+    legacy_rules = rule_engine.convert_legacy_rules(keys, accounts)
+    categories = lambda first: first.map(lambda i: legacy_rules['rules'][i]['category'] if i >= 0 else None)
+    legacy_results = {
+        'Old legacy-key matcher (generate_rules)': best_time(lambda: legacy_walk(df, keys)),
+    }
+    seconds, first = best_time(lambda: rule_engine.first_matching_rules(df, legacy_rules))
+    legacy_results['Engine compiled masks on the converted keys'] = (seconds, categories(first))
+    print()
+    report(f"Legacy rule keys ({len(keys)} keys from the rules that can be written that way):", legacy_results, 'Old legacy-key matcher (generate_rules)')
+
+if __name__ == "__main__":
+    main()
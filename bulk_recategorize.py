@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+from ledger_store import load_ledger, save_ledger, ledger_exists
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -13,12 +14,12 @@ def main():
     """
     print("--- Bulk Re-categorizer ---")
     
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         return
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH)
+        df = load_ledger(MASTER_FILE_PATH, for_update=True)
         
         # Create a 'mask' to find all rows where the 'Description' contains the keyword (case-insensitive)
         mask = df['Description'].str.contains(KEYWORD_TO_FIND, case=False, na=False)
@@ -36,7 +37,7 @@ def main():
         df.loc[mask, 'Category'] = NEW_CATEGORY
         
         # Save the modified DataFrame back to the master file
-        df.to_csv(MASTER_FILE_PATH, index=False)
+        save_ledger(df, MASTER_FILE_PATH)
         
         print(f"✅ Success! {count} transactions have been re-categorized to '{NEW_CATEGORY}'.")
         
@@ -1,6 +1,7 @@
 import pandas as pd
 import os
 import sys
+from ledger_store import load_ledger, ledger_exists
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -19,12 +20,12 @@ def run_data_integrity_audit():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Data Integrity Audit Tool ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH, dtype={'Category': 'object', 'ReconciliationID': 'object'})
+        df = load_ledger(MASTER_FILE_PATH, columns=['Date', 'Account', 'Description', 'Amount', 'Category', 'ReconciliationID'])
         print(f"✅ Master file loaded. Auditing {len(df)} transactions...\n")
 
         # --- 1. Identify Miscategorized 'Transfer' Transactions ---
@@ -76,7 +77,7 @@ def run_data_integrity_audit():
         if not df_unmatched.empty:
             print(f"Found {len(df_unmatched)} true transfer transactions that remain unmatched:")
             # --- FIX: Corrected the syntax for the .agg() function ---
-            summary = df_unmatched.groupby('Account')['Amount'].agg(
+            summary = df_unmatched.groupby('Account', observed=True)['Amount'].agg(
                 Credit_Count=lambda x: (x > 0).sum(),
                 Unmatched_Credits=lambda x: x[x > 0].sum(),
                 Debit_Count=lambda x: (x < 0).sum(),
@@ -1,6 +1,7 @@
 import pandas as pd
 import os
 from datetime import timedelta
+from ledger_store import load_ledger, ledger_exists, ledger_cents, to_cents
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -14,13 +15,12 @@ def debug_unmatched_pairs():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Unmatched Transfer Pair Debugger ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         return
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH, dtype={'ReconciliationID': 'object'})
-        df['Date'] = pd.to_datetime(df['Date'], format='mixed')
+        df = load_ledger(MASTER_FILE_PATH, columns=['Date', 'Account', 'Amount', 'Category', 'ReconciliationID'])
 
         if 'ReconciliationID' not in df.columns:
             print(" -> 'ReconciliationID' column not found. Nothing to debug.")
@@ -50,7 +50,7 @@ def debug_unmatched_pairs():
 
             # Search for credits with the exact opposite amount, regardless of date
             potential_matches = unmatched_credits[
-                abs(unmatched_credits['Amount'] - target_credit_amount) < 0.01
+                ledger_cents(unmatched_credits) == to_cents(target_credit_amount)
             ]
 
             if not potential_matches.empty:
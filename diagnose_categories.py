@@ -1,17 +1,18 @@
 import pandas as pd
 import os
+from ledger_store import load_ledger, ledger_exists
 
 MASTER_FILE_PATH = "master_transactions.csv"
 
 def main():
     print("--- Category Diagnoser ---")
     
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         return
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH)
+        df = load_ledger(MASTER_FILE_PATH, columns=['Category'])
         
         # Drop rows where the category is empty to focus on filled ones
         unique_categories = df['Category'].dropna().unique()
@@ -1,6 +1,7 @@
 import pandas as pd
 import os
 import sys
+from ledger_store import load_ledger, ledger_exists
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -15,12 +16,12 @@ def export_data_for_rule_generation():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Rule Generation Data Exporter ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH)
+        df = load_ledger(MASTER_FILE_PATH, columns=COLUMNS_TO_EXPORT)
         print(f"✅ Master file loaded. Found {len(df)} transactions.")
 
         # Check if all required columns exist in the master file
@@ -1,6 +1,8 @@
 import pandas as pd
 import os
 import sys
+from ledger_store import load_ledger, save_ledger, ledger_exists
+from ledger_history import current_version
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -16,13 +18,14 @@ def fix_payment_polarity():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Polarity Correction Utility ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH)
-        print(f"✅ Master file loaded with {len(df)} transactions.")
+        # Only this account's partitions are read and written back.
+        df = load_ledger(MASTER_FILE_PATH, for_update=True, accounts=[ACCOUNT_TO_FIX])
+        print(f"✅ Master file loaded with {len(df)} '{ACCOUNT_TO_FIX}' transactions.")
 
         # --- Identify Transactions to Fix ---
         # Find transactions for the specific account and category that are incorrectly negative.
@@ -52,8 +55,10 @@ def fix_payment_polarity():
             df.loc[fix_mask, 'Amount'] = df.loc[fix_mask, 'Amount'].abs()
 
             # --- Save the Corrected File ---
-            df.to_csv(MASTER_FILE_PATH, index=False, encoding='utf-8-sig')
+            undo_version = current_version(MASTER_FILE_PATH)
+            save_ledger(df, MASTER_FILE_PATH, accounts=[ACCOUNT_TO_FIX])
             print(f"\n✅ Success! The polarity for {len(transactions_to_fix)} transaction(s) has been corrected in '{MASTER_FILE_PATH}'.")
+            print(f"   To undo this run: python ledger_history.py restore {undo_version}")
         else:
             print("\nOperation cancelled. No changes were made.")
 
@@ -1,5 +1,7 @@
 import pandas as pd
 import os
+from ledger_store import load_ledger, save_ledger, ledger_exists
+from ledger_history import current_version
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -14,14 +16,14 @@ def fix_venmo_reviewed_status():
     print("--- Venmo Reviewed Status Correction Tool ---")
 
     # Check if the master file exists
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         print("Please ensure the script is in the same directory as your master_transactions.csv.")
         return
 
     try:
         # Read the master CSV file into a pandas DataFrame
-        df = pd.read_csv(MASTER_FILE_PATH)
+        df = load_ledger(MASTER_FILE_PATH, for_update=True)
         print("✅ Master file loaded successfully.")
 
         # --- Core Logic ---
@@ -42,8 +44,10 @@ def fix_venmo_reviewed_status():
 
             # Save the modified DataFrame back to the original CSV file
             # index=False prevents pandas from writing a new index column
-            df.to_csv(MASTER_FILE_PATH, index=False, encoding='utf-8-sig')
+            undo_version = current_version(MASTER_FILE_PATH)
+            save_ledger(df, MASTER_FILE_PATH)
             print(f"✅ Success! The file '{MASTER_FILE_PATH}' has been updated.")
+            print(f"   To undo this run: python ledger_history.py restore {undo_version}")
             print("\nYou can now run the main 'step3_categorizer.py' script again.")
         else:
             print("✅ No corrections needed. All relevant Venmo transactions are already marked as not reviewed.")
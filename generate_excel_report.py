@@ -3,30 +3,31 @@ import os
 import sys
 from datetime import datetime
 import re
+from ledger_store import load_ledger, ledger_exists
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
 OUTPUT_EXCEL_FILE = "financial_dashboard.xlsx"
 
-def generate_excel_dashboard():
+def generate_excel_dashboard(report_years=None):
     """
     Reads the master transaction file and generates a comprehensive, multi-sheet
     Excel dashboard with yearly summaries, comparisons, and detailed drill-downs.
+    Pass `report_years` to read and report on only those years' partitions.
     """
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Financial Dashboard Generator ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH)
+        df = load_ledger(MASTER_FILE_PATH, for_update=True, years=report_years)
         print(f"✅ Master file loaded. Analyzing {len(df)} transactions...")
 
         # --- Data Preparation ---
-        df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce').fillna(0)
-        df['Date'] = pd.to_datetime(df['Date'], format='mixed')
+        df['Amount'] = df['Amount'].fillna(0)
         df['Year'] = df['Date'].dt.year
         df['Category'] = df['Category'].fillna('Uncategorized')
         
@@ -38,11 +39,12 @@ def generate_excel_dashboard():
     with pd.ExcelWriter(OUTPUT_EXCEL_FILE, engine='xlsxwriter') as writer:
         
         years = sorted(df['Year'].unique())
+        summary_sizes = {}
         
-        # --- 1. Generate Report for Each Year ---
-        for year in years:
+        # --- 1. Generate Report for Each Year (one pass over the ledger via groupby) ---
+        for year, yearly_data in df.groupby('Year', sort=True):
             print(f" -> Processing data for {year}...")
-            yearly_data = df[df['Year'] == year].copy()
+            yearly_data = yearly_data.copy()
             
             # --- NEW, DEFINITIVE SUMMARIZATION LOGIC ---
             # This method is the most robust, as it calculates all metrics at once
@@ -81,6 +83,7 @@ def generate_excel_dashboard():
             
             transfer_audit_start_row = len(operational_summary) + 4
             transfer_audit.to_excel(writer, sheet_name=sheet_name, index=False, startrow=transfer_audit_start_row)
+            summary_sizes[year] = (len(operational_summary), len(transfer_audit))
 
         # --- 2. Write Master Data and Drill-Downs ---
         print(" -> Writing master data sheet...")
@@ -90,10 +93,12 @@ def generate_excel_dashboard():
 
         print(" -> Creating drill-down sheets for each category...")
         all_categories = sorted(df['Category'].unique())
+        category_counts = {}
         
-        for category in all_categories:
+        for category, category_df in df.groupby('Category', sort=True):
             sheet_name = f"Details_{re.sub('[^A-Za-z0-9]+', '', category)[:22]}"
-            category_df = df[df['Category'] == category].sort_values(by='Date')
+            category_df = category_df.sort_values(by='Date')
+            category_counts[category] = len(category_df)
             total_amount = category_df['Amount'].sum()
             
             # Prepare df for writing
@@ -114,6 +119,7 @@ def generate_excel_dashboard():
         
         for year in years:
             worksheet = writer.sheets[f'{year}_Summary']
+            operational_rows, transfer_rows = summary_sizes[year]
             worksheet.set_column('A:A', 25)
             worksheet.set_column('B:E', 18, money_format)
 
@@ -123,13 +129,13 @@ def generate_excel_dashboard():
                 worksheet.write(1, col_num, value, header_format)
 
             # Format Transfer Audit
-            transfer_audit_header_row = len(operational_summary) + 4
+            transfer_audit_header_row = operational_rows + 4
             worksheet.write(transfer_audit_header_row - 1, 0, 'Inter-Account Transfer Audit', section_header_format)
             for col_num, value in enumerate(transfer_audit.columns.values):
                 worksheet.write(transfer_audit_header_row, col_num, value, header_format)
             
             # Make the total row bold
-            worksheet.conditional_format(f'A{transfer_audit_header_row + len(transfer_audit)}:E{transfer_audit_header_row + len(transfer_audit)}', {'type': 'no_blanks', 'format': bold_money_format})
+            worksheet.conditional_format(f'A{transfer_audit_header_row + transfer_rows}:E{transfer_audit_header_row + transfer_rows}', {'type': 'no_blanks', 'format': bold_money_format})
         
         for category in all_categories:
             sheet_name = f"Details_{re.sub('[^A-Za-z0-9]+', '', category)[:22]}"
@@ -140,11 +146,12 @@ def generate_excel_dashboard():
             worksheet.set_column('D:D', 12, money_format)
             
             # Find the total row and apply bold formatting
-            last_row_index = len(df[df["Category"] == category]) + 2
+            last_row_index = category_counts[category] + 2
             worksheet.conditional_format(f'A{last_row_index}:D{last_row_index}', {'type': 'no_blanks', 'format': bold_money_format})
 
     print("\n✅ Dashboard generated successfully!")
 
 if __name__ == "__main__":
-    generate_excel_dashboard()
+    # Optional years, e.g. 'python generate_excel_report.py 2025', limit the report to those years.
+    generate_excel_dashboard([int(y) for y in sys.argv[1:]] or None)
 
@@ -2,6 +2,7 @@ import pandas as pd
 import os
 import sys
 import re
+from ledger_store import load_ledger, ledger_exists
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -36,15 +37,13 @@ def generate_checklist():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Missing Statement Checklist Generator ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH, dtype={'Category': 'object', 'ReconciliationID': 'object'})
-        
-        # Ensure the Date column is in datetime format for monthly grouping
-        df['Date'] = pd.to_datetime(df['Date'])
+        df = load_ledger(MASTER_FILE_PATH, columns=['Date', 'Account', 'Description', 'Amount', 'Category', 'ReconciliationID'])
+
 
         # --- Isolate Unmatched Debits from Checking ---
         unmatched_debits_mask = (
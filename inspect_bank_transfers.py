@@ -1,6 +1,7 @@
 import pandas as pd
 import os
 import sys
+from ledger_store import load_ledger, ledger_exists
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -16,20 +17,14 @@ def inspect_bank_side_transfers():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Bank Transfer Status Inspector ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH)
+        df = load_ledger(MASTER_FILE_PATH, columns=['Date', 'Account', 'Description', 'Amount', 'Category', 'Reviewed'], accounts=[CHECKING_ACCOUNT_NAME])
         print(f"✅ Master file loaded. Analyzing {len(df)} transactions...\n")
 
-        if 'Reviewed' not in df.columns:
-            df['Reviewed'] = False
-        df['Reviewed'] = df['Reviewed'].fillna(False).astype(bool)
-        df['Description'] = df['Description'].astype(str)
-        df['Account'] = df['Account'].astype(str)
-
     except Exception as e:
         print(f"❌ An error occurred while processing the master file: {e}")
         return
@@ -1,4 +1,5 @@
 import pandas as pd
+from ledger_store import load_ledger
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -12,7 +13,7 @@ def inspect_account_descriptions():
     print(f"--- Inspecting Unique Descriptions for Account: '{ACCOUNT_TO_INSPECT}' ---")
 
     try:
-        df_master = pd.read_csv(MASTER_FILE_PATH)
+        df_master = load_ledger(MASTER_FILE_PATH, columns=['Account', 'Description'])
     except FileNotFoundError:
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'. Please ensure the file exists.")
         return
@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+from ledger_store import load_ledger, ledger_exists
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -18,18 +19,15 @@ def inspect_data_side_by_side():
     print("--- Reconciliation Data Inspector (with Auto-Fix) ---")
 
     # --- Load Master File and Auto-Fix ---
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         return
 
     try:
-        df_master = pd.read_csv(MASTER_FILE_PATH, dtype={'Category': 'object'})
+        df_master = load_ledger(MASTER_FILE_PATH)
         
         # --- Auto-Fix Logic ---
         print("\nStep 1: Automatically correcting 'Reviewed' status for bank payments...")
-        if 'Reviewed' not in df_master.columns:
-            df_master['Reviewed'] = False
-        df_master['Reviewed'] = df_master['Reviewed'].fillna(False).astype(bool)
 
         # --- FIX: Condition now specifically targets the payment description ---
         fix_condition = (
@@ -2,6 +2,7 @@ import pandas as pd
 import os
 import sys
 import time
+from ledger_store import load_ledger, save_ledger, ledger_exists
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -36,12 +37,12 @@ def recategorize_non_payments():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Interactive Re-Categorizer for Mismatched Transfers ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH, dtype={'Category': 'object'})
+        df = load_ledger(MASTER_FILE_PATH, for_update=True)
 
         # --- UPDATED: Expanded mask to find both types of miscategorized items ---
         cash_mask = df['Description'].str.contains('|'.join(CASH_KEYWORDS), case=False, na=False)
@@ -115,7 +116,7 @@ def recategorize_non_payments():
                 time.sleep(1)
         
         # Save the updated file
-        df.to_csv(MASTER_FILE_PATH, index=False, encoding='utf-8-sig')
+        save_ledger(df, MASTER_FILE_PATH)
         print(f"\n✅ Master file saved. Processed {i} transaction(s).")
 
     except Exception as e:
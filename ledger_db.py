@@ -0,0 +1,248 @@
+import pandas as pd
+import os
+import sys
+import sqlite3
+from contextlib import closing
+from ledger_store import MASTER_FILE_PATH, MASTER_COLUMNS, BOOL_COLUMNS, AMOUNT_CENTS_COLUMN, apply_ledger_types, to_cents
+
+# --- Configuration ---
+# Each ledger column is stored under its own name; dates as ISO text so range
+# queries on the (Account, Amount_Cents, Date) index sort correctly. Amount_Cents
+# is stored next to Amount (kept in step on every write) so money is matched on
+# exact integer equality.
+COLUMN_TYPES = {
+    'Date': 'TEXT', 'Account': 'TEXT', 'Description': 'TEXT', 'Payee': 'TEXT',
+    'Amount': 'REAL', 'Category': 'TEXT', 'Is_Tax_Deductible': 'INTEGER',
+    'Is_Reimbursable': 'INTEGER', 'Source': 'TEXT', 'TransactionID': 'TEXT',
+    'Reviewed': 'INTEGER', 'ReconciliationID': 'TEXT', 'SourceTransactionID': 'TEXT',
+    'Rule_Ignored': 'INTEGER', 'Duplicate_Ignored': 'INTEGER', AMOUNT_CENTS_COLUMN: 'INTEGER'
+}
+DB_COLUMNS = MASTER_COLUMNS + [AMOUNT_CENTS_COLUMN]
+INDEXES = {
+    'idx_transaction_id': ['TransactionID'],
+    'idx_reconciliation_id': ['ReconciliationID'],
+    'idx_account_cents_date': ['Account', AMOUNT_CENTS_COLUMN, 'Date'],
+}
+OLD_INDEXES = ['idx_account_date_amount'] # Replaced by idx_account_cents_date
+LOOKUP_CHUNK_SIZE = 500 # Stays well under SQLite's bound-parameter limit
+# ledger_meta holds the database's version stamp (bumped by every write) and,
+# from the last time it was copied to or from the Parquet/CSV store, both stores'
+# stamps; comparing them tells which store changed since, without file mtimes.
+VERSION_KEY = 'version'
+SYNCED_VERSION_KEY = 'synced_version'
+SYNCED_FILE_VERSION_KEY = 'synced_file_version'
+
+def db_path_for(path):
+    """Returns the SQLite store path that belongs to a legacy CSV ledger path."""
+    return os.path.splitext(path)[0] + '.sqlite'
+
+def connect(path=MASTER_FILE_PATH):
+    """Opens (and if needed creates) the SQLite ledger with its schema and indexes."""
+    conn = sqlite3.connect(db_path_for(path))
+    columns_sql = ', '.join(f'"{col}" {COLUMN_TYPES[col]}' for col in DB_COLUMNS)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS transactions (row_id INTEGER PRIMARY KEY AUTOINCREMENT, {columns_sql})")
+    existing_columns = {row[1] for row in conn.execute("PRAGMA table_info(transactions)")}
+    if AMOUNT_CENTS_COLUMN not in existing_columns: # A database from before Amount_Cents was stored
+        conn.execute(f'ALTER TABLE transactions ADD COLUMN "{AMOUNT_CENTS_COLUMN}" INTEGER')
+        amounts = conn.execute("SELECT row_id, Amount FROM transactions").fetchall()
+        conn.executemany(
+            f'UPDATE transactions SET "{AMOUNT_CENTS_COLUMN}" = ? WHERE row_id = ?',
+            [(to_cents(amount), row_id) for row_id, amount in amounts],
+        )
+    for name in OLD_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    for name, cols in INDEXES.items():
+        cols_sql = ', '.join(f'"{col}"' for col in cols)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON transactions ({cols_sql})")
+    conn.execute("CREATE TABLE IF NOT EXISTS ledger_meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.commit()
+    return conn
+
+def read_meta(conn):
+    """The database's version stamps as {key: value}."""
+    return dict(conn.execute("SELECT key, value FROM ledger_meta"))
+
+def _bump_version(conn):
+    """Moves the version stamp on; called inside every write's transaction."""
+    conn.execute(
+        "INSERT INTO ledger_meta (key, value) VALUES (?, '1') "
+        "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1", (VERSION_KEY,)
+    )
+
+def mark_synced(conn, file_version):
+    """Records that the database and the Parquet/CSV store (at `file_version`) now hold the same ledger."""
+    version = read_meta(conn).get(VERSION_KEY, '0')
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO ledger_meta (key, value) VALUES (?, ?)",
+            [(SYNCED_VERSION_KEY, version), (SYNCED_FILE_VERSION_KEY, str(file_version))],
+        )
+
+def changed_since_sync(conn):
+    """True if the database was written since it was last copied to or from the Parquet/CSV store."""
+    meta = read_meta(conn)
+    return meta.get(VERSION_KEY, '0') != meta.get(SYNCED_VERSION_KEY, '0')
+
+def _to_db_value(col, value):
+    """Converts one DataFrame cell into the value stored in SQLite."""
+    if col in BOOL_COLUMNS:
+        return int(bool(value)) if pd.notna(value) else 0
+    if pd.isna(value):
+        return None
+    if col == 'Date':
+        return pd.Timestamp(value).strftime('%Y-%m-%d')
+    if col == 'Amount':
+        return float(value)
+    if col == AMOUNT_CENTS_COLUMN:
+        return int(value)
+    return str(value)
+
+def _to_records(df):
+    """Turns a ledger DataFrame into rows of values in DB_COLUMNS order."""
+    typed = apply_ledger_types(df, for_update=True)
+    return [
+        tuple(_to_db_value(col, value) for col, value in zip(DB_COLUMNS, row))
+        for row in typed[DB_COLUMNS].itertuples(index=False, name=None)
+    ]
+
+def _with_cents(fields):
+    """Adds the Amount_Cents that goes with an Amount being written."""
+    if 'Amount' in fields:
+        fields = dict(fields, **{AMOUNT_CENTS_COLUMN: to_cents(fields['Amount'])})
+    return fields
+
+def read_ledger(conn, columns=None, where='', params=()):
+    """
+    Reads ledger rows into a typed DataFrame indexed by row_id, so callers can
+    write single-row edits back with update_transaction().
+    """
+    cols_sql = ', '.join(f'"{col}"' for col in MASTER_COLUMNS)
+    query = f"SELECT row_id, {cols_sql} FROM transactions {where} ORDER BY row_id"
+    df = pd.read_sql_query(query, conn, params=params, index_col='row_id')
+    df = apply_ledger_types(df)
+    return df[columns] if columns is not None else df
+
+def scope_clause(years=None, accounts=None):
+    """Builds the WHERE clause that selects a year/account slice of the ledger."""
+    conditions, params = [], []
+    if years is not None:
+        conditions.append(f"substr(Date, 1, 4) IN ({', '.join('?' for _ in years)})")
+        params.extend(str(y) for y in years)
+    if accounts is not None:
+        conditions.append(f"Account IN ({', '.join('?' for _ in accounts)})")
+        params.extend(str(a) for a in accounts)
+    if not conditions:
+        return '', ()
+    return 'WHERE ' + ' AND '.join(conditions), tuple(params)
+
+def replace_ledger(conn, df, where='', params=()):
+    """
+    Replaces the whole ledger (or the slice selected by `where`) in one
+    transaction; used for bulk saves and imports.
+    """
+    with conn:
+        conn.execute(f"DELETE FROM transactions {where}", params)
+        insert_transactions(conn, df, commit=False)
+        _bump_version(conn)
+
+def insert_transactions(conn, df, commit=True):
+    """Inserts new ledger rows and returns the row_ids they were given."""
+    placeholders = ', '.join('?' for _ in DB_COLUMNS)
+    cols_sql = ', '.join(f'"{col}"' for col in DB_COLUMNS)
+    row_ids = []
+    for record in _to_records(df):
+        cursor = conn.execute(f"INSERT INTO transactions ({cols_sql}) VALUES ({placeholders})", record)
+        row_ids.append(cursor.lastrowid)
+    if commit:
+        _bump_version(conn)
+        conn.commit()
+    return row_ids
+
+def update_transaction(conn, row_id, **fields):
+    """Updates the given columns of one ledger row (a primary-key seek)."""
+    if not fields:
+        return
+    fields = _with_cents(fields)
+    assignments = ', '.join(f'"{col}" = ?' for col in fields)
+    values = [_to_db_value(col, value) for col, value in fields.items()]
+    with conn:
+        conn.execute(f"UPDATE transactions SET {assignments} WHERE row_id = ?", values + [int(row_id)])
+        _bump_version(conn)
+
+def update_transactions(conn, updates):
+    """Applies {row_id: {column: value}} updates in one database transaction."""
+    with conn:
+        for row_id, fields in updates.items():
+            if fields:
+                fields = _with_cents(fields)
+                assignments = ', '.join(f'"{col}" = ?' for col in fields)
+                values = [_to_db_value(col, value) for col, value in fields.items()]
+                conn.execute(f"UPDATE transactions SET {assignments} WHERE row_id = ?", values + [int(row_id)])
+        _bump_version(conn)
+
+def delete_transactions(conn, row_ids):
+    """Deletes ledger rows by row_id."""
+    with conn:
+        conn.executemany("DELETE FROM transactions WHERE row_id = ?", [(int(r),) for r in row_ids])
+        _bump_version(conn)
+
+def existing_transaction_ids(conn, transaction_ids):
+    """Returns the subset of `transaction_ids` already in the ledger, via the TransactionID index."""
+    ids = [str(t) for t in pd.unique(pd.Series(transaction_ids).dropna())]
+    found = set()
+    for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+        chunk = ids[start:start + LOOKUP_CHUNK_SIZE]
+        placeholders = ', '.join('?' for _ in chunk)
+        rows = conn.execute(f"SELECT DISTINCT TransactionID FROM transactions WHERE TransactionID IN ({placeholders})", chunk)
+        found.update(row[0] for row in rows)
+    return found
+
+def find_by_transaction_id(conn, transaction_id):
+    """Returns the ledger rows with this TransactionID."""
+    return read_ledger(conn, where="WHERE TransactionID = ?", params=(str(transaction_id),))
+
+def find_by_reconciliation_id(conn, reconciliation_id):
+    """Returns both sides of a reconciled transfer."""
+    return read_ledger(conn, where="WHERE ReconciliationID = ?", params=(str(reconciliation_id),))
+
+def find_transfer_candidates(conn, account, amount, date, window_days):
+    """
+    Returns rows in `account` with exactly this amount (compared in integer cents)
+    dated within `window_days` of `date`. Served by the (Account, Amount_Cents, Date)
+    index instead of a scan of the whole ledger.
+    """
+    date = pd.Timestamp(date)
+    start = (date - pd.Timedelta(days=window_days)).strftime('%Y-%m-%d')
+    end = (date + pd.Timedelta(days=window_days)).strftime('%Y-%m-%d')
+    where = f'WHERE Account = ? AND Date BETWEEN ? AND ? AND "{AMOUNT_CENTS_COLUMN}" = ?'
+    params = (account, start, end, to_cents(amount))
+    return read_ledger(conn, where=where, params=params)
+
+def main():
+    """
+    Command line entry point: build the SQLite store from the current Parquet/CSV
+    ledger, or with 'export' copy the SQLite ledger over the Parquet/CSV store.
+    """
+    import ledger_store
+    command = sys.argv[1] if len(sys.argv) > 1 and sys.argv[1] in ('build', 'export') else 'build'
+    args = [a for a in sys.argv[1:] if a not in ('build', 'export')]
+    path = args[0] if args else MASTER_FILE_PATH
+    if not ledger_store.ledger_exists(path):
+        print(f"❌ ERROR: Master file not found at '{path}'.")
+        sys.exit(1)
+
+    with ledger_store.ledger_lock(path):
+        if command == 'export':
+            rows = ledger_store.copy_sqlite_to_files(path)
+            print(f"✅ Copied {rows} transactions from '{db_path_for(path)}' to the Parquet/CSV ledger.")
+            return
+        with closing(connect(path)) as conn:
+            mark_synced(conn, ledger_store.file_store_version(path)) # The Parquet/CSV ledger wins over SQLite-only edits
+            df = ledger_store.load_file_ledger(path)
+            replace_ledger(conn, df)
+            mark_synced(conn, ledger_store.file_store_version(path))
+    print(f"✅ Imported {len(df)} transactions into '{db_path_for(path)}'.")
+    print("   Set LEDGER_BACKEND=sqlite to make the pipeline scripts use it.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import pandas as pd
+import os
+import sys
+import json
+import hashlib
+from datetime import datetime
+import ledger_store
+from ledger_store import MASTER_FILE_PATH, MASTER_COLUMNS, ledger_exists, ledger_lock
+
+# --- Configuration ---
+# Every save records a version holding only the rows it added and removed (an
+# edited row is one of each). Deltas are stored once per distinct content, and
+# an older version is read by undoing the newer deltas on top of the current
+# ledger, so no full copy of the ledger is ever kept.
+HISTORY_SUFFIX = '_history'
+OP_COLUMN = 'HistoryOp'
+KEY_COLUMN = 'HistoryKey' # content_keys() of the row, so reads need not re-hash it
+
+def history_dir_for(path=MASTER_FILE_PATH):
+    """Returns the version history directory that belongs to a ledger path."""
+    return os.path.splitext(path)[0] + HISTORY_SUFFIX
+
+def _log_path(path):
+    return os.path.join(history_dir_for(path), 'log.jsonl')
+
+def read_log(path=MASTER_FILE_PATH):
+    """Reads the version log, oldest first; a torn final line from a crash is ignored."""
+    log_path = _log_path(path)
+    if not os.path.exists(log_path):
+        return []
+    versions = []
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                versions.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return versions
+
+def current_version(path=MASTER_FILE_PATH):
+    """The number of the latest recorded version (0 before anything was recorded)."""
+    versions = read_log(path)
+    return versions[-1]['version'] if versions else 0
+
+def _multiset_mask(keys, counts):
+    """Marks the first `counts[key]` rows of each key."""
+    return keys.groupby(keys).cumcount() < keys.map(counts).fillna(0)
+
+def diff_ledgers(before, after):
+    """Returns (added, removed): the rows of `after` not in `before`, and the other way round."""
+    before_keys = ledger_store.content_keys(before)
+    after_keys = ledger_store.content_keys(after)
+    kept_in_after = _multiset_mask(after_keys, before_keys.value_counts())
+    kept_in_before = _multiset_mask(before_keys, after_keys.value_counts())
+    return after[~kept_in_after.values], before[~kept_in_before.values]
+
+def _object_path(path, object_name):
+    return os.path.join(history_dir_for(path), 'objects', object_name)
+
+def _write_delta(delta, path):
+    """Stores a delta under the hash of its contents and returns the object name."""
+    keys = (delta[OP_COLUMN] + '|' + delta[KEY_COLUMN]).sort_values()
+    digest = hashlib.sha256('\n'.join(keys).encode('utf-8')).hexdigest()[:40]
+    object_name = digest + ('.parquet' if ledger_store.PARQUET_AVAILABLE else '.csv')
+    object_path = _object_path(path, object_name)
+    if os.path.exists(object_path):
+        return object_name # The same change was recorded before
+
+    os.makedirs(os.path.dirname(object_path), exist_ok=True)
+    def write(tmp_path):
+        if ledger_store.PARQUET_AVAILABLE:
+            delta.to_parquet(tmp_path, index=False)
+        else:
+            delta.to_csv(tmp_path, index=False)
+    ledger_store._replace_file(write, object_path)
+    return object_name
+
+def _read_delta(path, object_name):
+    """Reads a stored delta back as typed ledger rows plus the HistoryOp and HistoryKey columns."""
+    object_path = _object_path(path, object_name)
+    if object_name.endswith('.parquet'):
+        delta = pd.read_parquet(object_path)
+    else:
+        delta = pd.read_csv(object_path, low_memory=False)
+    extra = delta[[OP_COLUMN, KEY_COLUMN]].astype(str)
+    delta = ledger_store.apply_ledger_types(delta)[MASTER_COLUMNS]
+    delta[OP_COLUMN] = extra[OP_COLUMN].values
+    delta[KEY_COLUMN] = extra[KEY_COLUMN].values
+    return delta
+
+def record_changes(added, removed, path=MASTER_FILE_PATH, tool=None):
+    """
+    Appends a version for the given added and removed ledger rows and returns its
+    number, or None if nothing changed.
+    """
+    if added.empty and removed.empty:
+        return None
+    parts = [
+        ledger_store.apply_ledger_types(rows)[MASTER_COLUMNS].assign(**{
+            OP_COLUMN: op, KEY_COLUMN: ledger_store.content_keys(rows).values,
+        })
+        for op, rows in (('added', added), ('removed', removed)) if not rows.empty
+    ]
+    delta = pd.concat(parts, ignore_index=True)
+
+    with ledger_lock(path):
+        entry = {
+            'version': current_version(path) + 1,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'tool': tool or os.path.basename(sys.argv[0]) or 'python',
+            'object': _write_delta(delta, path),
+            'added': len(added),
+            'removed': len(removed),
+        }
+        with open(_log_path(path), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+    return entry['version']
+
+def record_version(before, after, path=MASTER_FILE_PATH, tool=None):
+    """Records the difference between two states of the ledger (or of one slice of it)."""
+    added, removed = diff_ledgers(before, after)
+    return record_changes(added, removed, path, tool)
+
+def rewind(df, as_of, path=MASTER_FILE_PATH, years=None, accounts=None):
+    """
+    Turns the current ledger (or a year/account slice of it) into the ledger as it
+    was right after version `as_of`, by undoing the newer versions newest first.
+    """
+    if as_of < 0 or as_of > current_version(path):
+        raise ValueError(f"Ledger version {as_of} does not exist (latest is {current_version(path)}).")
+    versions = [v for v in read_log(path) if v['version'] > as_of]
+
+    df = ledger_store.apply_ledger_types(df)[MASTER_COLUMNS]
+    keys = ledger_store.content_keys(df)
+    for entry in reversed(versions):
+        delta = _read_delta(path, entry['object'])
+        delta = delta[ledger_store._scope_mask(delta, years, accounts).values]
+        added = delta[delta[OP_COLUMN] == 'added']
+        removed = delta[delta[OP_COLUMN] == 'removed']
+
+        undo = _multiset_mask(keys, added[KEY_COLUMN].value_counts())
+        df, keys = df[~undo.values], keys[~undo.values]
+        df = pd.concat([df, removed[MASTER_COLUMNS]], ignore_index=True)
+        keys = pd.concat([keys, removed[KEY_COLUMN]], ignore_index=True)
+    return ledger_store._finish_loaded(ledger_store.apply_ledger_types(df))
+
+def restore_version(as_of, path=MASTER_FILE_PATH):
+    """Saves the ledger as it was at version `as_of`; this is itself recorded as a new version."""
+    with ledger_lock(path):
+        df = ledger_store.load_ledger(path, for_update=True, as_of=as_of)
+        ledger_store.save_ledger(df, path, tool=f"ledger_history restore {as_of}")
+    return len(df)
+
+def main():
+    """Command line entry point: list versions, show one version's changes, or restore a version."""
+    command = sys.argv[1] if len(sys.argv) > 1 else 'log'
+    if not ledger_exists(MASTER_FILE_PATH):
+        print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
+        sys.exit(1)
+
+    if command in ('show', 'restore') and len(sys.argv) < 3:
+        print(f"Usage: python ledger_history.py {command} <version>")
+        return
+
+    try:
+        if command == 'show':
+            version = int(sys.argv[2])
+            entry = next((v for v in read_log() if v['version'] == version), None)
+            if entry is None:
+                print(f"❌ ERROR: Ledger version {version} does not exist.")
+                return
+            delta = _read_delta(MASTER_FILE_PATH, entry['object'])
+            print(f"--- Version {version}: {entry['tool']} at {entry['timestamp']} ---")
+            for _, row in delta.iterrows():
+                print(f" {row[OP_COLUMN]:<7} | {str(row['Date'])[:10]} | {row['Account']} | {str(row['Description'])[:50]} | {row['Amount']} | {row['Category']}")
+        elif command == 'restore':
+            version = int(sys.argv[2])
+            rows = restore_version(version)
+            print(f"✅ Restored the ledger as of version {version} ({rows} transactions). This was saved as version {current_version()}.")
+        else:
+            versions = read_log()
+            print(f"{len(versions)} recorded ledger version(s):")
+            for v in versions:
+                print(f" {v['version']:>5} | {v['timestamp']} | {v['tool']:<40} | +{v['added']} / -{v['removed']} rows")
+            print("\nUse 'show <version>' to see a version's changes, or 'restore <version>' to go back to it.")
+    except ValueError as e:
+        print(f"❌ ERROR: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+import os
+import sys
+import json
+import hashlib
+import ledger_store
+from ledger_store import MASTER_FILE_PATH, ledger_exists, ledger_signature, load_ledger
+
+# --- Configuration ---
+# A persistent TransactionID index kept next to the ledger: a Bloom filter that
+# answers "definitely new" without touching anything else, backed by a sorted,
+# memory-mapped array of every ID for an exact check of the Bloom hits. Each file
+# is written to a temporary name and renamed into place, and the arrays are
+# checked against meta.json when read, so an interrupted build is rebuilt.
+BLOOM_BITS_PER_ID = 10 # ~1% false positives with 7 hashes
+BLOOM_HASH_COUNT = 7
+BLOOM_MIN_BITS = 1024
+
+def index_dir_for(path=MASTER_FILE_PATH):
+    """Returns the TransactionID index directory that belongs to a ledger path."""
+    return os.path.splitext(path)[0] + '_index'
+
+def _encode_ids(transaction_ids):
+    """Turns IDs into a fixed-width bytes array (the form stored in the index)."""
+    return np.array([str(t).encode('utf-8') for t in transaction_ids], dtype=bytes)
+
+def _bloom_positions(keys, bit_count):
+    """The BLOOM_HASH_COUNT bit positions of each key (double hashing over one blake2b digest)."""
+    digests = b''.join(hashlib.blake2b(k, digest_size=16).digest() for k in keys)
+    halves = np.frombuffer(digests, dtype='<u8').reshape(-1, 2)
+    h1, h2 = halves[:, 0:1], halves[:, 1:2] | np.uint64(1)
+    rounds = np.arange(BLOOM_HASH_COUNT, dtype=np.uint64)
+    return (h1 + rounds * h2) % np.uint64(bit_count)
+
+def build_index(transaction_ids, path=MASTER_FILE_PATH):
+    """Writes the index for the given ledger TransactionIDs (called by save_ledger)."""
+    ids = pd.Series(transaction_ids).dropna()
+    keys = np.unique(_encode_ids(ids))
+    bit_count = max(BLOOM_MIN_BITS, -(-len(keys) * BLOOM_BITS_PER_ID // 8) * 8)
+    bits = np.zeros(bit_count, dtype=bool)
+    if len(keys):
+        bits[_bloom_positions(keys, bit_count).ravel().astype(np.int64)] = True
+
+    index_dir = index_dir_for(path)
+    os.makedirs(index_dir, exist_ok=True)
+    _save_array(keys, os.path.join(index_dir, 'ids.npy'))
+    _save_array(np.packbits(bits), os.path.join(index_dir, 'bloom.npy'))
+    meta = {'count': len(keys), 'bloom_bits': bit_count, 'ledger_signature': ledger_signature(path)}
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+    ledger_store._replace_file(write, os.path.join(index_dir, 'meta.json'))
+    return meta
+
+def _save_array(array, final_path):
+    """np.save through a temporary file and a rename, so a reader never sees a partial array."""
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+    ledger_store._replace_file(write, final_path)
+
+def _read_meta(path):
+    """Reads the index metadata, or None if there is no index."""
+    meta_path = os.path.join(index_dir_for(path), 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _current_meta(path):
+    """Returns up-to-date index metadata, rebuilding the index if the ledger changed without it."""
+    meta = _read_meta(path)
+    signature = json.loads(json.dumps(ledger_signature(path))) # Tuples compare as JSON lists
+    if meta is None or meta['ledger_signature'] != signature:
+        meta = _rebuild(path)
+    return meta
+
+def _rebuild(path):
+    """Rebuilds the index from the ledger's TransactionIDs."""
+    ids = load_ledger(path, columns=['TransactionID'])['TransactionID'] if ledger_exists(path) else []
+    return build_index(ids, path)
+
+def _load_arrays(path, meta):
+    """Loads (Bloom bits, sorted IDs), or None if they are unreadable or do not match the metadata."""
+    index_dir = index_dir_for(path)
+    try:
+        packed = np.load(os.path.join(index_dir, 'bloom.npy'))
+        sorted_ids = np.load(os.path.join(index_dir, 'ids.npy'), mmap_mode='r')
+    except (OSError, ValueError, EOFError):
+        return None
+    if len(packed) * 8 != meta['bloom_bits'] or len(sorted_ids) != meta['count']:
+        return None
+    return np.unpackbits(packed), sorted_ids
+
+def existing_mask(transaction_ids, path=MASTER_FILE_PATH):
+    """
+    Returns a boolean array: True where the TransactionID is already in the ledger.
+    Only IDs that pass the Bloom filter are looked up in the sorted ID array.
+    """
+    transaction_ids = pd.Series(transaction_ids)
+    found = np.zeros(len(transaction_ids), dtype=bool)
+    meta = _current_meta(path)
+    present = transaction_ids.notna().values
+    if meta['count'] == 0 or not present.any():
+        return found
+
+    arrays = _load_arrays(path, meta)
+    if arrays is None: # An interrupted build left arrays that do not match meta.json
+        meta = _rebuild(path)
+        arrays = _load_arrays(path, meta)
+    bits, sorted_ids = arrays
+    keys = _encode_ids(transaction_ids[present])
+    maybe = bits[_bloom_positions(keys, meta['bloom_bits']).astype(np.int64)].all(axis=1)
+    if not maybe.any():
+        return found
+
+    candidates = keys[maybe]
+    fits = np.char.str_len(candidates) <= sorted_ids.dtype.itemsize # Longer IDs cannot be in the index
+    exact = np.zeros(len(candidates), dtype=bool)
+    if fits.any():
+        probe = candidates[fits].astype(sorted_ids.dtype)
+        positions = np.searchsorted(sorted_ids, probe).clip(max=len(sorted_ids) - 1)
+        exact[fits] = sorted_ids[positions] == probe
+
+    present_found = np.zeros(len(keys), dtype=bool)
+    present_found[maybe] = exact
+    found[present] = present_found
+    return found
+
+def main():
+    """Command line entry point: rebuild the index, or check whether IDs are already in the ledger."""
+    command = sys.argv[1] if len(sys.argv) > 1 else 'rebuild'
+    if not ledger_exists(MASTER_FILE_PATH):
+        print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
+        sys.exit(1)
+
+    if command == 'check':
+        ids = sys.argv[2:]
+        for transaction_id, exists in zip(ids, existing_mask(ids)):
+            print(f"{transaction_id}: {'already in the ledger' if exists else 'new'}")
+    else:
+        ids = load_ledger(MASTER_FILE_PATH, columns=['TransactionID'])['TransactionID']
+        meta = build_index(ids)
+        print(f"✅ Indexed {meta['count']} TransactionIDs in '{index_dir_for()}'.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import pandas as pd
+import os
+import sys
+import json
+from datetime import datetime
+from ledger_store import MASTER_FILE_PATH, AMOUNT_CENTS_COLUMN, load_ledger, save_ledger, ledger_exists, row_keys, amount_cents
+from ledger_store import file_store_version
+
+# --- Configuration ---
+# One JSON record per line. Each record is appended and fsync'd as the edit
+# happens, so a crash loses at most the edit being typed. The first line records
+# the version of the ledger the session loaded, and every update or delete keeps
+# the values it replaced (plus the row's identity columns), so a resumed journal
+# can tell which of its edits another tool has since changed underneath it.
+JOURNAL_SUFFIX = '.journal'
+RECORD_KINDS = ['category', 'flip', 'edit', 'delete', 'rule_ignore', 'review', 'duplicate_ignore', 'insert']
+IDENTITY_COLUMNS = ['Date', 'Description', 'Amount']
+MAX_LISTED_CONFLICTS = 20
+MISSING = '<not edited>' # Stands in for the journaled value of a column an edit only recorded
+
+def journal_path_for(path=MASTER_FILE_PATH):
+    """Returns the write-ahead journal path that belongs to a ledger path."""
+    return os.path.splitext(path)[0] + JOURNAL_SUFFIX
+
+def _to_json_value(value):
+    """Makes a ledger cell JSON-safe (timestamps as ISO text, NaN as null)."""
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if hasattr(value, 'item'):
+        value = value.item()
+    return value
+
+def _from_json_value(col, value):
+    """Reverses _to_json_value for a given column."""
+    if col == 'Date' and value is not None:
+        return pd.Timestamp(value)
+    return value
+
+def _same_value(recorded, current):
+    """True if a cell still holds the value the journal recorded (blank text counts as missing)."""
+    recorded, current = _to_json_value(recorded), _to_json_value(current)
+    return (None if recorded == '' else recorded) == (None if current == '' else current)
+
+def old_values(df, idx, columns):
+    """The values an edit of these columns replaces, plus the row's identity columns, for the journal."""
+    return {col: df.at[idx, col] for col in dict.fromkeys(IDENTITY_COLUMNS + list(columns)) if col in df.columns}
+
+def start_journal(version, path=MASTER_FILE_PATH):
+    """Starts an empty journal for a session that loaded the given ledger version (file_store_version())."""
+    with open(journal_path_for(path), 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'ts': datetime.now().isoformat(timespec='seconds'), 'op': 'base', 'version': version}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+def append_record(op, key, fields=None, kind=None, path=MASTER_FILE_PATH, old=None):
+    """
+    Appends one mutation to the journal.
+    op is 'update', 'delete' or 'insert'; key is the row key from row_keys().
+    Updates store the resulting values (e.g. the flipped amount), so replaying
+    a journal twice gives the same ledger; old holds the values they replaced.
+    """
+    append_records([(op, key, fields, kind, old)], path)
+
+def append_records(mutations, path=MASTER_FILE_PATH):
+    """Appends several (op, key, fields, kind, old) mutations with a single fsync (e.g. a rule rescan)."""
+    ts = datetime.now().isoformat(timespec='seconds')
+    lines = [
+        json.dumps({
+            'ts': ts,
+            'op': op,
+            'kind': kind,
+            'key': key,
+            'fields': {col: _to_json_value(value) for col, value in (fields or {}).items()},
+            'old': None if old is None else {col: _to_json_value(value) for col, value in old.items()},
+        }) + '\n'
+        for op, key, fields, kind, old in mutations
+    ]
+    with open(journal_path_for(path), 'a', encoding='utf-8') as f:
+        f.write(''.join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+
+def _read_lines(path):
+    """Every record in the journal, including the 'base' line; a torn final line from a crash is ignored."""
+    journal_path = journal_path_for(path)
+    if not os.path.exists(journal_path):
+        return []
+    records = []
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return records
+
+def read_journal(path=MASTER_FILE_PATH):
+    """Reads the journaled edits."""
+    return [record for record in _read_lines(path) if record['op'] != 'base']
+
+def journal_base_version(path=MASTER_FILE_PATH):
+    """The ledger version the journaled session started from, or None for a journal without one."""
+    return next((record['version'] for record in _read_lines(path) if record['op'] == 'base'), None)
+
+def ledger_changed_since(path=MASTER_FILE_PATH):
+    """True if another tool may have saved the ledger since the journaled session loaded it."""
+    base = journal_base_version(path)
+    return base is None or base != file_store_version(path)
+
+def apply_journal(df, records, keys=None, check=True, overwrite=True):
+    """
+    Replays journal records onto a ledger DataFrame.
+    Returns the updated DataFrame, its row keys (pass `keys` to keep using the
+    keys of an in-memory session rather than recomputing them), the conflicts and
+    the records as applied (their old values taken from df, ready to re-journal).
+
+    With check, every update or delete is first compared with the values it
+    recorded: a (key, column, recorded, current, journaled) conflict is listed for
+    each cell another tool changed since, and for rows that no longer look like the
+    edited row (column is None for a row that is gone). Conflicting edits are
+    applied anyway only if overwrite is set. journaled is MISSING for a column the
+    edit only recorded to identify the row.
+    """
+    keys = row_keys(df) if keys is None else keys.copy()
+    index_by_key = {key: idx for idx, key in keys.items()}
+    renamed = {} # Journaled insert key -> the key it got, if another tool took it meanwhile
+    conflicts, applied = [], []
+
+    for record in records:
+        key = renamed.get(record['key'], record['key'])
+        if record['op'] == 'insert':
+            row = {col: _from_json_value(col, value) for col, value in record['fields'].items()}
+            new_index = (df.index.max() + 1) if len(df) else 0
+            repeat, new_key = 0, key
+            while new_key in index_by_key:
+                repeat += 1
+                new_key = f"{row.get('TransactionID', key)}#{repeat}"
+            renamed[record['key']] = new_key
+            df = pd.concat([df, pd.DataFrame([row], index=[new_index])])
+            keys.loc[new_index] = new_key
+            index_by_key[new_key] = new_index
+            applied.append({**record, 'key': new_key})
+            continue
+
+        idx = index_by_key.get(key)
+        if idx is None or idx not in df.index:
+            if check and record.get('old') is not None:
+                conflicts.append((key, None, None, None, None))
+            continue # Row was already deleted or never reached the base ledger
+
+        old = record.get('old') or {}
+        clashes = [
+            (key, col, value, _to_json_value(df.at[idx, col]), record['fields'].get(col, MISSING))
+            for col, value in old.items() if col in df.columns and not _same_value(value, df.at[idx, col])
+        ] if check else []
+        conflicts.extend(clashes)
+        if clashes and not overwrite:
+            continue
+
+        current = old_values(df, idx, record['fields'])
+        applied.append({**record, 'key': key, 'old': {col: _to_json_value(value) for col, value in current.items()}})
+        if record['op'] == 'delete':
+            df = df.drop(idx)
+            keys = keys.drop(idx)
+            del index_by_key[key]
+        elif record['op'] == 'update':
+            for col, value in record['fields'].items():
+                df.loc[idx, col] = _from_json_value(col, value)
+
+    if AMOUNT_CENTS_COLUMN in df.columns:
+        df[AMOUNT_CENTS_COLUMN] = amount_cents(df['Amount'])
+    return df, keys, conflicts, applied
+
+def rewrite_journal(records, version, path=MASTER_FILE_PATH):
+    """Replaces the journal with the given records on top of a new base version (after a resume)."""
+    start_journal(version, path)
+    append_records([(r['op'], r['key'], r['fields'], r['kind'], r.get('old')) for r in records], path)
+
+def print_conflicts(conflicts, limit=MAX_LISTED_CONFLICTS):
+    """Lists conflicting journal edits: what the edit expected, what the ledger holds now and what it would write."""
+    for key, col, recorded, current, journaled in conflicts[:limit]:
+        if col is None:
+            print(f"   - {key}: the row is no longer in the ledger")
+        elif journaled is MISSING:
+            print(f"   - {key} {col}: was '{recorded}', now '{current}' (the row changed under your edit)")
+        else:
+            print(f"   - {key} {col}: was '{recorded}', now '{current}'; your edit sets '{journaled}'")
+    if len(conflicts) > limit:
+        print(f"   ... and {len(conflicts) - limit} more.")
+
+def discard_journal(path=MASTER_FILE_PATH):
+    """Deletes the journal (after compaction, or when the user abandons a session)."""
+    journal_path = journal_path_for(path)
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+
+def compact_journal(path=MASTER_FILE_PATH, overwrite=False):
+    """
+    Folds the journal into the base ledger and clears it. Returns the number of
+    records applied and the conflicts; if there are conflicts and overwrite is not
+    set, nothing is saved and the journal is kept.
+    """
+    records = read_journal(path)
+    if not records:
+        discard_journal(path)
+        return 0, []
+    df = load_ledger(path, for_update=True)
+    df, _, conflicts, applied = apply_journal(df, records, check=ledger_changed_since(path))
+    if conflicts and not overwrite:
+        return 0, conflicts
+    save_ledger(df, path)
+    discard_journal(path)
+    return len(applied), conflicts
+
+def main():
+    """Command line entry point: show or compact a pending journal."""
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    path = sys.argv[2] if len(sys.argv) > 2 and not sys.argv[2].startswith('--') else MASTER_FILE_PATH
+
+    if not ledger_exists(path):
+        print(f"❌ ERROR: Master file not found at '{path}'.")
+        sys.exit(1)
+
+    records = read_journal(path)
+    if command == 'compact':
+        applied, conflicts = compact_journal(path, overwrite='--overwrite' in sys.argv)
+        if conflicts and not applied:
+            print(f"⚠️ The ledger was changed by another tool since these edits were made; {len(conflicts)} cell(s) conflict:")
+            print_conflicts(conflicts)
+            print("   Nothing was saved. Resume the session in step4_review.py to choose, or run")
+            print("   'python ledger_journal.py compact --overwrite' to write your edits over those cells.")
+            return
+        print(f"✅ Folded {applied} journaled edit(s) into the master ledger.")
+    else:
+        print(f"{len(records)} journaled edit(s) pending in '{journal_path_for(path)}'.")
+        for kind in RECORD_KINDS:
+            count = sum(1 for r in records if r.get('kind') == kind)
+            if count:
+                print(f" - {kind}: {count}")
+
+if __name__ == "__main__":
+    main()
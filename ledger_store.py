@@ -0,0 +1,830 @@
+import pandas as pd
+import os
+import sys
+import re
+import json
+import time
+import hashlib
+from contextlib import closing, contextmanager
+
+try:
+    import pyarrow  # noqa: F401 - only needed for the Parquet store
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# --- Configuration ---
+MASTER_FILE_PATH = "master_transactions.csv"
+MASTER_COLUMNS = [
+    'Date', 'Account', 'Description', 'Payee', 'Amount', 'Category',
+    'Is_Tax_Deductible', 'Is_Reimbursable', 'Source', 'TransactionID', 'Reviewed',
+    'ReconciliationID', 'SourceTransactionID', 'Rule_Ignored', 'Duplicate_Ignored'
+]
+CATEGORICAL_COLUMNS = ['Account', 'Category', 'Source']
+BOOL_COLUMNS = ['Is_Tax_Deductible', 'Is_Reimbursable', 'Reviewed', 'Rule_Ignored', 'Duplicate_Ignored']
+STRING_COLUMNS = ['Description', 'Payee', 'TransactionID', 'ReconciliationID', 'SourceTransactionID']
+# Free-text columns are held as Arrow strings (far smaller than Python str objects) when pyarrow is installed.
+STRING_DTYPE = pd.StringDtype('pyarrow') if PARQUET_AVAILABLE else object
+TRUE_STRINGS = {'true', '1', 'yes', 'y'}
+# 'parquet' (default) or 'sqlite'; the SQLite store is indexed for lookups and single-row edits.
+LEDGER_BACKEND = os.environ.get('LEDGER_BACKEND', 'parquet').strip().lower()
+MANIFEST_FILE_NAME = 'manifest.json'
+UNDATED_PARTITION = 'undated'
+LEDGER_CACHE_SIZE = 8 # Parsed ledgers kept per process, keyed by the store files' mtime and size
+LOCK_TIMEOUT_SECONDS = 60
+# Derived by the loader from Amount (never stored): exact integer cents, so money
+# can be matched with equality, hash joins and sorts instead of float tolerances.
+AMOUNT_CENTS_COLUMN = 'Amount_Cents'
+DERIVED_COLUMNS = [AMOUNT_CENTS_COLUMN]
+
+class LedgerConflictError(Exception):
+    """Raised when this tool and another one changed the same ledger rows in different ways."""
+
+# The Parquet store lives next to the legacy CSV as one file per (year, account)
+# partition plus a manifest of row counts and date ranges, e.g.
+#   master_transactions_partitions/2025/US_Bank_Checking-1a2b3c.parquet
+# The CSV path stays the "name" of the ledger so every script keeps its MASTER_FILE_PATH.
+
+def partition_dir_for(path):
+    """Returns the partitioned Parquet store directory that belongs to a legacy CSV ledger path."""
+    return os.path.splitext(path)[0] + '_partitions'
+
+def manifest_path_for(path):
+    """Returns the path of the partition manifest."""
+    return os.path.join(partition_dir_for(path), MANIFEST_FILE_NAME)
+
+def parquet_path_for(path):
+    """Returns the single-file Parquet store used before the ledger was partitioned."""
+    return os.path.splitext(path)[0] + '.parquet'
+
+def ledger_exists(path=MASTER_FILE_PATH):
+    """True if the ledger exists in the Parquet or SQLite store or as the legacy CSV."""
+    import ledger_db
+    stores = (path, manifest_path_for(path), parquet_path_for(path), ledger_db.db_path_for(path))
+    return any(os.path.exists(p) for p in stores)
+
+def lock_path_for(path):
+    """Returns the advisory lock file that serialises ledger loads and saves."""
+    return os.path.splitext(path)[0] + '.lock'
+
+def _try_lock(f):
+    """Takes the OS lock on an open lock file without waiting (raises OSError if it is held)."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+def _unlock(f):
+    """Releases the OS lock taken by _try_lock."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+_held_locks = {}
+
+@contextmanager
+def ledger_lock(path=MASTER_FILE_PATH):
+    """
+    Holds the ledger's advisory lock for the duration of a load or save, so two
+    tools never read a half-written store or write at the same moment.
+    Re-entrant within a process.
+    """
+    lock_path = os.path.abspath(lock_path_for(path))
+    if _held_locks.get(lock_path):
+        _held_locks[lock_path] += 1
+        try:
+            yield
+        finally:
+            _held_locks[lock_path] -= 1
+        return
+
+    with open(lock_path, 'a+') as f:
+        deadline = time.monotonic() + LOCK_TIMEOUT_SECONDS
+        while True:
+            try:
+                _try_lock(f)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Another tool has held '{lock_path}' for over {LOCK_TIMEOUT_SECONDS} seconds.")
+                time.sleep(0.1)
+        _held_locks[lock_path] = 1
+        try:
+            yield
+        finally:
+            _held_locks[lock_path] = 0
+            _unlock(f)
+
+def _replace_file(write, final_path):
+    """Writes a file through `write(tmp_path)` and renames it into place, so readers never see a partial file."""
+    tmp_path = final_path + '.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, final_path)
+
+def using_sqlite():
+    """True when the pipeline is configured to use the indexed SQLite ledger."""
+    return LEDGER_BACKEND == 'sqlite'
+
+def row_keys(df):
+    """
+    Stable per-row keys for journals and merges: the TransactionID, suffixed '#n'
+    for the n-th repeat of an ID (genuine duplicate charges share an ID).
+    """
+    ids = df['TransactionID'].astype(str)
+    repeat = ids.groupby(ids).cumcount()
+    return ids.where(repeat == 0, ids + '#' + repeat.astype(str))
+
+def _to_object(series):
+    """Plain object column with NaN for missing values, so callers can assign any value."""
+    return series.astype(object).where(series.notna(), float('nan'))
+
+def _to_bool(series):
+    """Coerces a flag column read from CSV (bools, 'True'/'False' strings, blanks) to bool."""
+    if series.dtype == bool:
+        return series
+    return series.map(lambda v: str(v).strip().lower() in TRUE_STRINGS if pd.notna(v) else False).astype(bool)
+
+def amount_cents(amounts):
+    """Converts a Series of dollar amounts to nullable int64 cents."""
+    return (pd.to_numeric(amounts, errors='coerce') * 100).round().astype('Int64')
+
+def to_cents(value):
+    """Converts one dollar amount to int cents, or None if it is missing or not a number."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if value != value: # NaN
+        return None
+    return int(round(value * 100))
+
+def ledger_cents(df):
+    """The Amount_Cents column of a loaded ledger, or cents derived from Amount for any other frame."""
+    if AMOUNT_CENTS_COLUMN not in df.columns:
+        return amount_cents(df['Amount'])
+    cents = df[AMOUNT_CENTS_COLUMN]
+    if cents.isna().any(): # Rows appended since the load (e.g. a new import) have no cents yet
+        cents = cents.fillna(amount_cents(df['Amount']))
+    return cents
+
+def pair_transactions(left, right, max_days, offsetting=True):
+    """
+    Pairs rows of `left` with rows of `right` whose amounts cancel out to the cent
+    (or, with offsetting=False, are equal) and whose dates are at most `max_days`
+    apart, as a hash join on the cents. Each row is used once, in the order given:
+    every left row takes the first right row that fits and is still free.
+    Returns a list of (left index, right index).
+    """
+    left_keys = pd.DataFrame({
+        'cents': ledger_cents(left).values, 'date': left['Date'].values, 'left_pos': range(len(left)),
+    }).dropna(subset=['cents'])
+    right_keys = pd.DataFrame({
+        'cents': (-ledger_cents(right) if offsetting else ledger_cents(right)).values,
+        'date': right['Date'].values, 'right_pos': range(len(right)),
+    }).dropna(subset=['cents'])
+    pairs = left_keys.merge(right_keys, on='cents', suffixes=('_left', '_right'))
+    pairs = pairs[(pairs['date_left'] - pairs['date_right']).abs() <= pd.Timedelta(days=max_days)]
+    pairs = pairs.sort_values(['left_pos', 'right_pos'])
+
+    used_left, used_right, matches = set(), set(), []
+    for left_pos, right_pos in zip(pairs['left_pos'], pairs['right_pos']):
+        if left_pos in used_left or right_pos in used_right:
+            continue
+        used_left.add(left_pos)
+        used_right.add(right_pos)
+        matches.append((left.index[left_pos], right.index[right_pos]))
+    return matches
+
+def apply_ledger_types(df, for_update=False):
+    """
+    Returns a copy of the ledger with the canonical column set and typed columns:
+    datetime64 dates, float amounts (plus the derived Amount_Cents), bool flags,
+    categorical Account/Category/Source and Arrow-backed text. Pass for_update=True
+    to keep the text columns as plain objects so callers can assign new values
+    without extending the categories first.
+    """
+    df = df.copy()
+    for col in MASTER_COLUMNS:
+        if col not in df.columns:
+            df[col] = False if col in BOOL_COLUMNS else None
+
+    df['Date'] = pd.to_datetime(df['Date'], format='mixed', errors='coerce')
+    df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce')
+    df[AMOUNT_CENTS_COLUMN] = amount_cents(df['Amount'])
+    for col in BOOL_COLUMNS:
+        df[col] = _to_bool(df[col])
+    for col in STRING_COLUMNS:
+        df[col] = _to_object(df[col]) if for_update else df[col].astype(STRING_DTYPE)
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = _to_object(df[col]) if for_update else df[col].astype('category')
+
+    extra_columns = [col for col in df.columns if col not in MASTER_COLUMNS + DERIVED_COLUMNS]
+    return df[MASTER_COLUMNS + DERIVED_COLUMNS + extra_columns]
+
+def read_legacy_csv(path=MASTER_FILE_PATH, for_update=False):
+    """Parses the legacy CSV ledger into the typed layout."""
+    df = pd.read_csv(path, dtype={'Category': 'object', 'ReconciliationID': 'object', 'SourceTransactionID': 'object'})
+    return apply_ledger_types(df, for_update=for_update)
+
+def _file_hash(path):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _csv_state(path):
+    """Size, mtime and content hash of the legacy CSV, as recorded when the store and the CSV are in step."""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': _file_hash(path)}
+
+def _partition_key(date, account):
+    """Returns the (year, account) partition a row belongs to."""
+    year = UNDATED_PARTITION if pd.isna(date) else str(date.year)
+    return year, '' if pd.isna(account) else str(account)
+
+def _partition_file(year, account):
+    """Relative file name of a partition; the hash keeps similar account names apart."""
+    slug = re.sub('[^A-Za-z0-9]+', '_', account).strip('_') or 'Unknown'
+    digest = hashlib.md5(account.encode('utf-8')).hexdigest()[:6]
+    return f"{year}/{slug}-{digest}.parquet"
+
+def _partition_hash(part):
+    """Content hash of a partition, used to skip rewriting partitions that did not change."""
+    hashes = pd.util.hash_pandas_object(part.astype({col: object for col in CATEGORICAL_COLUMNS}), index=False)
+    return hashlib.md5(hashes.values.tobytes()).hexdigest()
+
+def read_manifest(path=MASTER_FILE_PATH):
+    """
+    Reads the partition manifest: {'partitions': {file: {year, account, rows, ...}},
+    'version': number of writes, 'csv': the CSV's state at the last import or export
+    and the version the store had then}.
+    """
+    manifest_path = manifest_path_for(path)
+    if not os.path.exists(manifest_path):
+        return {'partitions': {}}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _in_scope(year, account, years=None, accounts=None):
+    """True if a partition is selected by the year/account filters (None selects everything)."""
+    if years is not None and year not in {str(y) for y in years}:
+        return False
+    if accounts is not None and account not in set(accounts):
+        return False
+    return True
+
+def _scope_mask(df, years=None, accounts=None):
+    """Boolean mask of the rows that fall inside the year/account filters."""
+    mask = pd.Series(True, index=df.index)
+    if years is not None:
+        mask &= df['Date'].dt.year.isin([int(y) for y in years])
+    if accounts is not None:
+        mask &= df['Account'].astype(object).isin(list(accounts))
+    return mask
+
+def _empty_ledger():
+    """A typed ledger with no rows."""
+    return apply_ledger_types(pd.DataFrame(columns=MASTER_COLUMNS))
+
+def _finish_loaded(df):
+    """Puts rows read from several sources back into one chronological, typed ledger."""
+    for col in STRING_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(STRING_DTYPE)
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = _to_object(df[col]).astype('category')
+    if 'Date' in df.columns:
+        df = df.sort_values('Date', kind='stable', na_position='last')
+    return df.reset_index(drop=True)
+
+def _read_partitions(path, columns=None, years=None, accounts=None):
+    """Reads only the partitions selected by the year/account filters."""
+    manifest = read_manifest(path)
+    read_columns = None if columns is None else list(dict.fromkeys(list(columns) + ['Date']))
+    frames = [
+        pd.read_parquet(os.path.join(partition_dir_for(path), file_name), columns=read_columns)
+        for file_name, entry in manifest['partitions'].items()
+        if _in_scope(entry['year'], entry['account'], years, accounts)
+    ]
+    df = _finish_loaded(pd.concat(frames, ignore_index=True)) if frames else _empty_ledger()
+    return df[columns] if columns is not None else df
+
+def _sync_csv(path):
+    """
+    Makes the partitioned store current with the legacy CSV. The partitions are
+    built from the CSV (or the old single-file store) the first time, and rebuilt
+    when the CSV's contents changed since the last import or export (e.g. it was
+    edited in Excel) while the store did not. If both changed, neither copy can be
+    chosen safely and LedgerConflictError is raised.
+    """
+    if not os.path.exists(manifest_path_for(path)):
+        old_store = parquet_path_for(path)
+        if os.path.exists(old_store) and (not os.path.exists(path) or os.path.getmtime(old_store) >= os.path.getmtime(path)):
+            df = apply_ledger_types(pd.read_parquet(old_store))
+        else:
+            df = read_legacy_csv(path)
+        _write_partitions(df, path)
+        if os.path.exists(old_store):
+            os.remove(old_store) # Superseded by the partitions
+        _record_csv_sync(path)
+        return
+
+    manifest = read_manifest(path)
+    recorded = manifest.get('csv')
+    if not os.path.exists(path):
+        return
+    if recorded is None: # A store from before the CSV was tracked: take it as matching the CSV from now on
+        _record_csv_sync(path)
+        return
+    stat = os.stat(path)
+    if stat.st_size == recorded['size'] and stat.st_mtime_ns == recorded['mtime_ns']:
+        return
+    if stat.st_size == recorded['size'] and _file_hash(path) == recorded['sha256']:
+        # Touched but not edited (a checkout, a copy, an editor that saved nothing)
+        recorded['mtime_ns'] = stat.st_mtime_ns
+        _write_manifest(manifest, path)
+        return
+    if manifest.get('version', 0) != recorded['store_version']:
+        raise LedgerConflictError(
+            f"'{path}' was edited since it was last exported, and the ledger store has changed since then too. "
+            f"Run 'python ledger_store.py export' to overwrite the CSV with the store, or "
+            f"'python ledger_store.py convert' to rebuild the store from the CSV."
+        )
+    _write_partitions(read_legacy_csv(path), path)
+    _record_csv_sync(path)
+
+def _record_csv_sync(path):
+    """Records in the manifest that the CSV and the store now hold the same ledger."""
+    if not os.path.exists(path) or not os.path.exists(manifest_path_for(path)):
+        return
+    manifest = read_manifest(path)
+    manifest['csv'] = dict(_csv_state(path), store_version=manifest.get('version', 0))
+    _write_manifest(manifest, path)
+
+def _file_store_exists(path):
+    return any(os.path.exists(p) for p in (path, manifest_path_for(path), parquet_path_for(path)))
+
+def file_store_version(path=MASTER_FILE_PATH):
+    """
+    The Parquet/CSV store's version stamp: the manifest's write counter, or the
+    CSV's content hash when the CSV is the only store. None if there is no store.
+    """
+    if PARQUET_AVAILABLE and _file_store_exists(path):
+        _sync_csv(path)
+    return _written_file_version(path)
+
+def _written_file_version(path):
+    """file_store_version() as the store stands, without first picking up CSV edits."""
+    if PARQUET_AVAILABLE:
+        return read_manifest(path).get('version', 0)
+    return _file_hash(path) if os.path.exists(path) else None
+
+def _sqlite_conflict(path):
+    import ledger_db
+    return LedgerConflictError(
+        f"Both '{ledger_db.db_path_for(path)}' and the Parquet/CSV ledger were changed since they were last in step. "
+        f"Run 'python ledger_db.py' to rebuild SQLite from the Parquet/CSV ledger, or "
+        f"'python ledger_db.py export' to copy SQLite over it."
+    )
+
+def copy_sqlite_to_files(path=MASTER_FILE_PATH):
+    """Writes the SQLite ledger (tombstoned rows included) to the Parquet/CSV store and marks the two in step."""
+    import ledger_db
+    with closing(ledger_db.connect(path)) as conn:
+        df = ledger_db.read_ledger(conn)
+        if PARQUET_AVAILABLE:
+            _write_partitions(df, path)
+        else:
+            export_legacy_csv(df, path)
+        ledger_db.mark_synced(conn, _written_file_version(path))
+    return len(df)
+
+def _sync_from_sqlite(path):
+    """
+    Brings the Parquet/CSV store up to date with the SQLite store if only SQLite
+    was written since the two were last in step (e.g. while LEDGER_BACKEND=sqlite).
+    """
+    import ledger_db
+    if not os.path.exists(ledger_db.db_path_for(path)):
+        return
+    with closing(ledger_db.connect(path)) as conn:
+        meta = ledger_db.read_meta(conn)
+        if ledger_db.SYNCED_FILE_VERSION_KEY not in meta or not ledger_db.changed_since_sync(conn):
+            return
+        if str(file_store_version(path)) != meta[ledger_db.SYNCED_FILE_VERSION_KEY]:
+            raise _sqlite_conflict(path)
+    copy_sqlite_to_files(path)
+
+def load_file_ledger(path=MASTER_FILE_PATH, columns=None, years=None, accounts=None):
+    """
+    Reads the partitioned Parquet store, touching only the partitions selected by
+    `years`/`accounts` and projecting only `columns` if given. The store is first
+    brought up to date with the legacy CSV if that was edited by hand, and with
+    the SQLite store if that was used since.
+    """
+    _sync_from_sqlite(path)
+    if PARQUET_AVAILABLE:
+        _sync_csv(path)
+        return _read_partitions(path, columns, years, accounts)
+
+    df = read_legacy_csv(path)
+    df = df[_scope_mask(df, years, accounts)]
+    return df[columns] if columns is not None else df
+
+def _load_sqlite_ledger(path, columns=None, years=None, accounts=None):
+    """
+    Reads the SQLite store. It is (re)seeded from the Parquet/CSV ledger the first
+    time and whenever only that ledger changed since the two were last in step,
+    judged by the version stamps both keep; if both changed, LedgerConflictError
+    is raised.
+    """
+    import ledger_db
+    with closing(ledger_db.connect(path)) as conn:
+        if _file_store_exists(path):
+            file_version = str(file_store_version(path))
+            meta = ledger_db.read_meta(conn)
+            synced_file_version = meta.get(ledger_db.SYNCED_FILE_VERSION_KEY)
+            if synced_file_version is None:
+                # Never in step with the Parquet/CSV ledger: seed it, unless it already holds rows of unknown age
+                if conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]:
+                    raise _sqlite_conflict(path)
+                stale = True
+            else:
+                stale = synced_file_version != file_version
+            if stale and ledger_db.changed_since_sync(conn):
+                raise _sqlite_conflict(path)
+            if stale:
+                ledger_db.replace_ledger(conn, load_file_ledger(path))
+                ledger_db.mark_synced(conn, file_version)
+        where, params = ledger_db.scope_clause(years, accounts)
+        return ledger_db.read_ledger(conn, columns=columns, where=where, params=params)
+
+def _file_signature(*paths):
+    """(mtime, size) of each file, or None for files that do not exist."""
+    signature = []
+    for p in paths:
+        try:
+            stat = os.stat(p)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+def ledger_signature(path):
+    """Signature of every file the configured backend reads the ledger from."""
+    import ledger_tombstones
+    tombstone_path = ledger_tombstones.tombstone_path_for(path)
+    if using_sqlite():
+        import ledger_db
+        return _file_signature(path, ledger_db.db_path_for(path), tombstone_path)
+    return _file_signature(path, manifest_path_for(path), parquet_path_for(path), tombstone_path)
+
+_ledger_cache = {}
+_loaded_versions = {} # (path, scope) -> (version stamp, row hashes) of the ledger a tool loaded for update
+
+def _scope_key(path, years=None, accounts=None):
+    """Identifies a (possibly partial) view of a ledger."""
+    return (
+        os.path.abspath(path),
+        None if years is None else tuple(sorted(str(y) for y in years)),
+        None if accounts is None else tuple(sorted(accounts)),
+    )
+
+def _content_hashes(df):
+    """A hash of each row's contents (blank text counts as missing), in row order."""
+    typed = apply_ledger_types(df, for_update=True)[MASTER_COLUMNS].reset_index(drop=True)
+    for col in CATEGORICAL_COLUMNS + STRING_COLUMNS:
+        typed[col] = typed[col].where(typed[col] != '', float('nan'))
+    return pd.util.hash_pandas_object(typed, index=False).values.astype(str)
+
+def content_keys(df):
+    """'TransactionID|content hash' for each row: equal for rows with identical contents."""
+    ids = df['TransactionID'].astype(object).where(df['TransactionID'].notna(), '').astype(str)
+    return pd.Series(ids.values + '|' + _content_hashes(df), index=df.index)
+
+def _row_hashes(df):
+    """One content hash per row, keyed by row_keys()."""
+    return pd.Series(_content_hashes(df), index=row_keys(df).values)
+
+def note_own_write(path, old_signature):
+    """
+    Moves the version stamp of this process's loaded ledgers past a write it made
+    itself (e.g. tombstones), so the next save does not treat it as another tool's change.
+    """
+    new_signature = ledger_signature(path)
+    for scope, (signature, hashes) in list(_loaded_versions.items()):
+        if scope[0] == os.path.abspath(path) and signature == old_signature:
+            _loaded_versions[scope] = (new_signature, hashes)
+
+def merge_ledger_changes(base_hashes, mine, theirs):
+    """
+    Three-way row merge. `base_hashes` are the row hashes of the ledger as this
+    tool loaded it, `mine` is what this tool wants to save and `theirs` is what is
+    in the store now. Rows changed (or added/deleted) on only one side take that
+    side's version; rows changed differently on both sides raise LedgerConflictError.
+    """
+    mine = apply_ledger_types(mine, for_update=True).reset_index(drop=True)
+    theirs = apply_ledger_types(theirs, for_update=True).reset_index(drop=True)
+    versions = pd.DataFrame({
+        'base': base_hashes, 'mine': _row_hashes(mine), 'theirs': _row_hashes(theirs)
+    }).fillna('absent')
+
+    conflicts = versions[(versions['mine'] != versions['base']) & (versions['theirs'] != versions['base']) & (versions['mine'] != versions['theirs'])]
+    if not conflicts.empty:
+        raise LedgerConflictError(
+            f"{len(conflicts)} transaction(s) were changed both here and by another tool: "
+            + ', '.join(conflicts.index[:5]) + (' ...' if len(conflicts) > 5 else '')
+        )
+
+    take_mine = versions[(versions['theirs'] == versions['base']) & (versions['mine'] != versions['base'])]
+    mine.index, theirs.index = row_keys(mine).values, row_keys(theirs).values
+    updated = take_mine.index[(take_mine['mine'] != 'absent') & (take_mine['theirs'] != 'absent')]
+    deleted = take_mine.index[take_mine['mine'] == 'absent']
+    inserted = take_mine.index[take_mine['theirs'] == 'absent']
+
+    merged = theirs.drop(deleted)
+    shared_columns = [col for col in mine.columns if col in merged.columns]
+    merged.loc[updated, shared_columns] = mine.loc[updated, shared_columns].values
+    merged = pd.concat([merged, mine.loc[inserted]])
+    return merged.reset_index(drop=True), len(take_mine)
+
+def clear_ledger_cache():
+    """Drops the parsed ledgers cached in this process."""
+    _ledger_cache.clear()
+
+def load_raw_ledger(path=MASTER_FILE_PATH, columns=None, years=None, accounts=None):
+    """Reads the stored ledger from the configured backend, including tombstoned rows."""
+    if using_sqlite():
+        return _load_sqlite_ledger(path, columns, years, accounts)
+    return load_file_ledger(path, columns, years, accounts)
+
+def _hide_deleted(path, columns=None, years=None, accounts=None):
+    """Reads the ledger without its tombstoned rows (they need every column to be matched)."""
+    import ledger_tombstones
+    tombstones = ledger_tombstones.read_tombstones(path)
+    if not tombstones:
+        return load_raw_ledger(path, columns, years, accounts)
+    df = load_raw_ledger(path, None, years, accounts)
+    df = df[~ledger_tombstones.tombstone_mask(df, tombstones).values]
+    return df[columns] if columns is not None else df
+
+def load_ledger(path=MASTER_FILE_PATH, columns=None, for_update=False, years=None, accounts=None, as_of=None):
+    """
+    Loads the master ledger as a typed DataFrame from the configured backend.
+    Pass `years` and/or `accounts` to load only that slice of the ledger; a slice
+    must be saved back with the same filters. With the SQLite backend the index
+    holds each row's row_id. Rows deleted with ledger_tombstones are hidden.
+    Repeat loads in one process are served from a cache until the store files change.
+    Pass `as_of` (a ledger_history version number) to read the ledger as it was then.
+    """
+    if as_of is not None:
+        import ledger_history
+        with ledger_lock(path):
+            df = ledger_history.rewind(load_ledger(path, years=years, accounts=accounts), as_of, path, years, accounts)
+        if columns is not None:
+            df = df[columns]
+        if for_update:
+            for col in CATEGORICAL_COLUMNS + STRING_COLUMNS:
+                if col in df.columns:
+                    df[col] = _to_object(df[col])
+        return df
+
+    cache_key = (
+        LEDGER_BACKEND, os.path.abspath(path),
+        None if columns is None else tuple(columns),
+        None if years is None else tuple(sorted(str(y) for y in years)),
+        None if accounts is None else tuple(sorted(accounts)),
+    )
+    with ledger_lock(path):
+        version = ledger_signature(path)
+        cached = _ledger_cache.get(cache_key)
+        if cached is not None and cached[0] == version:
+            df = cached[1].copy()
+        else:
+            df = _hide_deleted(path, columns, years, accounts)
+            if 'Amount' in df.columns:
+                df[AMOUNT_CENTS_COLUMN] = amount_cents(df['Amount'])
+            version = ledger_signature(path) # Loading may have (re)built the store
+            _ledger_cache.pop(cache_key, None)
+            _ledger_cache[cache_key] = (version, df.copy())
+            while len(_ledger_cache) > LEDGER_CACHE_SIZE:
+                del _ledger_cache[next(iter(_ledger_cache))]
+
+    if for_update and columns is None:
+        # Remember what this tool started from, so save_ledger can merge concurrent changes.
+        _loaded_versions[_scope_key(path, years, accounts)] = (version, _row_hashes(df))
+
+    if for_update:
+        for col in CATEGORICAL_COLUMNS + STRING_COLUMNS:
+            if col in df.columns:
+                df[col] = _to_object(df[col])
+    return df
+
+def _write_partitions(df, path, years=None, accounts=None):
+    """
+    Writes the typed ledger to the partitioned Parquet store. Only partitions whose
+    contents changed are rewritten, and partitions outside the year/account
+    filters are left as they are. The manifest is written last.
+    """
+    partition_dir = partition_dir_for(path)
+    manifest = read_manifest(path)
+    old_partitions = manifest['partitions']
+    new_partitions = {
+        file_name: entry for file_name, entry in old_partitions.items()
+        if not _in_scope(entry['year'], entry['account'], years, accounts)
+    }
+
+    df = df.drop(columns=DERIVED_COLUMNS, errors='ignore').reset_index(drop=True)
+    keys = [_partition_key(date, account) for date, account in zip(df['Date'], df['Account'])]
+    groups = pd.Series(range(len(df))).groupby([[k[0] for k in keys], [k[1] for k in keys]], sort=True)
+    for (year, account), positions in groups:
+        part = df.iloc[positions.values]
+        file_name = _partition_file(year, account)
+        content_hash = _partition_hash(part)
+        old_entry = old_partitions.get(file_name)
+        file_path = os.path.join(partition_dir, file_name)
+        if old_entry is None or old_entry['hash'] != content_hash or not os.path.exists(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            _replace_file(lambda tmp_path: part.to_parquet(tmp_path, index=False), file_path)
+        new_partitions[file_name] = {
+            'year': year, 'account': account, 'rows': len(part), 'hash': content_hash,
+            'min_date': None if part['Date'].isna().all() else part['Date'].min().strftime('%Y-%m-%d'),
+            'max_date': None if part['Date'].isna().all() else part['Date'].max().strftime('%Y-%m-%d'),
+        }
+
+    for file_name in set(old_partitions) - set(new_partitions):
+        file_path = os.path.join(partition_dir, file_name)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+    os.makedirs(partition_dir, exist_ok=True)
+    manifest['partitions'] = dict(sorted(new_partitions.items()))
+    manifest['version'] = manifest.get('version', 0) + 1
+    _write_manifest(manifest, path)
+
+def _write_manifest(manifest, path):
+    """Writes the partition manifest atomically."""
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+    _replace_file(write, manifest_path_for(path))
+
+def export_legacy_csv(df, path=MASTER_FILE_PATH):
+    """Writes the ledger in the legacy CSV format (ISO dates, UTF-8 with BOM)."""
+    df_to_write = df.drop(columns=DERIVED_COLUMNS, errors='ignore')
+    df_to_write['Date'] = pd.to_datetime(df_to_write['Date'], format='mixed').dt.strftime('%Y-%m-%d')
+    _replace_file(lambda tmp_path: df_to_write.to_csv(tmp_path, index=False, encoding='utf-8-sig'), path)
+
+def save_ledger(df, path=MASTER_FILE_PATH, export_csv=False, years=None, accounts=None, tool=None):
+    """
+    Saves the ledger to the configured store. The legacy CSV is only rewritten when
+    export_csv=True, or when pyarrow is not installed and the CSV is the only store.
+    A slice loaded with `years`/`accounts` is saved with the same filters, which
+    replaces just that slice and keeps the rest of the ledger.
+
+    If another tool saved since this ledger was loaded (its version stamp moved),
+    this tool's row changes are merged into the current ledger rather than
+    overwriting it; LedgerConflictError is raised if both changed the same row.
+
+    The rows the save adds and removes are recorded as a new ledger_history
+    version, labelled with `tool` (the running script by default).
+    """
+    import ledger_history
+    with ledger_lock(path):
+        scope = _scope_key(path, years, accounts)
+        loaded = _loaded_versions.get(scope)
+        if loaded is not None and loaded[0] != ledger_signature(path):
+            clear_ledger_cache()
+            theirs = _hide_deleted(path, years=years, accounts=accounts)
+            df, merged_rows = merge_ledger_changes(loaded[1], df, theirs)
+            print(f"⚠️ The ledger was changed by another tool; merged {merged_rows} changed row(s) from this one into it.")
+
+        before = load_ledger(path, years=years, accounts=accounts) if ledger_exists(path) else _empty_ledger()
+        typed = _save_ledger_locked(df, path, export_csv, years, accounts)
+        ledger_history.record_version(before, typed, path, tool)
+        _loaded_versions[scope] = (ledger_signature(path), _row_hashes(typed[_scope_mask(typed, years, accounts)]))
+        return typed
+
+def _save_ledger_locked(df, path, export_csv=False, years=None, accounts=None, keep_deleted=True):
+    """
+    Writes the ledger to the stores; the caller holds the ledger lock. Tombstoned
+    rows are carried over from the store (they are not in `df`) unless the ledger
+    is being compacted.
+    """
+    import ledger_tombstones
+    clear_ledger_cache()
+    typed = apply_ledger_types(df)
+    scoped = years is not None or accounts is not None
+    if scoped and not _scope_mask(typed, years, accounts).all():
+        raise ValueError("The ledger slice contains rows outside the years/accounts it is being saved to.")
+
+    stored = typed
+    tombstones = ledger_tombstones.read_tombstones(path) if keep_deleted else {}
+    if tombstones and ledger_exists(path):
+        raw = load_raw_ledger(path, years=years, accounts=accounts)
+        deleted_rows = apply_ledger_types(raw[ledger_tombstones.tombstone_mask(raw, tombstones).values])
+        stored = pd.concat([typed, deleted_rows], ignore_index=True)
+
+    csv_only = not PARQUET_AVAILABLE and not using_sqlite()
+    if csv_only and scoped:
+        full = read_legacy_csv(path)
+        stored = pd.concat([full[~_scope_mask(full, years, accounts)], stored], ignore_index=True)
+    if csv_only:
+        export_legacy_csv(stored, path)
+    elif export_csv and not scoped:
+        export_legacy_csv(typed, path)
+
+    if using_sqlite():
+        import ledger_db
+        with closing(ledger_db.connect(path)) as conn:
+            where, params = ledger_db.scope_clause(years, accounts)
+            ledger_db.replace_ledger(conn, stored, where, params)
+    elif PARQUET_AVAILABLE:
+        # Written after the CSV so the Parquet store is never older than an export.
+        _write_partitions(stored, path, years, accounts)
+
+    if export_csv and scoped and not csv_only:
+        export_legacy_csv(load_ledger(path), path)
+    if export_csv and using_sqlite():
+        if PARQUET_AVAILABLE:
+            copy_sqlite_to_files(path) # An export brings every store into step
+        else:
+            with closing(ledger_db.connect(path)) as conn:
+                ledger_db.mark_synced(conn, file_store_version(path))
+    if export_csv:
+        _record_csv_sync(path)
+    if not using_sqlite():
+        import ledger_index
+        ids = typed['TransactionID'] if not scoped else load_ledger(path, columns=['TransactionID'])['TransactionID']
+        ledger_index.build_index(ids, path)
+    return typed
+
+def filter_new_transactions(df_new, path=MASTER_FILE_PATH):
+    """
+    Drops rows of `df_new` whose TransactionID is already in the ledger, using the
+    SQLite TransactionID index or the persistent ID index (ledger_index.py) so the
+    ledger itself is never loaded.
+    """
+    if df_new.empty or not ledger_exists(path):
+        return df_new
+    if using_sqlite():
+        import ledger_db
+        import ledger_tombstones
+        tombstones = ledger_tombstones.read_tombstones(path)
+        with closing(ledger_db.connect(path)) as conn:
+            existing_ids = ledger_db.existing_transaction_ids(conn, df_new['TransactionID'])
+            for transaction_id in existing_ids & set(tombstones):
+                # An ID whose rows are all tombstoned counts as new again
+                rows = ledger_db.find_by_transaction_id(conn, transaction_id)
+                if ledger_tombstones.tombstone_mask(rows, tombstones).all():
+                    existing_ids.discard(transaction_id)
+        return df_new[~df_new['TransactionID'].isin(existing_ids)].copy()
+    import ledger_index
+    return df_new[~ledger_index.existing_mask(df_new['TransactionID'], path)].copy()
+
+def main():
+    """Command line entry point: convert the CSV to Parquet, or export the CSV on demand."""
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    path = sys.argv[2] if len(sys.argv) > 2 else MASTER_FILE_PATH
+
+    if not ledger_exists(path):
+        print(f"❌ ERROR: Master file not found at '{path}'.")
+        sys.exit(1)
+    if not PARQUET_AVAILABLE:
+        print("❌ ERROR: pyarrow is not installed, so the ledger can only be stored as CSV.")
+        sys.exit(1)
+
+    if command == 'convert':
+        df = read_legacy_csv(path)
+        with ledger_lock(path):
+            _write_partitions(df, path)
+            _record_csv_sync(path)
+        print(f"✅ Converted {len(df)} transactions to '{partition_dir_for(path)}'.")
+    elif command == 'export':
+        with ledger_lock(path):
+            _record_csv_sync(path) # The store wins over any hand edits to the CSV
+            df = load_ledger(path)
+            export_legacy_csv(df, path)
+            _record_csv_sync(path)
+        print(f"✅ Exported {len(df)} transactions to '{path}'.")
+    elif command == 'partitions':
+        load_file_ledger(path, columns=['Date']) # Builds the partitions if they are missing or stale
+        for file_name, entry in read_manifest(path)['partitions'].items():
+            print(f"{entry['year']:>8} | {entry['account']:<20} | {entry['rows']:>6} rows | {entry['min_date']} to {entry['max_date']}")
+    else:
+        print("Usage: python ledger_store.py [convert|export|partitions] [path_to_master_csv]")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import pandas as pd
+import os
+import sys
+import json
+from datetime import datetime
+import ledger_store
+import ledger_history
+from ledger_store import MASTER_FILE_PATH, ledger_exists, ledger_lock
+
+# --- Configuration ---
+# Deleted transactions stay in the store and are hidden by every reader until
+# the ledger is compacted. Tombstones are keyed by TransactionID and the row's
+# content hash, with a count, so deleting one of two identical duplicate rows
+# hides exactly one of them and a re-imported copy of a purged row shows again.
+TOMBSTONE_SUFFIX = '.tombstones.json'
+
+def tombstone_path_for(path=MASTER_FILE_PATH):
+    """Returns the tombstone file that belongs to a ledger path."""
+    return os.path.splitext(path)[0] + TOMBSTONE_SUFFIX
+
+def read_tombstones(path=MASTER_FILE_PATH):
+    """Reads the tombstones as {TransactionID: {row_hash: entry}}."""
+    tombstone_path = tombstone_path_for(path)
+    if not os.path.exists(tombstone_path):
+        return {}
+    with open(tombstone_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _write_tombstones(tombstones, path):
+    """Writes (or, when there are none left, removes) the tombstone file."""
+    tombstone_path = tombstone_path_for(path)
+    if not tombstones:
+        if os.path.exists(tombstone_path):
+            os.remove(tombstone_path)
+        return
+
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(tombstones, f, indent=2)
+    ledger_store._replace_file(write, tombstone_path)
+
+def tombstone_mask(df, tombstones):
+    """Boolean mask of the rows hidden by the tombstones (the first `count` copies of each match)."""
+    if not tombstones or df.empty:
+        return pd.Series(False, index=df.index)
+    counts = {
+        f"{transaction_id}|{row_hash}": entry['count']
+        for transaction_id, entries in tombstones.items()
+        for row_hash, entry in entries.items()
+    }
+    keys = ledger_store.content_keys(df)
+    return keys.groupby(keys).cumcount() < keys.map(counts).fillna(0)
+
+def delete_transactions(rows, path=MASTER_FILE_PATH, reason=''):
+    """
+    Tombstones the given ledger rows (as they are stored). Only the tombstone file
+    is written, so this is fast however large the ledger is, and it can be undone
+    with restore_transactions() until the ledger is compacted.
+    """
+    if rows.empty:
+        return 0
+    with ledger_lock(path):
+        old_signature = ledger_store.ledger_signature(path)
+        tombstones = read_tombstones(path)
+        deleted_at = datetime.now().isoformat(timespec='seconds')
+        for (_, row), key in zip(rows.iterrows(), ledger_store.content_keys(rows)):
+            transaction_id, row_hash = key.split('|', 1)
+            entry = tombstones.setdefault(transaction_id, {}).setdefault(row_hash, {
+                'count': 0, 'deleted_at': deleted_at, 'reason': reason,
+                'Date': None if pd.isna(row['Date']) else pd.Timestamp(row['Date']).strftime('%Y-%m-%d'),
+                'Account': None if pd.isna(row['Account']) else str(row['Account']),
+                'Description': None if pd.isna(row['Description']) else str(row['Description']),
+                'Amount': None if pd.isna(row['Amount']) else float(row['Amount']),
+            })
+            entry['count'] += 1
+        _write_tombstones(tombstones, path)
+        ledger_history.record_changes(rows.iloc[:0], rows, path)
+        ledger_store.note_own_write(path, old_signature)
+    return len(rows)
+
+def restore_transactions(transaction_ids=None, path=MASTER_FILE_PATH):
+    """Removes tombstones (all of them, or those for the given TransactionIDs) and returns how many rows reappear."""
+    with ledger_lock(path):
+        old_signature = ledger_store.ledger_signature(path)
+        tombstones = read_tombstones(path)
+        selected = list(tombstones) if transaction_ids is None else [t for t in transaction_ids if t in tombstones]
+        raw = ledger_store.load_raw_ledger(path)
+        hidden_before = tombstone_mask(raw, tombstones)
+        restored = sum(entry['count'] for t in selected for entry in tombstones.pop(t).values())
+        _write_tombstones(tombstones, path)
+        reappeared = raw[(hidden_before & ~tombstone_mask(raw, tombstones)).values]
+        ledger_history.record_changes(reappeared, raw.iloc[:0], path)
+        ledger_store.note_own_write(path, old_signature)
+    return restored
+
+def compact_ledger(path=MASTER_FILE_PATH):
+    """Physically removes tombstoned rows from the store and clears the tombstones."""
+    with ledger_lock(path):
+        tombstones = read_tombstones(path)
+        if not tombstones:
+            return 0
+        old_signature = ledger_store.ledger_signature(path)
+        raw = ledger_store.load_raw_ledger(path)
+        hidden = tombstone_mask(raw, tombstones)
+        ledger_store._save_ledger_locked(raw[~hidden.values], path, keep_deleted=False)
+        _write_tombstones({}, path)
+        ledger_store.note_own_write(path, old_signature)
+    return int(hidden.sum())
+
+def main():
+    """Command line entry point: list, restore or compact tombstoned transactions."""
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    if not ledger_exists(MASTER_FILE_PATH):
+        print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
+        sys.exit(1)
+
+    if command == 'restore':
+        restored = restore_transactions(sys.argv[2:] or None)
+        print(f"✅ Restored {restored} deleted transaction(s).")
+    elif command == 'compact':
+        removed = compact_ledger()
+        print(f"✅ Compaction complete. {removed} deleted transaction(s) were removed for good.")
+    else:
+        tombstones = read_tombstones()
+        total = sum(entry['count'] for entries in tombstones.values() for entry in entries.values())
+        print(f"{total} deleted transaction(s) can still be restored:")
+        for transaction_id, entries in tombstones.items():
+            for entry in entries.values():
+                print(f" {transaction_id} | {entry['Date']} | {entry['Account']} | {entry['Description']} | {entry['Amount']} | x{entry['count']} | {entry['reason']}")
+        print("\nUse 'restore [TransactionID ...]' to undo deletes, or 'compact' to remove them permanently.")
+
+if __name__ == "__main__":
+    main()
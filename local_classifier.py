@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+import sys
+import time
+from collections import Counter
+from ledger_store import MASTER_FILE_PATH, ledger_exists, load_ledger
+from ai_categorizer import normalize_description
+
+# --- Configuration ---
+# An offline k-nearest-neighbour classifier over TF-IDF vectors of the reviewed
+# ledger history (Description and Payee, normalized like the AI cache keys, as
+# words and word pairs). Each distinct description/sign is one neighbour that
+# votes with the categories it was reviewed as; only rows whose neighbours are
+# both close and in agreement are categorized, the rest go on to the AI model.
+NEIGHBOURS = 5
+MIN_SIMILARITY = 0.5 # Cosine similarity of the closest neighbour
+CONFIDENCE_THRESHOLD = 0.8 # Share of the neighbours' weighted vote for the winning category
+EXCLUDED_CATEGORIES = {'NEEDS REVIEW', 'NEEDS RECONCILIATION', 'NEEDS REVIEW (Bad Date)'}
+HOLDOUT_SHARE = 0.2 # The newest share of the ledger, held out by 'evaluate'
+
+def _texts(df, description_column='Description', payee_column='Payee'):
+    """The normalized text of each row: its description plus its payee, if the file has one."""
+    text = df[description_column].fillna('').astype(str)
+    if payee_column in df.columns:
+        text = text + ' ' + df[payee_column].fillna('').astype(str)
+    return text.map(normalize_description)
+
+def _signs(df, amount_column='Amount'):
+    """1 for income, -1 for expenses and transfers, like the AI cache keys."""
+    amounts = pd.to_numeric(df[amount_column], errors='coerce') if amount_column in df.columns else pd.Series(np.nan, index=df.index)
+    return np.where(amounts.fillna(0).values > 0, 1, -1)
+
+def _tokens(text):
+    """The words of a normalized text plus each pair of neighbouring words."""
+    words = text.split()
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+def train(df, categories=None):
+    """
+    Builds the classifier from the Reviewed rows of a ledger DataFrame, or returns
+    None if there is nothing to learn from. Pass categories to learn only those.
+    """
+    reviewed = df['Reviewed'].fillna(False).astype(bool) if 'Reviewed' in df.columns else pd.Series(False, index=df.index)
+    labelled = reviewed & df['Category'].notna() & (df['Category'].astype(str).str.strip() != '')
+    labelled &= ~df['Category'].isin(EXCLUDED_CATEGORIES)
+    if categories is not None:
+        labelled &= df['Category'].isin(categories)
+    rows = df[labelled.values]
+    if rows.empty:
+        return None
+
+    examples = pd.DataFrame({'text': _texts(rows).values, 'sign': _signs(rows), 'category': rows['Category'].astype(str).values})
+    examples = examples[examples['text'] != '']
+    if examples.empty:
+        return None
+    counts = examples.groupby(['text', 'sign', 'category']).size().unstack('category', fill_value=0)
+    docs = counts.index.to_frame(index=False)
+    votes = counts.values.astype(np.float32)
+    votes /= votes.sum(axis=1, keepdims=True)
+
+    # TF-IDF vectors, stored per token (token -> the documents that contain it) for scoring
+    vocabulary, doc_ids, token_ids, term_counts = {}, [], [], []
+    for doc_id, text in enumerate(docs['text']):
+        for token, count in Counter(_tokens(text)).items():
+            doc_ids.append(doc_id)
+            token_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+            term_counts.append(count)
+    doc_ids, token_ids = np.array(doc_ids), np.array(token_ids)
+    document_frequency = np.bincount(token_ids, minlength=len(vocabulary))
+    idf = np.log((1 + len(docs)) / (1 + document_frequency)) + 1
+    weights = np.array(term_counts, dtype=np.float64) * idf[token_ids]
+    norms = np.sqrt(np.bincount(doc_ids, weights=weights ** 2, minlength=len(docs)))
+    weights /= norms[doc_ids]
+
+    order = np.argsort(token_ids, kind='stable')
+    return {
+        'vocabulary': vocabulary,
+        'idf': idf,
+        'token_starts': np.concatenate([[0], np.cumsum(np.bincount(token_ids, minlength=len(vocabulary)))]),
+        'postings': doc_ids[order],
+        'weights': weights[order].astype(np.float32),
+        'signs': docs['sign'].values,
+        'votes': votes,
+        'categories': list(counts.columns),
+        'trained_rows': len(examples),
+    }
+
+def load_classifier(path=MASTER_FILE_PATH, categories=None):
+    """Trains the classifier from the master ledger, or returns None if there is no ledger."""
+    if not ledger_exists(path):
+        return None
+    return train(load_ledger(path, columns=['Description', 'Payee', 'Amount', 'Category', 'Reviewed']), categories)
+
+def _neighbour_scores(classifier, text, sign):
+    """Cosine similarity of one normalized text to every training document with the same sign."""
+    scores = np.zeros(len(classifier['signs']), dtype=np.float32)
+    tokens = Counter(_tokens(text))
+    ids = np.array([classifier['vocabulary'].get(token, -1) for token in tokens])
+    known = ids >= 0
+    if not known.any():
+        return scores
+    # Unseen tokens get the highest IDF: they count against the similarity but match nothing
+    unseen_idf = np.log(1 + len(scores)) + 1
+    query = np.fromiter(tokens.values(), dtype=np.float64) * np.where(known, classifier['idf'][ids.clip(min=0)], unseen_idf)
+    query /= np.linalg.norm(query)
+    for token_id, weight in zip(ids[known], query[known]):
+        start, end = classifier['token_starts'][token_id], classifier['token_starts'][token_id + 1]
+        scores[classifier['postings'][start:end]] += weight * classifier['weights'][start:end]
+    scores[classifier['signs'] != sign] = 0
+    return scores
+
+def predict(classifier, df, description_column='Description', amount_column='Amount', payee_column='Payee'):
+    """
+    Returns a DataFrame (indexed like df) with each row's best category, its
+    confidence (share of the neighbours' vote) and the closest neighbour's similarity.
+    Each distinct description/sign is scored once.
+    """
+    keys = pd.DataFrame({'text': _texts(df, description_column, payee_column).values, 'sign': _signs(df, amount_column)}, index=df.index)
+    answers = {}
+    for text, sign in keys.drop_duplicates().itertuples(index=False):
+        scores = _neighbour_scores(classifier, text, sign)
+        nearest = np.argpartition(scores, -NEIGHBOURS)[-NEIGHBOURS:] if len(scores) > NEIGHBOURS else np.arange(len(scores))
+        nearest = nearest[np.argsort(scores[nearest])[::-1]]
+        nearest = nearest[scores[nearest] > 0]
+        if len(nearest) == 0:
+            answers[(text, sign)] = (None, 0.0, 0.0)
+            continue
+        tally = (scores[nearest, None] * classifier['votes'][nearest]).sum(axis=0)
+        best = int(tally.argmax())
+        answers[(text, sign)] = (classifier['categories'][best], float(tally[best] / scores[nearest].sum()), float(scores[nearest[0]]))
+    results = [answers[key] for key in zip(keys['text'], keys['sign'])]
+    return pd.DataFrame(results, columns=['category', 'confidence', 'similarity'], index=df.index)
+
+def categorize(classifier, df, description_column='Description', amount_column='Amount', payee_column='Payee',
+               threshold=CONFIDENCE_THRESHOLD, min_similarity=MIN_SIMILARITY):
+    """Returns a Series of categories for the rows the classifier is confident about (a subset of df's index)."""
+    if classifier is None or df.empty:
+        return pd.Series(dtype=object)
+    predictions = predict(classifier, df, description_column, amount_column, payee_column)
+    confident = predictions['category'].notna() & (predictions['confidence'] >= threshold) & (predictions['similarity'] >= min_similarity)
+    return predictions.loc[confident, 'category']
+
+def evaluate(df, holdout_share=HOLDOUT_SHARE):
+    """
+    Trains on all but the newest holdout_share of the reviewed ledger and prints,
+    for a few confidence thresholds, how much of the rest is categorized and how
+    much of that matches the reviewed category.
+    """
+    df = df.sort_values('Date', kind='stable')
+    split = int(len(df) * (1 - holdout_share))
+    start = time.perf_counter()
+    classifier = train(df.iloc[:split])
+    train_ms = (time.perf_counter() - start) * 1000
+    holdout = df.iloc[split:]
+    holdout = holdout[holdout['Reviewed'].fillna(False).astype(bool) & holdout['Category'].notna() & ~holdout['Category'].isin(EXCLUDED_CATEGORIES)]
+    if classifier is None or holdout.empty:
+        print("❌ Not enough reviewed transactions to evaluate the classifier.")
+        return
+
+    start = time.perf_counter()
+    predictions = predict(classifier, holdout)
+    predict_ms = (time.perf_counter() - start) * 1000
+    correct = predictions['category'] == holdout['Category']
+    print(f"Trained on {classifier['trained_rows']} reviewed transactions in {train_ms:.0f} ms; "
+          f"predicted {len(holdout)} held-out transactions in {predict_ms:.0f} ms.")
+    print(f"{'Threshold':>10} | {'Categorized':>11} | {'Accuracy':>8}")
+    for threshold in sorted({0.5, 0.6, 0.7, 0.8, 0.9, 1.0, CONFIDENCE_THRESHOLD}):
+        confident = (predictions['confidence'] >= threshold) & (predictions['similarity'] >= MIN_SIMILARITY)
+        accuracy = correct[confident].mean() if confident.any() else 0.0
+        marker = ' <- CONFIDENCE_THRESHOLD' if threshold == CONFIDENCE_THRESHOLD else ''
+        print(f"{threshold:>10.2f} | {confident.mean():>10.1%} | {accuracy:>8.1%}{marker}")
+
+def main():
+    """Command line entry point: evaluate the classifier on held-out history, or categorize one description."""
+    command = sys.argv[1] if len(sys.argv) > 1 else 'evaluate'
+    if not ledger_exists(MASTER_FILE_PATH):
+        print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
+        sys.exit(1)
+
+    if command == 'predict':
+        if len(sys.argv) < 3:
+            print("Usage: python local_classifier.py predict <description> [amount]")
+            return
+        classifier = load_classifier()
+        if classifier is None:
+            print("❌ No reviewed transactions to learn from.")
+            return
+        row = pd.DataFrame({'Description': [sys.argv[2]], 'Amount': [float(sys.argv[3]) if len(sys.argv) > 3 else -1.0]})
+        prediction = predict(classifier, row).iloc[0]
+        verdict = 'confident' if prediction['confidence'] >= CONFIDENCE_THRESHOLD and prediction['similarity'] >= MIN_SIMILARITY else 'not confident; would go to AI'
+        print(f"{prediction['category']} (confidence {prediction['confidence']:.2f}, similarity {prediction['similarity']:.2f}, {verdict})")
+    else:
+        evaluate(load_ledger(MASTER_FILE_PATH, columns=['Date', 'Description', 'Payee', 'Amount', 'Category', 'Reviewed']))
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import os
 import sys
 from datetime import timedelta
 import hashlib
+from ledger_store import load_ledger, save_ledger, ledger_exists
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -35,11 +36,11 @@ def manual_venmo_linker():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Manual Venmo Pass-Through Payment Linker ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         return
 
-    df_master = pd.read_csv(MASTER_FILE_PATH)
+    df_master = load_ledger(MASTER_FILE_PATH, for_update=True)
     
     venmo_path = input("Please provide the path to your 'processed_venmo...' file: ").strip().replace("'", "").replace('"', '')
     if not os.path.exists(venmo_path):
@@ -157,7 +158,7 @@ def manual_venmo_linker():
             df_master.loc[idx, 'Category'] = new_cat
             df_master.loc[idx, 'Reviewed'] = True
         
-        df_master.to_csv(MASTER_FILE_PATH, index=False, encoding='utf-8-sig')
+        save_ledger(df_master, MASTER_FILE_PATH)
         print(f"\n✅ Success! Added {len(new_venmo_transactions)} new Venmo transactions and updated {len(indices_to_update)} bank transactions.")
     else:
         print("\nNo changes were made to the master file.")
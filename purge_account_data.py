@@ -1,6 +1,8 @@
 import pandas as pd
 import os
 import sys
+from ledger_store import load_ledger, ledger_exists
+from ledger_tombstones import delete_transactions
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -8,19 +10,20 @@ MASTER_FILE_PATH = "master_transactions.csv"
 def purge_account_data():
     """
     A utility to completely remove all transactions for a specified account
-    from the master transaction file. This is a destructive operation and
-    should be used carefully to clean up corrupted data before a fresh import.
+    from the master transaction file, to clean up corrupted data before a
+    fresh import. The rows are tombstoned, so they can be restored with
+    'python ledger_tombstones.py restore' until the ledger is compacted.
     """
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Account Data Purge Tool ---")
-    print("⚠️ WARNING: This script will permanently delete data from your master file.")
+    print("⚠️ WARNING: This script will delete data from your master file.")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH)
+        df = load_ledger(MASTER_FILE_PATH, for_update=True)
         print(f"\nMaster file loaded. Contains {len(df)} total transactions.")
         
         print("\nAvailable accounts in master file:")
@@ -42,7 +45,7 @@ def purge_account_data():
             print("Operation cancelled.")
             return
             
-        confirm2 = input("This action cannot be undone. Please type 'DELETE' to confirm: ").strip()
+        confirm2 = input("This action can only be undone until the ledger is compacted. Please type 'DELETE' to confirm: ").strip()
         if confirm2 != 'DELETE':
             print("Confirmation failed. Operation cancelled.")
             return
@@ -63,15 +66,13 @@ def purge_account_data():
         if num_to_purge > 0:
             print(f"\nFound {num_to_purge} transaction(s) for account '{account_to_purge}'. Purging now...")
             
-            # Keep only the rows that DO NOT match the mask
-            df_cleaned = df[~purge_mask]
+            # Tombstone the matching rows; the stored ledger is not rewritten
+            delete_transactions(df[purge_mask], MASTER_FILE_PATH, reason=f"purge account {account_to_purge}")
             
-            final_rows = len(df_cleaned)
+            final_rows = initial_rows - num_to_purge
             print(f" -> Purging complete. {initial_rows} -> {final_rows} rows.")
-
-            # Save the cleaned DataFrame back to the master file
-            df_cleaned.to_csv(MASTER_FILE_PATH, index=False, encoding='utf-8-sig')
             print(f"✅ Success! The file '{MASTER_FILE_PATH}' has been cleaned.")
+            print("Run 'python ledger_tombstones.py compact' to remove the purged rows for good.")
         else:
             print("✅ No transactions found for the specified account. No changes made.")
 
@@ -1,5 +1,7 @@
 import pandas as pd
 import os
+from ledger_store import load_ledger, ledger_exists
+from ledger_tombstones import delete_transactions
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -15,12 +17,12 @@ def purge_incorrect_venmo_entries():
     """
     print("--- Venmo Duplicate Purge Tool ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         return
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH)
+        df = load_ledger(MASTER_FILE_PATH, for_update=True)
         print(f"✅ Master file loaded successfully. Contains {len(df)} total transactions.")
 
         # --- Core Logic ---
@@ -38,14 +40,11 @@ def purge_incorrect_venmo_entries():
         if num_to_purge > 0:
             print(f"Found {num_to_purge} incorrect Venmo transaction(s) to purge.")
             
-            # Keep only the rows that DO NOT meet the condition
-            df_cleaned = df[~condition]
+            # Tombstone the matching rows; they can be restored until the ledger is compacted
+            delete_transactions(df[condition], MASTER_FILE_PATH, reason="venmo duplicate purge")
             
-            final_rows = len(df_cleaned)
+            final_rows = initial_rows - num_to_purge
             print(f" -> Purging transactions... {initial_rows} -> {final_rows} rows.")
-
-            # Save the cleaned DataFrame back to the master file
-            df_cleaned.to_csv(MASTER_FILE_PATH, index=False, encoding='utf-8-sig')
             print(f"✅ Success! The file '{MASTER_FILE_PATH}' has been cleaned.")
             print("\nYou can now run the main 'step3_categorizer.py' script again.")
         else:
@@ -3,6 +3,7 @@ import os
 import sys
 import hashlib
 from datetime import timedelta
+from ledger_store import load_ledger, save_ledger, ledger_exists, filter_new_transactions, pair_transactions
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -39,32 +40,17 @@ def find_venmo_pass_through_matches(df_master):
 
     linked_count = 0
     
-    # 2. Iterate through each funding transaction and look for a matching expense
-    for fund_idx, fund_row in unmatched_funding.iterrows():
-        fund_amount = fund_row['Amount']
-        fund_date = fund_row['Date']
+    # 2. Pair each funding transaction with the first free Venmo expense of the same
+    #    amount (exact cents) within a 3-day window
+    for fund_idx, expense_idx in pair_transactions(unmatched_funding, unlinked_expenses, max_days=3, offsetting=False):
+        # 3. Apply the link and update categories
+        df_master.loc[expense_idx, 'SourceTransactionID'] = unmatched_funding.loc[fund_idx, 'TransactionID']
+        df_master.loc[fund_idx, 'Category'] = VENMO_FUNDING_CATEGORY
         
-        # Look for a Venmo expense with the same amount within a 3-day window
-        match = unlinked_expenses[
-            (abs(unlinked_expenses['Amount'] - fund_amount) < 0.01) &
-            (abs(unlinked_expenses['Date'] - fund_date).dt.days <= 3)
-        ]
-        
-        if not match.empty:
-            # Get the index of the first match
-            expense_idx = match.index[0]
-            
-            # 3. Apply the link and update categories
-            df_master.loc[expense_idx, 'SourceTransactionID'] = fund_row['TransactionID']
-            df_master.loc[fund_idx, 'Category'] = VENMO_FUNDING_CATEGORY
-            
-            # Mark both as reviewed
-            df_master.loc[expense_idx, 'Reviewed'] = True
-            df_master.loc[fund_idx, 'Reviewed'] = True
-
-            # Remove the matched expense so it can't be matched again
-            unlinked_expenses.drop(expense_idx, inplace=True)
-            linked_count += 1
+        # Mark both as reviewed
+        df_master.loc[expense_idx, 'Reviewed'] = True
+        df_master.loc[fund_idx, 'Reviewed'] = True
+        linked_count += 1
             
     return df_master, linked_count
 
@@ -92,28 +78,16 @@ def reconcile_venmo_standard_transfers(df_master):
     
     reconciled_count = 0
 
-    for venmo_idx, venmo_row in venmo_withdrawals.iterrows():
-        venmo_amount = venmo_row['Amount']
-        venmo_date = venmo_row['Date']
+    for venmo_idx, bank_idx in pair_transactions(venmo_withdrawals, bank_deposits, max_days=3):
+        venmo_row = venmo_withdrawals.loc[venmo_idx]
+        rec_id = f"REC-{hashlib.md5(str(venmo_row['TransactionID']).encode()).hexdigest()[:12]}"
         
-        match = bank_deposits[
-            (abs(bank_deposits['Amount'] + venmo_amount) < 0.01) &
-            (abs(bank_deposits['Date'] - venmo_date).dt.days <= 3)
-        ]
+        df_master.loc[venmo_idx, 'ReconciliationID'] = rec_id
+        df_master.loc[bank_idx, 'ReconciliationID'] = rec_id
         
-        if not match.empty:
-            bank_idx = match.index[0]
-            
-            rec_id = f"REC-{hashlib.md5(str(venmo_row['TransactionID']).encode()).hexdigest()[:12]}"
-            
-            df_master.loc[venmo_idx, 'ReconciliationID'] = rec_id
-            df_master.loc[bank_idx, 'ReconciliationID'] = rec_id
-            
-            df_master.loc[venmo_idx, 'Reviewed'] = True
-            df_master.loc[bank_idx, 'Reviewed'] = True
-
-            bank_deposits.drop(bank_idx, inplace=True)
-            reconciled_count += 1
+        df_master.loc[venmo_idx, 'Reviewed'] = True
+        df_master.loc[bank_idx, 'Reviewed'] = True
+        reconciled_count += 1
 
     return df_master, reconciled_count
 
@@ -122,11 +96,11 @@ def main():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Venmo Reconciliation and Data Model Upgrade ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         return
 
-    df_master = pd.read_csv(MASTER_FILE_PATH, dtype={'Category': 'object', 'ReconciliationID': 'object'})
+    df_master = load_ledger(MASTER_FILE_PATH, for_update=True)
 
     # --- Step 1: Add new columns if they don't exist ---
     if 'SourceTransactionID' not in df_master.columns:
@@ -137,8 +111,7 @@ def main():
     venmo_file_path = input("\nPlease provide the path to your 'processed_venmo...' file: ").strip().replace("'", "").replace('"', '')
     if os.path.exists(venmo_file_path):
         df_venmo = pd.read_csv(venmo_file_path)
-        existing_ids = set(df_master['TransactionID'])
-        new_venmo_tx = df_venmo[~df_venmo['TransactionID'].isin(existing_ids)]
+        new_venmo_tx = filter_new_transactions(df_venmo, MASTER_FILE_PATH)
         
         if not new_venmo_tx.empty:
             df_master = pd.concat([df_master, new_venmo_tx], ignore_index=True)
@@ -164,7 +137,7 @@ def main():
         
     # --- Final Save ---
     try:
-        df_master.to_csv(MASTER_FILE_PATH, index=False, encoding='utf-8-sig')
+        save_ledger(df_master, MASTER_FILE_PATH)
         print(f"\n✅ Success! Master file has been updated. It now contains {len(df_master)} transactions.")
     except Exception as e:
         print(f"\n❌ An error occurred while saving the master file: {e}")
@@ -1,6 +1,8 @@
 import pandas as pd
 import os
 import sys
+from ledger_store import load_ledger, save_ledger, ledger_exists
+from ledger_history import current_version
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -18,22 +20,14 @@ def reset_miscategorized_transfers():
     """
     print("--- Miscategorized Transfer Reset Tool ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH)
+        df = load_ledger(MASTER_FILE_PATH, for_update=True)
         print(f"✅ Master file loaded. Analyzing {len(df)} transactions...")
 
-        if 'Reviewed' not in df.columns:
-            df['Reviewed'] = True # Assume all are reviewed if column is missing
-        df['Reviewed'] = df['Reviewed'].fillna(True).astype(bool)
-        
-        # Ensure description and category are strings for searching
-        df['Description'] = df['Description'].astype(str)
-        df['Category'] = df['Category'].astype(str)
-
     except Exception as e:
         print(f"❌ An error occurred while processing the master file: {e}")
         return
@@ -63,8 +57,10 @@ def reset_miscategorized_transfers():
         # Set 'Reviewed' to False for all matching rows
         df.loc[condition, 'Reviewed'] = False
         
-        df.to_csv(MASTER_FILE_PATH, index=False, encoding='utf-8-sig')
+        undo_version = current_version(MASTER_FILE_PATH)
+        save_ledger(df, MASTER_FILE_PATH)
         print(f"✅ Success! {num_to_reset} transaction(s) have been marked as unreviewed.")
+        print(f"   To undo this run: python ledger_history.py restore {undo_version}")
         print("You can now run 'step4_review.py' to correct them.")
     else:
         print("\n✅ No miscategorized transfers found that need review.")
@@ -1,6 +1,8 @@
 import pandas as pd
 import os
 import sys
+from ledger_store import load_ledger, ledger_exists
+from ledger_tombstones import delete_transactions
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -13,12 +15,12 @@ def resolve_reconciliation_duplicates():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Reconciliation ID Duplicate Resolution Tool ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         return
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH, dtype={'Category': 'object', 'ReconciliationID': 'object'})
+        df = load_ledger(MASTER_FILE_PATH, for_update=True)
         if 'ReconciliationID' not in df.columns:
             print(" -> 'ReconciliationID' column not found. Nothing to audit.")
             return
@@ -92,12 +94,12 @@ def resolve_reconciliation_duplicates():
         if indices_to_delete:
             print("\n--- Summary ---")
             print(f"You have marked {len(indices_to_delete)} transaction(s) for deletion.")
-            confirm = input("Type 'DELETE' to permanently remove these transactions: ").strip()
+            confirm = input("Type 'DELETE' to remove these transactions: ").strip()
             
             if confirm == 'DELETE':
-                df.drop(indices_to_delete, inplace=True)
-                df.to_csv(MASTER_FILE_PATH, index=False, encoding='utf-8-sig')
+                delete_transactions(df.loc[indices_to_delete], MASTER_FILE_PATH, reason="reconciliation duplicate")
                 print(f"\n✅ Success! Removed {len(indices_to_delete)} duplicates. Master file updated.")
+                print("They can be restored with 'python ledger_tombstones.py restore' until the ledger is compacted.")
             else:
                 print("\nOperation cancelled. No changes were made.")
         else:
@@ -2,49 +2,21 @@ import pandas as pd
 import os
 import sys
 import json
+from ledger_store import load_ledger, ledger_exists
+import rule_engine
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
 RULES_FILE_PATH = "rules.json"
 
-# --- Helper Functions (Copied from step4_review.py for consistency) ---
+# --- Helper Functions ---
+# Rules are loaded, saved and evaluated by the shared rule engine.
 
 def load_rules():
-    if os.path.exists(RULES_FILE_PATH):
-        with open(RULES_FILE_PATH, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {"rules": []}
+    return rule_engine.load_rules(RULES_FILE_PATH)
 
 def save_rules(rules):
-    with open(RULES_FILE_PATH, 'w', encoding='utf-8') as f:
-        json.dump(rules, f, indent=4)
-
-def check_condition(condition, row):
-    if 'field' not in condition: return False
-    field, operator, value = condition['field'], condition['operator'], condition['value']
-    row_value = row.get(field)
-    if pd.isna(row_value): return False
-    
-    row_value_upper = str(row_value).upper()
-    value_upper = str(value).upper()
-
-    if operator == 'contains': return value_upper in row_value_upper
-    if operator == 'not_contains': return value_upper not in row_value_upper
-    if operator == 'equals':
-        if isinstance(row_value, float): return abs(row_value - float(value)) < 0.001
-        return row_value_upper == value_upper
-    return False
-
-def evaluate_conditions(conditions, row):
-    if 'all_of' in conditions: return all(evaluate_conditions(cond, row) for cond in conditions['all_of'])
-    if 'any_of' in conditions: return any(evaluate_conditions(cond, row) for cond in conditions['any_of'])
-    return check_condition(conditions, row)
-
-def find_matching_rule(row, rules_data):
-    for i, rule in enumerate(rules_data.get('rules', [])):
-        if evaluate_conditions(rule['conditions'], row):
-            return i, rule
-    return None, None
+    rule_engine.save_rules(rules, RULES_FILE_PATH)
 
 # --- Main Debugger Logic ---
 
@@ -52,11 +24,11 @@ def debug_rules():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Rule Debugger & Conflict Resolver ---")
 
-    if not os.path.exists(MASTER_FILE_PATH) or not os.path.exists(RULES_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH) or not os.path.exists(RULES_FILE_PATH):
         print(f"❌ ERROR: Make sure both '{MASTER_FILE_PATH}' and '{RULES_FILE_PATH}' exist.")
         return
 
-    df = pd.read_csv(MASTER_FILE_PATH)
+    df = load_ledger(MASTER_FILE_PATH)
     rules_data = load_rules()
 
     # --- FIX: Made keywords more specific to avoid flagging legitimate electronic payments ---
@@ -75,9 +47,11 @@ def debug_rules():
     print(f"\nFound {len(problem_transactions)} transactions that may be miscategorized by a broad 'Transfer' rule.")
     
     processed_rules = set()
+    candidate_index = rule_engine.build_candidate_index(rules_data)
 
     for index, row in problem_transactions.iterrows():
-        rule_index, matching_rule = find_matching_rule(row, rules_data)
+        rule_index, _ = rule_engine.find_matching_rule(row, rules_data, candidate_index)
+        matching_rule = rules_data['rules'][rule_index] if rule_index is not None else None
 
         if rule_index is not None and rule_index not in processed_rules:
             os.system('cls' if os.name == 'nt' else 'clear')
@@ -114,6 +88,7 @@ def debug_rules():
                     }
                     rules_data['rules'][rule_index]['conditions'] = new_conditions
                     save_rules(rules_data)
+                    candidate_index = rule_engine.build_candidate_index(rules_data)
                     print(" -> Rule updated successfully!")
             
             elif choice == '2':
@@ -121,6 +96,7 @@ def debug_rules():
                 if confirm == 'y':
                     del rules_data['rules'][rule_index]
                     save_rules(rules_data)
+                    candidate_index = rule_engine.build_candidate_index(rules_data)
                     print(" -> Rule deleted successfully!")
 
             processed_rules.add(rule_index) # Mark as processed so we don't ask again for the same rule
@@ -128,6 +104,25 @@ def debug_rules():
     print("\n--- Rule Debugging Complete ---")
     print("It's recommended to run the 'interactive_recategorizer.py' script again to fix the categories.")
 
+def profile_ledger_rules():
+    """Profiles the rules against the whole ledger (--profile-rules)."""
+    if not ledger_exists(MASTER_FILE_PATH):
+        print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
+        return
+    rule_engine.run_rule_profile(load_ledger(MASTER_FILE_PATH), load_rules())
+
+def report_rule_conflicts():
+    """Lists every pair of rules that match the same transactions with different categories (--rule-conflicts)."""
+    if not ledger_exists(MASTER_FILE_PATH):
+        print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
+        return
+    rule_engine.run_conflict_report(load_ledger(MASTER_FILE_PATH), load_rules())
+
 if __name__ == "__main__":
-    debug_rules()
+    if rule_engine.profile_requested():
+        profile_ledger_rules()
+    elif rule_engine.conflicts_requested():
+        report_rule_conflicts()
+    else:
+        debug_rules()
 
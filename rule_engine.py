@@ -0,0 +1,1043 @@
+import numpy as np
+import pandas as pd
+import json
+import os
+import re
+import sys
+import time
+import hashlib
+from datetime import datetime
+from collections import deque
+from difflib import SequenceMatcher
+from functools import lru_cache
+from ledger_store import ledger_cents, to_cents, _replace_file
+
+try:
+    import ahocorasick # Optional C implementation of the keyword automaton
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# --- Configuration ---
+# rules.json holds an ordered list of {"category", "conditions"} rules; a condition
+# tree is a leaf {"field", "operator", "value"} or an "all_of"/"any_of" list of trees.
+# The first rule that matches a transaction decides its category.
+# Operators: contains, not_contains, equals, greater_than, less_than, regex (a
+# case-insensitive search), between ([low, high], inclusive) and in (a list).
+RULES_FILE_PATH = "rules.json"
+AMOUNT_FIELD = 'Amount' # Compared as exact integer cents
+FLOAT_EQUALS_TOLERANCE = 0.001
+KEYWORD_OPERATORS = ('contains', 'not_contains')
+COMPARISON_OPERATORS = ('equals', 'greater_than', 'less_than', 'between', 'in')
+INLINE_FLAGS = re.compile(r'\(\?[aiLmsux-]') # Patterns with inline flags are never merged
+
+# The legacy flat format ({"KEYWORD&KEYWORD|AMOUNT=12.34": category}, optionally
+# starting with "ACCOUNT=NAME&") is converted into structured rules on load.
+LEGACY_ACCOUNT_PREFIX = 'ACCOUNT='
+LEGACY_AMOUNT_PREFIX = 'AMOUNT='
+
+# Rule results are memoized on disk per distinct (Description, Account, Amount, ...)
+# combination, i.e. the values of the fields the rules look at. The memo belongs
+# to one version of the rules: any change to them starts it afresh.
+RULE_CACHE_PATH = "rules.cache.json"
+RULE_CACHE_MAX_ENTRIES = 100000 # Least recently used entries are dropped beyond this
+
+# Profiling: 'python rule_engine.py --profile-rules' (the flag also works for
+# step3_categorizer.py, step4_review.py and rule_debugger.py) times every rule
+# and writes the report as JSON.
+PROFILE_FLAG = '--profile-rules'
+RULE_PROFILE_PATH = "rules.profile.json"
+PROFILE_REPEATS = 3 # Each rule's time is the best of this many runs
+CONFLICTS_FLAG = '--rule-conflicts'
+RULE_CONFLICTS_PATH = "rules.conflicts.json"
+
+def load_rules(path=RULES_FILE_PATH, accounts=None):
+    """
+    Loads the structured rules from the JSON file. A file still in the legacy
+    key format is converted (see legacy_rule for the `accounts` argument).
+    """
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            rules_data = json.load(f)
+        if isinstance(rules_data.get('rules'), list):
+            return rules_data
+        return convert_legacy_rules(rules_data, accounts)
+    return {"rules": []}
+
+def save_rules(rules_data, path=RULES_FILE_PATH):
+    """Saves the structured rules to the JSON file."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(rules_data, f, indent=4)
+
+def legacy_rule(rule_key, category, accounts=None):
+    """
+    Converts one legacy rule key ("ACCOUNT=NAME&KW1&KW2|AMOUNT=12.34"; the step6
+    form "KW|12.34" is accepted too) into a structured rule, or None if its amount
+    is unreadable. Legacy keys hold upper-cased account names; pass the ledger's
+    account names as `accounts` to restore their spelling for the 'equals' test.
+    """
+    keywords_str, amount_str = rule_key, None
+    if '|' in keywords_str:
+        keywords_str, amount_str = keywords_str.split('|', 1)
+        amount_str = amount_str.strip()
+        if amount_str.upper().startswith(LEGACY_AMOUNT_PREFIX):
+            amount_str = amount_str[len(LEGACY_AMOUNT_PREFIX):]
+
+    conditions = []
+    for part in keywords_str.split('&'):
+        part = part.strip()
+        if part.upper().startswith(LEGACY_ACCOUNT_PREFIX):
+            account = part[len(LEGACY_ACCOUNT_PREFIX):].strip()
+            spellings = {str(a).upper(): a for a in (accounts if accounts is not None else [])}
+            conditions.append({"field": "Account", "operator": "equals", "value": spellings.get(account.upper(), account)})
+        elif part:
+            conditions.append({"field": "Description", "operator": "contains", "value": part.upper()})
+
+    if amount_str is not None:
+        cents = to_cents(amount_str)
+        if cents is None:
+            return None
+        conditions.append({"field": AMOUNT_FIELD, "operator": "equals", "value": cents / 100})
+    return {"category": category, "conditions": {"all_of": conditions}}
+
+def convert_legacy_rules(legacy_rules, accounts=None):
+    """Converts a legacy {rule_key: category} mapping, in order, into the structured format."""
+    rules = [legacy_rule(key, category, accounts) for key, category in legacy_rules.items()]
+    return {"rules": [rule for rule in rules if rule is not None]}
+
+def check_condition(condition, row):
+    """
+    Checks if a single, simple condition is met by one transaction row.
+    This is the reference semantics that the compiled masks reproduce.
+    """
+    if 'field' not in condition:
+        return False
+    return _check_value(condition['field'], condition['operator'], condition['value'], row.get(condition['field']))
+
+@lru_cache(maxsize=None)
+def _pattern(value):
+    """Compiles a regex condition's pattern once; an invalid pattern never matches."""
+    try:
+        return re.compile(str(value), re.IGNORECASE)
+    except re.error as e:
+        print(f"⚠️ Invalid regex '{value}' in the rules ({e}); it will not match anything.")
+        return None
+
+def _range(value):
+    """The (low, high) bounds of a 'between' condition, or None if malformed."""
+    if isinstance(value, (list, tuple)) and len(value) == 2:
+        return value[0], value[1]
+    return None
+
+def _check_value(field, operator, value, row_value):
+    """The leaf test for one cell value."""
+    if row_value is None or (not isinstance(row_value, str) and pd.isna(row_value)):
+        return False
+    if operator == 'regex':
+        pattern = _pattern(value)
+        return isinstance(row_value, str) and pattern is not None and pattern.search(row_value) is not None
+    if operator == 'between':
+        bounds = _range(value)
+        if bounds is None:
+            return False
+        if field == AMOUNT_FIELD:
+            row_value, low, high = to_cents(row_value), to_cents(bounds[0]), to_cents(bounds[1])
+            if None in (row_value, low, high):
+                return False
+            return low <= row_value <= high
+        try:
+            return bounds[0] <= row_value <= bounds[1]
+        except TypeError:
+            return False
+    if operator == 'in':
+        if not isinstance(value, (list, tuple)):
+            return False
+        if field == AMOUNT_FIELD:
+            return to_cents(row_value) in {to_cents(v) for v in value}
+        return any(_check_value(field, 'equals', v, row_value) for v in value)
+    if field == AMOUNT_FIELD:
+        row_value, value = to_cents(row_value), to_cents(value)
+        if row_value is None or value is None:
+            return False
+
+    try:
+        if operator == 'contains':
+            return isinstance(row_value, str) and str(value).upper() in row_value.upper()
+        elif operator == 'not_contains':
+            return isinstance(row_value, str) and str(value).upper() not in row_value.upper()
+        elif operator == 'equals':
+            if isinstance(row_value, float):
+                return abs(row_value - value) < FLOAT_EQUALS_TOLERANCE
+            return row_value == value
+        elif operator == 'greater_than':
+            return row_value > value
+        elif operator == 'less_than':
+            return row_value < value
+    except TypeError:
+        return False
+    return False
+
+def evaluate_conditions(conditions, row):
+    """Recursively evaluates a condition tree against one transaction row."""
+    if 'all_of' in conditions:
+        return all(evaluate_conditions(cond, row) for cond in conditions['all_of'])
+    if 'any_of' in conditions:
+        return any(evaluate_conditions(cond, row) for cond in conditions['any_of'])
+    return check_condition(conditions, row)
+
+def find_matching_rule(row, rules_data, candidate_index=None):
+    """
+    Finds the first rule that matches one transaction row: (index, category) or (None, None).
+    With a candidate index (build_candidate_index) only the rules that can match are tested.
+    """
+    rules = rules_data.get('rules', [])
+    for i in (candidate_rules(row, candidate_index) if candidate_index is not None else range(len(rules))):
+        if evaluate_conditions(rules[i]['conditions'], row):
+            return i, rules[i]['category']
+    return None, None
+
+# --- Keyword automaton ---
+# Every contains/not_contains keyword of the rule set goes into one Aho-Corasick
+# automaton per field, so each distinct description is scanned once, in time
+# proportional to its length, however many keywords the rules use.
+
+def build_automaton(keywords):
+    """Builds the automaton for a list of (upper-cased, non-empty) keywords."""
+    if AHOCORASICK_AVAILABLE:
+        automaton = ahocorasick.Automaton()
+        for keyword_id, keyword in enumerate(keywords):
+            automaton.add_word(keyword, keyword_id)
+        if keywords:
+            automaton.make_automaton()
+        return automaton
+
+    goto, fail, out = [{}], [0], [[]]
+    for keyword_id, keyword in enumerate(keywords):
+        state = 0
+        for ch in keyword:
+            if ch not in goto[state]:
+                goto[state][ch] = len(goto)
+                goto.append({})
+                fail.append(0)
+                out.append([])
+            state = goto[state][ch]
+        out[state].append(keyword_id)
+
+    queue = deque(goto[0].values()) # Depth-1 states fail back to the root
+    while queue:
+        state = queue.popleft()
+        for ch, child in goto[state].items():
+            queue.append(child)
+            fallback = fail[state]
+            while fallback and ch not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[child] = goto[fallback].get(ch, 0)
+            out[child] = out[child] + out[fail[child]]
+    return goto, fail, out
+
+def scan_keywords(automaton, text):
+    """The ids of every keyword that occurs in the (upper-cased) text."""
+    if AHOCORASICK_AVAILABLE:
+        if len(automaton) == 0:
+            return set()
+        return {keyword_id for _, keyword_id in automaton.iter(text)}
+
+    goto, fail, out = automaton
+    found, state = set(), 0
+    for ch in text:
+        while state and ch not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(ch, 0)
+        if out[state]:
+            found.update(out[state])
+    return found
+
+def _collect_keywords(conditions, keywords):
+    """Adds the contains/not_contains keywords of a condition tree to {field: {keyword: None}}."""
+    for key in ('all_of', 'any_of'):
+        if key in conditions:
+            for cond in conditions[key]:
+                _collect_keywords(cond, keywords)
+            return keywords
+    if 'field' in conditions and conditions.get('operator') in KEYWORD_OPERATORS:
+        keyword = str(conditions['value']).upper()
+        if keyword:
+            keywords.setdefault(conditions['field'], {})[keyword] = None
+    return keywords
+
+# --- Candidate index ---
+# For row-by-row evaluation: a rule that requires an exact Account can only match
+# rows of that account, and a rule that requires a keyword (or one of an any_of
+# list of keywords) can only match rows containing it. Each rule is filed under
+# its account and its anchor keywords; one automaton scan of the row finds the
+# anchors present, so a row only tests the rules that could match it.
+
+def _required_account(conditions):
+    """The Account a rule requires with 'equals', or None."""
+    if 'all_of' in conditions:
+        return next((a for a in map(_required_account, conditions['all_of']) if a is not None), None)
+    if 'any_of' in conditions:
+        return _required_account(conditions['any_of'][0]) if len(conditions['any_of']) == 1 else None
+    if conditions.get('field') == 'Account' and conditions.get('operator') == 'equals' and isinstance(conditions.get('value'), str):
+        return conditions['value']
+    return None
+
+def _anchor_keywords(conditions):
+    """
+    (field, keyword) pairs of which a matching row must contain at least one, or
+    None when the rule has no such requirement. For an all_of the most selective
+    child (fewest, then longest, keywords) is used.
+    """
+    if 'all_of' in conditions:
+        options = [a for a in map(_anchor_keywords, conditions['all_of']) if a is not None]
+        return min(options, key=lambda a: (len(a), -min((len(k) for _, k in a), default=0))) if options else None
+    if 'any_of' in conditions:
+        options = [_anchor_keywords(cond) for cond in conditions['any_of']]
+        return None if any(a is None for a in options) else [pair for a in options for pair in a]
+    if 'field' in conditions and conditions.get('operator') == 'contains' and str(conditions['value']):
+        return [(conditions['field'], str(conditions['value']).upper())]
+    return None
+
+def build_candidate_index(rules_data):
+    """Files every rule under its required account and anchor keywords."""
+    by_account, anchors, unanchored = {}, {}, []
+    for i, rule in enumerate(rules_data.get('rules', [])):
+        by_account.setdefault(_required_account(rule['conditions']), []).append(i)
+        keywords = _anchor_keywords(rule['conditions'])
+        if keywords is None:
+            unanchored.append(i)
+        for field, keyword in keywords or []:
+            anchors.setdefault(field, {}).setdefault(keyword, []).append(i)
+
+    return {
+        'by_account': by_account,
+        'unanchored': unanchored,
+        'anchors': {
+            field: (list(keywords.values()), build_automaton(list(keywords)))
+            for field, keywords in anchors.items()
+        },
+    }
+
+def candidate_rules(row, candidate_index):
+    """The rules (in order) that could match the row."""
+    account = row.get('Account')
+    possible = set(candidate_index['by_account'].get(None, []))
+    if isinstance(account, str):
+        possible.update(candidate_index['by_account'].get(account, []))
+    allowed = set(candidate_index['unanchored'])
+    for field, (rule_lists, automaton) in candidate_index['anchors'].items():
+        value = row.get(field)
+        if isinstance(value, str):
+            for keyword_id in scan_keywords(automaton, value.upper()):
+                allowed.update(rule_lists[keyword_id])
+    return sorted(possible & allowed)
+
+# --- Vectorized evaluation ---
+# A compiled condition is a function from a context (the DataFrame plus per-field
+# caches shared by all rules) to a boolean numpy array with one entry per row.
+
+def _context(df, compiled=None):
+    """Per-evaluation state shared by every compiled rule."""
+    return {
+        'df': df, 'rows': len(df), 'compiled': compiled,
+        'text': {}, 'present': {}, 'keyword_hits': {}, 'cents': None,
+    }
+
+def _present(ctx, field):
+    """Rows where the field has a value (missing cells never match, as in check_condition)."""
+    if field not in ctx['present']:
+        df = ctx['df']
+        ctx['present'][field] = df[field].notna().to_numpy(dtype=bool) if field in df.columns else np.zeros(ctx['rows'], dtype=bool)
+    return ctx['present'][field]
+
+def _text(ctx, field):
+    """
+    The field's distinct upper-cased texts, each row's position among them, and
+    which rows hold text at all. Recurring merchant strings are scanned only once.
+    """
+    if field not in ctx['text']:
+        values = ctx['df'][field].astype(object).tolist()
+        upper = [v.upper() if isinstance(v, str) else '' for v in values]
+        codes, uniques = pd.factorize(pd.Series(upper, dtype=object))
+        is_str = np.fromiter((isinstance(v, str) for v in values), dtype=bool, count=len(values))
+        ctx['text'][field] = (codes, list(uniques), is_str)
+    return ctx['text'][field]
+
+def _keyword_hits(ctx, field):
+    """
+    Scans the field's distinct texts once with the rule set's automaton and returns
+    ({keyword: column}, a (distinct texts x keywords) boolean matrix).
+    """
+    if field not in ctx['keyword_hits']:
+        compiled = ctx['compiled']
+        keywords = list(compiled['keywords'].get(field, {})) if compiled else []
+        if compiled is not None and field not in compiled['automata']:
+            compiled['automata'][field] = build_automaton(keywords)
+        _, uniques, _ = _text(ctx, field)
+        matrix = np.zeros((len(uniques), len(keywords)), dtype=bool)
+        if keywords:
+            automaton = compiled['automata'][field]
+            for text_id, text in enumerate(uniques):
+                found = scan_keywords(automaton, text)
+                if found:
+                    matrix[text_id, list(found)] = True
+        ctx['keyword_hits'][field] = ({keyword: i for i, keyword in enumerate(keywords)}, matrix)
+    return ctx['keyword_hits'][field]
+
+def _raw_text(ctx, field):
+    """The field's distinct texts as written (for regex conditions) and each row's position among them."""
+    key = ('raw', field)
+    if key not in ctx['text']:
+        values = ctx['df'][field].astype(object).tolist()
+        codes, uniques = pd.factorize(pd.Series([v if isinstance(v, str) else '' for v in values], dtype=object))
+        ctx['text'][key] = (codes, list(uniques))
+    return ctx['text'][key]
+
+def _regex(ctx, field, pattern):
+    """Rows whose text the compiled pattern finds a match in (each distinct text is searched once)."""
+    codes, uniques = _raw_text(ctx, field)
+    distinct = np.fromiter((pattern.search(text) is not None for text in uniques), dtype=bool, count=len(uniques))
+    return distinct[codes] & _text(ctx, field)[2]
+
+def _contains_any(ctx, field, needles):
+    """Rows whose text contains at least one of the upper-cased needles."""
+    codes, uniques, _ = _text(ctx, field)
+    if any(not needle for needle in needles):
+        return np.ones(ctx['rows'], dtype=bool)
+    columns, matrix = _keyword_hits(ctx, field)
+    known = [columns[needle] for needle in needles if needle in columns]
+    distinct = matrix[:, known].any(axis=1) if known else np.zeros(len(uniques), dtype=bool)
+    for needle in needles:
+        if needle not in columns:
+            distinct |= np.fromiter((needle in text for text in uniques), dtype=bool, count=len(uniques))
+    return distinct[codes]
+
+def _contains(ctx, field, needle):
+    """Rows whose text contains the upper-cased needle (looked up in the automaton's results)."""
+    codes, uniques, _ = _text(ctx, field)
+    if not needle:
+        return np.ones(ctx['rows'], dtype=bool)
+    columns, matrix = _keyword_hits(ctx, field)
+    if needle in columns:
+        return matrix[codes, columns[needle]]
+    # A condition compiled outside this rule set: plain substring test over the distinct texts
+    distinct = np.fromiter((needle in text for text in uniques), dtype=bool, count=len(uniques))
+    return distinct[codes]
+
+def _cents(ctx):
+    """The amounts as integer cents (computed once per evaluation)."""
+    if ctx['cents'] is None:
+        ctx['cents'] = ledger_cents(ctx['df'])
+    return ctx['cents']
+
+def _is_text(series):
+    return not (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series) or pd.api.types.is_datetime64_any_dtype(series))
+
+def _compile_leaf(condition):
+    """Compiles one {"field", "operator", "value"} condition."""
+    if 'field' not in condition:
+        return lambda ctx: np.zeros(ctx['rows'], dtype=bool)
+    field, operator, value = condition['field'], condition['operator'], condition['value']
+
+    def evaluate(ctx):
+        df = ctx['df']
+        if field not in df.columns:
+            return np.zeros(ctx['rows'], dtype=bool)
+        present = _present(ctx, field)
+        column = df[field]
+
+        if operator == 'regex':
+            pattern = _pattern(value)
+            if pattern is None or not _is_text(column):
+                return column.map(lambda v: _check_value(field, operator, value, v)).to_numpy(dtype=bool)
+            return _regex(ctx, field, pattern) & present
+
+        if field == AMOUNT_FIELD:
+            cents = _cents(ctx)
+            if operator == 'between':
+                bounds = _range(value)
+                low, high = (to_cents(bounds[0]), to_cents(bounds[1])) if bounds else (None, None)
+                if low is None or high is None:
+                    return np.zeros(ctx['rows'], dtype=bool)
+                return ((cents >= low) & (cents <= high)).fillna(False).to_numpy(dtype=bool) & present
+            if operator == 'in':
+                targets = [to_cents(v) for v in value] if isinstance(value, (list, tuple)) else []
+                return cents.isin([t for t in targets if t is not None]).fillna(False).to_numpy(dtype=bool) & present
+            target = to_cents(value)
+            if target is None or operator not in ('equals', 'greater_than', 'less_than'):
+                return np.zeros(ctx['rows'], dtype=bool)
+            compare = {'equals': cents == target, 'greater_than': cents > target, 'less_than': cents < target}[operator]
+            return compare.fillna(False).to_numpy(dtype=bool) & present
+
+        if _is_text(column) and operator == 'in' and isinstance(value, (list, tuple)):
+            return column.astype(object).isin(list(value)).to_numpy(dtype=bool) & present
+        if pd.api.types.is_numeric_dtype(column) and operator == 'between' and _range(value) \
+                and all(isinstance(v, (int, float)) for v in _range(value)):
+            low, high = _range(value)
+            return column.between(low, high).to_numpy(dtype=bool) & present
+        if _is_text(column) and operator in ('contains', 'not_contains'):
+            hits = _contains(ctx, field, str(value).upper())
+            texts = _text(ctx, field)[2]
+            return present & texts & (hits if operator == 'contains' else ~hits)
+        if _is_text(column) and operator == 'equals':
+            return (column.astype(object) == value).to_numpy(dtype=bool) & present
+        if pd.api.types.is_float_dtype(column) and operator == 'equals' and isinstance(value, (int, float)):
+            return ((column - value).abs() < FLOAT_EQUALS_TOLERANCE).to_numpy(dtype=bool) & present
+        if pd.api.types.is_numeric_dtype(column) and operator in ('equals', 'greater_than', 'less_than') and isinstance(value, (int, float)):
+            compare = {'equals': column == value, 'greater_than': column > value, 'less_than': column < value}[operator]
+            return compare.to_numpy(dtype=bool) & present
+
+        # Anything else (dates, mixed columns, unusual operators) is tested cell by cell.
+        return column.map(lambda v: _check_value(field, operator, value, v)).to_numpy(dtype=bool)
+
+    return evaluate
+
+def _merge_any_of(conditions):
+    """
+    Collapses the leaves of an any_of that test the same text field into one check:
+    contains keywords become one lookup in the keyword automaton's results, regex
+    patterns one alternation, and equals values one 'in' test. Returns the merged
+    checks and the conditions that are left as they are.
+    """
+    groups, rest = {}, []
+    for cond in conditions:
+        operator = cond.get('operator')
+        mergeable = 'field' in cond and cond['field'] != AMOUNT_FIELD and (
+            operator == 'contains'
+            or (operator == 'equals' and isinstance(cond['value'], str))
+            or (operator == 'regex' and _pattern(cond['value']) is not None and _pattern(cond['value']).groups == 0
+                and not INLINE_FLAGS.search(str(cond['value']))))
+        if mergeable:
+            groups.setdefault((cond['field'], operator), []).append(cond)
+        else:
+            rest.append(cond)
+
+    merged = []
+    for (field, operator), group in groups.items():
+        if len(group) == 1:
+            rest.extend(group)
+        elif operator == 'contains':
+            merged.append(_compile_contains_any(field, group))
+        elif operator == 'regex':
+            alternation = '|'.join(f"(?:{cond['value']})" for cond in group)
+            merged.append(_compile_leaf({'field': field, 'operator': 'regex', 'value': alternation}))
+        else:
+            merged.append(_compile_leaf({'field': field, 'operator': 'in', 'value': [cond['value'] for cond in group]}))
+    return merged, rest
+
+def _compile_contains_any(field, group):
+    """One check for several 'contains' conditions on the same field."""
+    needles = [str(cond['value']).upper() for cond in group]
+    leaves = [_compile_leaf(cond) for cond in group]
+
+    def evaluate(ctx):
+        df = ctx['df']
+        if field not in df.columns:
+            return np.zeros(ctx['rows'], dtype=bool)
+        if not _is_text(df[field]):
+            mask = np.zeros(ctx['rows'], dtype=bool)
+            for leaf in leaves:
+                mask |= leaf(ctx)
+            return mask
+        return _present(ctx, field) & _text(ctx, field)[2] & _contains_any(ctx, field, needles)
+
+    return evaluate
+
+def compile_conditions(conditions):
+    """Turns a condition tree into one function that returns the rule's boolean mask over a DataFrame."""
+    if 'all_of' in conditions:
+        parts = [compile_conditions(cond) for cond in conditions['all_of']]
+        def all_of(ctx):
+            mask = np.ones(ctx['rows'], dtype=bool)
+            for part in parts:
+                mask &= part(ctx)
+            return mask
+        return all_of
+    if 'any_of' in conditions:
+        merged, rest = _merge_any_of(conditions['any_of'])
+        parts = merged + [compile_conditions(cond) for cond in rest]
+        def any_of(ctx):
+            mask = np.zeros(ctx['rows'], dtype=bool)
+            for part in parts:
+                mask |= part(ctx)
+            return mask
+        return any_of
+    return _compile_leaf(conditions)
+
+def compile_rules(rules_data):
+    """
+    Compiles every rule of a rules.json structure, in order, along with the
+    keywords for the automata (which are built on first use and then reused).
+    """
+    rules = rules_data.get('rules', [])
+    keywords = {}
+    for rule in rules:
+        _collect_keywords(rule['conditions'], keywords)
+    return {
+        'masks': [compile_conditions(rule['conditions']) for rule in rules],
+        'keywords': keywords,
+        'automata': {},
+    }
+
+def match_matrix(df, rules_data, compiled=None):
+    """A (rows x rules) boolean matrix: True where the rule's conditions hold for the row."""
+    compiled = compile_rules(rules_data) if compiled is None else compiled
+    ctx = _context(df, compiled)
+    matrix = np.zeros((len(df), len(compiled['masks'])), dtype=bool)
+    for i, rule_mask in enumerate(compiled['masks']):
+        matrix[:, i] = rule_mask(ctx)
+    return matrix
+
+def first_matching_rules(df, rules_data, compiled=None):
+    """
+    The index of the first matching rule for every row (-1 where none matches),
+    as a Series aligned with df. Precedence is resolved in one argmax over the
+    match matrix rather than a per-row walk of the rule list.
+    """
+    matrix = match_matrix(df, rules_data, compiled)
+    first = np.where(matrix.any(axis=1), matrix.argmax(axis=1), -1) if matrix.shape[1] else np.full(len(df), -1)
+    return pd.Series(first, index=df.index, dtype='int64')
+
+# --- Persistent memo ---
+
+def rules_hash(rules_data):
+    """A hash of the rule set; the memo is only valid for the rules it was built with."""
+    return hashlib.sha256(json.dumps(rules_data, sort_keys=True).encode('utf-8')).hexdigest()
+
+def _rule_fields(conditions, fields):
+    """Adds every field a condition tree looks at to `fields` (a dict used as an ordered set)."""
+    for key in ('all_of', 'any_of'):
+        if key in conditions:
+            for cond in conditions[key]:
+                _rule_fields(cond, fields)
+            return fields
+    if 'field' in conditions:
+        fields[conditions['field']] = None
+    return fields
+
+def _memo_keys(df, fields):
+    """One key per row from the values of the given fields (amounts as cents, missing cells as null)."""
+    columns = []
+    for field in fields:
+        if field not in df.columns:
+            columns.append([None] * len(df))
+        elif field == AMOUNT_FIELD:
+            columns.append([None if pd.isna(v) else int(v) for v in ledger_cents(df)])
+        else:
+            columns.append([None if not isinstance(v, str) and pd.isna(v) else v if isinstance(v, (str, int, float, bool)) else str(v)
+                            for v in df[field].astype(object)])
+    return [json.dumps(values) for values in zip(*columns)] if columns else ['[]'] * len(df)
+
+def load_rule_cache(rules_data, path=RULE_CACHE_PATH):
+    """Reads the memo as {key: rule index}, or an empty one if it was built for other rules."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return cache.get('entries', {}) if cache.get('rules_hash') == rules_hash(rules_data) else {}
+
+def save_rule_cache(entries, rules_data, path=RULE_CACHE_PATH):
+    """Writes the memo, dropping the least recently used entries beyond RULE_CACHE_MAX_ENTRIES."""
+    if len(entries) > RULE_CACHE_MAX_ENTRIES:
+        entries = dict(list(entries.items())[-RULE_CACHE_MAX_ENTRIES:])
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'rules_hash': rules_hash(rules_data), 'entries': entries}, f)
+    _replace_file(write, path)
+
+def cached_first_matching_rules(df, rules_data, compiled=None, path=RULE_CACHE_PATH):
+    """
+    first_matching_rules() through the persistent memo: only key combinations that
+    are not in it yet are evaluated (one row each), and the memo is saved back.
+    """
+    if df.empty:
+        return pd.Series([], index=df.index, dtype='int64')
+    fields = {}
+    for rule in rules_data.get('rules', []):
+        _rule_fields(rule['conditions'], fields)
+    keys = pd.Series(_memo_keys(df, list(fields)), index=df.index)
+    entries = load_rule_cache(rules_data, path)
+
+    missing = ~keys.isin(entries.keys()) if entries else pd.Series(True, index=df.index)
+    if missing.any():
+        first_rows = keys[missing].drop_duplicates()
+        results = first_matching_rules(df.loc[first_rows.index], rules_data, compiled)
+        entries.update(zip(first_rows, results.astype(int).tolist()))
+
+    for key in keys.unique(): # Mark as recently used: later entries are evicted last
+        entries[key] = entries.pop(key)
+    save_rule_cache(entries, rules_data, path)
+    return keys.map(entries).astype('int64')
+
+# --- Incremental rescans ---
+# An interactive session keeps every row's first-match index. When the rules are
+# edited, the old and new rule lists are diffed: rules whose conditions did not
+# change keep their results, so only the added or edited rules are evaluated, and
+# only on rows whose current first match comes after them. Rows whose rule was
+# removed or edited, or whose own values changed, are evaluated in full.
+
+def _rule_signatures(rules_data):
+    return [json.dumps(rule['conditions'], sort_keys=True) for rule in rules_data.get('rules', [])]
+
+def _diff_rules(old, new):
+    """
+    Matches old and new rule signatures: (old_to_new, fresh). old_to_new maps each
+    old rule with unchanged conditions to its new position (len(new) for removed
+    rules, plus a final slot for "no match"); fresh marks new rules to evaluate.
+    """
+    old_to_new = np.full(len(old) + 1, len(new))
+    fresh = np.ones(len(new), dtype=bool)
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            old_to_new[i1:i2] = np.arange(j1, j2)
+            fresh[j1:j2] = False
+    return old_to_new, fresh
+
+def _fingerprints(df, fields):
+    """A hash per row of the values the rules look at (amounts as cents)."""
+    values = pd.DataFrame(index=df.index)
+    for field in fields:
+        if field == AMOUNT_FIELD and field in df.columns:
+            values[field] = ledger_cents(df)
+        elif field in df.columns:
+            values[field] = df[field].astype(object).where(df[field].notna(), None).astype(str)
+    if values.columns.empty:
+        return pd.Series(0, index=df.index, dtype='uint64')
+    return pd.util.hash_pandas_object(values, index=False)
+
+def first_match_state(df, rules_data, compiled=None, cache_path=RULE_CACHE_PATH):
+    """
+    Evaluates the rules once (through the memo at cache_path; None skips it) and
+    keeps what refresh_first_matches() needs to update the result.
+    """
+    fields = {}
+    for rule in rules_data.get('rules', []):
+        _rule_fields(rule['conditions'], fields)
+    if cache_path is None:
+        first = first_matching_rules(df, rules_data, compiled)
+    else:
+        first = cached_first_matching_rules(df, rules_data, compiled, cache_path)
+    return {
+        'signatures': _rule_signatures(rules_data),
+        'fields': list(fields),
+        'first': first,
+        'fingerprints': _fingerprints(df, list(fields)),
+        'cache_path': cache_path,
+    }
+
+def refresh_first_matches(state, df, rules_data):
+    """Brings the first-match index of every row of df up to date with the rules and returns it."""
+    fields = {}
+    for rule in rules_data.get('rules', []):
+        _rule_fields(rule['conditions'], fields)
+    if list(fields) != state['fields']: # A rule looks at a new field: start over
+        state.update(first_match_state(df, rules_data, cache_path=state.get('cache_path', RULE_CACHE_PATH)))
+        return state['first']
+
+    old, new = state['signatures'], _rule_signatures(rules_data)
+    old_to_new, fresh = _diff_rules(old, new) # The extra slot maps "no match" (-1) to "no match"
+    removed = np.ones(len(old) + 1, dtype=bool)
+    removed[np.flatnonzero(old_to_new[:len(old)] < len(new))] = False
+    removed[-1] = False
+
+    fingerprints = _fingerprints(df, state['fields'])
+    previous = state['first'].reindex(df.index)
+    known = previous.notna() & (state['fingerprints'].reindex(df.index) == fingerprints)
+    old_first = previous.fillna(-1).astype(int).to_numpy()
+    stale = ~known.to_numpy() | removed[old_first]
+
+    first = old_to_new[old_first] # Positions of the surviving rules in the new list
+    for k in np.flatnonzero(fresh): # Earlier new rules take precedence over later ones
+        candidates = ~stale & (first > k)
+        if candidates.any():
+            subset = df[candidates]
+            hits = compile_conditions(rules_data['rules'][k]['conditions'])(_context(subset))
+            first[np.flatnonzero(candidates)[hits]] = k
+    if stale.any():
+        first[stale] = first_matching_rules(df[stale], rules_data).to_numpy()
+    first[first == len(new)] = -1
+
+    state.update({'signatures': new, 'first': pd.Series(first, index=df.index, dtype='int64'), 'fingerprints': fingerprints})
+    return state['first']
+
+# --- Match bitsets ---
+# The full rules x transactions match matrix, one bit per cell (np.packbits), kept
+# in step with rule and row changes like the first-match state above. Coverage
+# counts, impact previews and overlaps are then bitwise ANDs/ORs plus a popcount.
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def _popcount(packed):
+    return int(_POPCOUNT[packed].sum())
+
+def build_match_bits(df, rules_data, compiled=None):
+    """Evaluates every rule over df and keeps the packed match matrix."""
+    fields = {}
+    for rule in rules_data.get('rules', []):
+        _rule_fields(rule['conditions'], fields)
+    matrix = match_matrix(df, rules_data, compiled)
+    return {
+        'signatures': _rule_signatures(rules_data),
+        'fields': list(fields),
+        'index': df.index.copy(),
+        'fingerprints': _fingerprints(df, list(fields)),
+        'bits': np.packbits(matrix.T, axis=1),
+    }
+
+def refresh_match_bits(state, df, rules_data):
+    """
+    Brings the bitsets up to date: added or edited rules are evaluated over all rows,
+    and new rows or rows whose values changed are evaluated against all rules.
+    """
+    fields = {}
+    for rule in rules_data.get('rules', []):
+        _rule_fields(rule['conditions'], fields)
+    if list(fields) != state['fields']:
+        state.update(build_match_bits(df, rules_data))
+        return state
+
+    rules = rules_data.get('rules', [])
+    new = _rule_signatures(rules_data)
+    old_to_new, fresh = _diff_rules(state['signatures'], new)
+    fingerprints = _fingerprints(df, state['fields'])
+    old_rows = state['index'].get_indexer(df.index)
+    known = old_rows >= 0
+    known[known] = state['fingerprints'].to_numpy()[old_rows[known]] == fingerprints.to_numpy()[known]
+
+    old_matrix = np.unpackbits(state['bits'], axis=1, count=len(state['index'])).astype(bool)
+    matrix = np.zeros((len(new), len(df)), dtype=bool)
+    survivors = np.flatnonzero(old_to_new[:-1] < len(new))
+    known_rows = np.flatnonzero(known)
+    matrix[np.ix_(old_to_new[survivors], known_rows)] = old_matrix[np.ix_(survivors, old_rows[known_rows])]
+    if fresh.any() and known.any():
+        fresh_rules = {'rules': [rules[k] for k in np.flatnonzero(fresh)]}
+        matrix[np.ix_(np.flatnonzero(fresh), known_rows)] = match_matrix(df[known], fresh_rules).T
+    if not known.all():
+        matrix[:, ~known] = match_matrix(df[~known], rules_data).T
+
+    state.update({
+        'signatures': new, 'index': df.index.copy(), 'fingerprints': fingerprints,
+        'bits': np.packbits(matrix, axis=1),
+    })
+    return state
+
+def _row_bits(state, labels):
+    """Packed mask of the given row labels."""
+    mask = np.zeros(len(state['index']), dtype=bool)
+    positions = state['index'].get_indexer(labels)
+    mask[positions[positions >= 0]] = True
+    return np.packbits(mask)
+
+def _any_rule_bits(state, rule_indices=None):
+    """Packed mask of the rows matched by any of the given rules (all rules by default)."""
+    bits = state['bits'] if rule_indices is None else state['bits'][list(rule_indices)]
+    if len(bits) == 0:
+        return np.zeros(state['bits'].shape[1], dtype=np.uint8)
+    return np.bitwise_or.reduce(bits, axis=0)
+
+def rule_match_counts(state):
+    """How many rows each rule matches."""
+    return _POPCOUNT[state['bits']].sum(axis=1, dtype=np.int64)
+
+def count_matching_rows(state, labels=None, rule_indices=None):
+    """How many rows (of the given labels) are matched by any of the given rules."""
+    bits = _any_rule_bits(state, rule_indices)
+    if labels is not None:
+        bits = bits & _row_bits(state, labels)
+    return _popcount(bits)
+
+def count_new_coverage(state, rule_index):
+    """How many rows the rule matches that no other rule matches."""
+    others = [i for i in range(len(state['bits'])) if i != rule_index]
+    return _popcount(state['bits'][rule_index] & ~_any_rule_bits(state, others))
+
+def count_overlap(state, first_rule, second_rule):
+    """How many rows two rules both match."""
+    return _popcount(state['bits'][first_rule] & state['bits'][second_rule])
+
+def matched_rows(state, rule_indices=None):
+    """Boolean Series over the rows: True where any of the given rules (all by default) matches."""
+    mask = np.unpackbits(_any_rule_bits(state, rule_indices), count=len(state['index'])).astype(bool)
+    return pd.Series(mask, index=state['index'])
+
+def rule_categories(first, rules_data):
+    """Turns first-match indices into categories (None where no rule matched)."""
+    categories = np.array([rule['category'] for rule in rules_data.get('rules', [])] + [None], dtype=object)
+    return pd.Series(categories[first.to_numpy()], index=first.index) # -1 picks the trailing None
+
+def categorize(df, rules_data, compiled=None, use_cache=False):
+    """
+    The category of the first matching rule for every row (None where no rule matches).
+    With use_cache, results come from the persistent memo where possible.
+    """
+    if use_cache:
+        first = cached_first_matching_rules(df, rules_data, compiled)
+    else:
+        first = first_matching_rules(df, rules_data, compiled)
+    return rule_categories(first, rules_data)
+
+# --- Profiling ---
+
+def profile_rules(df, rules_data, repeats=PROFILE_REPEATS):
+    """
+    Evaluates the rule set over df and reports, per rule, its evaluation time, how
+    many rows it matches, how many it wins as the first match, and whether it is
+    'dead' (matches nothing) or 'shadowed' (every row it matches goes to an earlier rule).
+    Shared work (keyword scans, cents) is timed once and reported separately.
+    """
+    rules = rules_data.get('rules', [])
+    start = time.perf_counter()
+    compiled = compile_rules(rules_data)
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    ctx = _context(df, compiled)
+    start = time.perf_counter()
+    for field in compiled['keywords']:
+        if field in df.columns:
+            _text(ctx, field)
+            _keyword_hits(ctx, field)
+    if AMOUNT_FIELD in df.columns:
+        _cents(ctx)
+    shared_ms = (time.perf_counter() - start) * 1000
+
+    matrix = np.zeros((len(df), len(rules)), dtype=bool)
+    times = []
+    for i, rule_mask in enumerate(compiled['masks']):
+        best = None
+        for _ in range(max(1, repeats)):
+            start = time.perf_counter()
+            matrix[:, i] = rule_mask(ctx)
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        times.append(best)
+
+    first = np.where(matrix.any(axis=1), matrix.argmax(axis=1), -1) if len(rules) else np.full(len(df), -1)
+    wins = np.bincount(first[first >= 0], minlength=len(rules))
+    report_rules = []
+    for i, rule in enumerate(rules):
+        matches = int(matrix[:, i].sum())
+        status = 'dead' if matches == 0 else 'shadowed' if wins[i] == 0 else 'active'
+        report_rules.append({
+            'index': i,
+            'category': rule.get('category'),
+            'time_ms': round(times[i], 4),
+            'matches': matches,
+            'wins': int(wins[i]),
+            'status': status,
+            'shadowed_by': sorted(int(j) for j in np.unique(first[matrix[:, i]]) if j != i) if status == 'shadowed' else [],
+            'conditions': rule['conditions'],
+        })
+
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'rows': len(df),
+        'rule_count': len(rules),
+        'compile_ms': round(compile_ms, 4),
+        'shared_ms': round(shared_ms, 4),
+        'total_ms': round(compile_ms + shared_ms + sum(times), 4),
+        'unmatched_rows': int((first == -1).sum()),
+        'rules': report_rules,
+    }
+
+def write_rule_profile(report, path=RULE_PROFILE_PATH):
+    """Writes a profile (or conflict) report as JSON."""
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    _replace_file(write, path)
+
+def print_rule_profile(report, top=10):
+    """Prints a short summary of a profile report."""
+    print(f"\n--- Rule Profile: {report['rule_count']} rules over {report['rows']} transactions ---")
+    print(f"  Total {report['total_ms']:.1f} ms (compile {report['compile_ms']:.1f} ms, keyword scan {report['shared_ms']:.1f} ms); {report['unmatched_rows']} transaction(s) match no rule.")
+    print(f"\n  Slowest {top} rules:")
+    for entry in sorted(report['rules'], key=lambda r: r['time_ms'], reverse=True)[:top]:
+        print(f"   #{entry['index']:<4} {entry['time_ms']:>8.3f} ms | {entry['matches']:>6} matches | {entry['wins']:>6} wins | {entry['category']}")
+    dead = [r for r in report['rules'] if r['status'] == 'dead']
+    shadowed = [r for r in report['rules'] if r['status'] == 'shadowed']
+    if dead:
+        print(f"\n  ⚠️ {len(dead)} rule(s) never match: " + ', '.join(f"#{r['index']}" for r in dead))
+    if shadowed:
+        print(f"  ⚠️ {len(shadowed)} rule(s) are fully shadowed by earlier rules:")
+        for entry in shadowed:
+            print(f"   #{entry['index']} ({entry['category']}) loses every match to " + ', '.join(f"#{j}" for j in entry['shadowed_by']))
+
+def profile_requested():
+    """True when the running script was started with --profile-rules."""
+    return PROFILE_FLAG in sys.argv
+
+def run_rule_profile(df, rules_data, path=RULE_PROFILE_PATH):
+    """Profiles the rules over df, writes the JSON report and prints its summary."""
+    report = profile_rules(df, rules_data)
+    write_rule_profile(report, path)
+    print_rule_profile(report)
+    print(f"\n✅ Rule profile written to '{path}'.")
+    return report
+
+# --- Conflict analysis ---
+
+def rule_conflicts(df, rules_data, compiled=None):
+    """
+    Every pair of rules that match the same transactions but assign different
+    categories, from one match matrix: the co-match counts of all pairs are one
+    matrix product. The earlier rule is the one that wins on the shared rows.
+    """
+    rules = rules_data.get('rules', [])
+    matrix = match_matrix(df, rules_data, compiled)
+    weights = matrix.astype(np.float32)
+    co_matches = np.rint(weights.T @ weights).astype(np.int64) # Exact: counts stay far below 2**24
+    categories = np.array([rule['category'] for rule in rules], dtype=object)
+    disagree = categories[:, None] != categories[None, :]
+    first_rules, second_rules = np.nonzero(np.triu(co_matches > 0, k=1) & disagree)
+
+    descriptions = df['Description'].astype(object).to_numpy() if 'Description' in df.columns else np.full(len(df), None)
+    conflicts = []
+    for i, j in zip(first_rules, second_rules):
+        shared = matrix[:, i] & matrix[:, j]
+        conflicts.append({
+            'winner': int(i), 'winner_category': categories[i],
+            'loser': int(j), 'loser_category': categories[j],
+            'rows': int(co_matches[i, j]),
+            'loser_matches': int(co_matches[j, j]),
+            'example': None if pd.isna(descriptions[shared.argmax()]) else str(descriptions[shared.argmax()]),
+        })
+    conflicts.sort(key=lambda c: (-c['rows'], c['winner'], c['loser']))
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'rows': len(df),
+        'rule_count': len(rules),
+        'conflicts': conflicts,
+    }
+
+def conflicts_requested():
+    """True when the running script was started with --rule-conflicts."""
+    return CONFLICTS_FLAG in sys.argv
+
+def run_conflict_report(df, rules_data, path=RULE_CONFLICTS_PATH):
+    """Finds conflicting rule pairs over df, writes the JSON report and prints it."""
+    report = rule_conflicts(df, rules_data)
+    write_rule_profile(report, path)
+    print(f"\n--- Rule Conflicts: {report['rule_count']} rules over {report['rows']} transactions ---")
+    if not report['conflicts']:
+        print("  ✅ No two rules match the same transaction with different categories.")
+    for c in report['conflicts']:
+        print(f"  ⚠️ {c['rows']:>5} row(s): #{c['winner']} '{c['winner_category']}' beats #{c['loser']} '{c['loser_category']}' (e.g. {c['example']})")
+    print(f"\n✅ Conflict report written to '{path}'.")
+    return report
+
+if __name__ == "__main__":
+    from ledger_store import load_ledger, ledger_exists, MASTER_FILE_PATH
+    if not ledger_exists(MASTER_FILE_PATH):
+        print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
+        sys.exit(1)
+    if not (profile_requested() or conflicts_requested()):
+        print(f"Usage: python rule_engine.py {PROFILE_FLAG} | {CONFLICTS_FLAG}")
+        sys.exit(0)
+    df, rules_data = load_ledger(MASTER_FILE_PATH), load_rules()
+    if profile_requested():
+        run_rule_profile(df, rules_data)
+    if conflicts_requested():
+        run_conflict_report(df, rules_data)
@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+from ledger_store import load_ledger, ledger_exists
 
 MASTER_FILE_PATH = "master_transactions.csv"
 
@@ -10,12 +11,12 @@ def view_data_samples():
     """
     print("--- Transaction Data Sampler ---")
     
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         return
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH)
+        df = load_ledger(MASTER_FILE_PATH, columns=['Date', 'Account', 'Description', 'Amount', 'Category'])
         
         if 'Account' not in df.columns:
             print("❌ ERROR: 'Account' column not found. Please run the data model upgrade script.")
@@ -1,11 +1,14 @@
 import pandas as pd
 import os
-import google.generativeai as genai
 import time
 import sys
 import json
 from datetime import timedelta
 import hashlib
+from ledger_store import load_ledger, save_ledger, ledger_exists, filter_new_transactions, pair_transactions
+import rule_engine
+import ai_categorizer
+import local_classifier
 
 # --- Configuration ---
 VENMO_FUNDING_SOURCE_KEYWORD = 'US BANK NA Personal Checking'
@@ -14,10 +17,9 @@ VENMO_DESCRIPTION_KEYWORD = 'VENMO'
 PAYMENT_DESCRIPTION_KEYWORDS = ['AMEX', 'DISCOVER', 'CHASE', 'WELLS FARGO', 'TARGET']
 
 
-PRICE_PER_MILLION_INPUT_TOKENS = 0.075
-PRICE_PER_MILLION_OUTPUT_TOKENS = 0.30
-ESTIMATED_INPUT_TOKENS_PER_TX = 350
-ESTIMATED_OUTPUT_TOKENS_PER_TX = 10
+# Per transaction when batched (the category list and instructions are shared by a whole batch);
+# once ai_metrics.jsonl has recorded a run, the measured averages are used instead
+ESTIMATED_INPUT_TOKENS_PER_TX = 40
 CATEGORIES = [
     "Home: Rent", "Home: Utilities", "Home: Phone Bill", "Home: Laundry",
     "Auto & Transport: Car Loan", "Auto & Transport: Gasoline", "Auto & Transport: Insurance", "Auto & Transport: Fees & Registration", "Auto & Transport: Misc",
@@ -36,79 +38,50 @@ CATEGORIES = [
 ]
 MASTER_FILE_PATH = "master_transactions.csv"
 RULES_FILE_PATH = "rules.json"
-# --- UPDATED: Added new ID columns to the master list ---
-MASTER_COLUMNS = [
-    'Date', 'Account', 'Description', 'Payee', 'Amount', 'Category',
-    'Is_Tax_Deductible', 'Is_Reimbursable', 'Source', 'TransactionID', 'Reviewed',
-    'ReconciliationID', 'SourceTransactionID'
-]
-
-def get_category_from_ai(description, amount, model, request_options):
-    """Uses the Gemini model to categorize a transaction."""
-    # (This function is unchanged for brevity)
-    pass
-
-def check_condition(condition, row):
-# ... (This function is unchanged) ...
-    if 'field' not in condition:
-        return False
-    field = condition['field']
-    operator = condition['operator']
-    value = condition['value']
-    row_value = row.get(field)
-    if pd.isna(row_value):
-        return False
-    if isinstance(row_value, str):
-        row_value_upper = row_value.upper()
-        value_upper = str(value).upper()
-    else:
-        row_value_upper = row_value
-        value_upper = value
-    if operator == 'contains':
-        return value_upper in row_value_upper
-    elif operator == 'not_contains':
-        return value_upper not in row_value_upper
-    elif operator == 'equals':
-        if isinstance(row_value, float):
-            return abs(row_value - value) < 0.001
-        return row_value == value
-    elif operator == 'greater_than':
-        return row_value > value
-    elif operator == 'less_than':
-        return row_value < value
-    return False
-
-def evaluate_conditions(conditions, row):
-# ... (This function is unchanged) ...
-    if 'all_of' in conditions:
-        return all(evaluate_conditions(cond, row) for cond in conditions['all_of'])
-    if 'any_of' in conditions:
-        return any(evaluate_conditions(cond, row) for cond in conditions['any_of'])
-    return check_condition(conditions, row)
 
 def apply_rules(df, rules_data):
-# ... (This function is unchanged) ...
+    """Gives each uncategorized transaction the category of its first matching structured rule."""
     print("\nApplying structured custom rules...")
-    categorized_indices = []
-    rules = rules_data.get('rules', [])
-    for index, row in df.iterrows():
-        if pd.notna(row['Category']) and row['Category'] != '':
-            continue
-        for rule in rules:
-            if evaluate_conditions(rule['conditions'], row):
-                df.loc[index, 'Category'] = rule['category']
-                categorized_indices.append(index)
-                break 
+    # Every rule is evaluated as one mask over the uncategorized rows; the first match wins.
+    uncategorized = df['Category'].isna() | (df['Category'] == '')
+    categories = rule_engine.categorize(df[uncategorized], rules_data, use_cache=True).dropna()
+    df.loc[categories.index, 'Category'] = categories
+    categorized_indices = categories.index.tolist()
     print(f"{len(categorized_indices)} transactions were categorized using your custom rules.")
     return df, categorized_indices
 
 
 def fast_approve_ruled_transactions(df, indices):
-# ... (This function is unchanged) ...
+    """Leaves the rule-categorized transactions for review in step4 (nothing is approved automatically)."""
+    return df
+
+def run_local_classifier(df, classifier):
+    """Categorizes the transactions no rule caught that look like reviewed history, without calling the AI."""
+    uncategorized = df[df['Category'].isna() | (df['Category'] == '')]
+    categories = local_classifier.categorize(classifier, uncategorized)
+    df.loc[categories.index, 'Category'] = categories
+    print(f"{len(categories)} transactions were categorized by the local classifier.")
     return df
 
 def run_ai_categorization(df, model):
-# ... (This function is unchanged) ...
+    """Sends the transactions no rule categorized to the AI model, many per request."""
+    needs_ai = df[df['Category'].isna() | (df['Category'] == '')]
+    if needs_ai.empty:
+        return df
+
+    tokens_per_tx = ai_categorizer.measured_tokens_per_transaction() or (ESTIMATED_INPUT_TOKENS_PER_TX, ai_categorizer.ESTIMATED_OUTPUT_TOKENS_PER_TX)
+    estimated_cost = len(needs_ai) * ai_categorizer.token_cost(*tokens_per_tx)
+    print(f"\nFound {len(needs_ai)} transactions that need AI categorization (estimated cost: ${estimated_cost:.4f}).")
+    proceed = input("Do you wish to continue? (y/n): ").lower()
+    if proceed != 'y':
+        return df
+
+    categories = ai_categorizer.categorize_transactions(model, needs_ai, CATEGORIES)
+    df.loc[categories.index, 'Category'] = categories
+    fallbacks = (categories == ai_categorizer.FALLBACK_CATEGORY).sum()
+    print(f"{len(categories) - fallbacks} transactions were categorized by AI.")
+    if fallbacks:
+        print(f"{fallbacks} transactions were marked '{ai_categorizer.FALLBACK_CATEGORY}' (no usable AI answer).")
     return df
 
 def reconcile_credit_card_payments(df_new, df_master):
@@ -118,7 +91,6 @@ def reconcile_credit_card_payments(df_new, df_master):
     """
     print("\nReconciling existing credit card payments...")
     
-    df_master['Date'] = pd.to_datetime(df_master['Date'], format='mixed')
     df_new['Date'] = pd.to_datetime(df_new['Date'], format='mixed')
 
     new_payments = df_new[(df_new['Amount'] > 0) & (df_new['Category'] == 'Transfer')].copy()
@@ -133,28 +105,21 @@ def reconcile_credit_card_payments(df_new, df_master):
 
     reconciled_count = 0
 
-    for new_idx, payment in new_payments.iterrows():
-        payment_amount = payment['Amount']
-        payment_date = payment['Date']
+    # Exact hash join on the cents; each withdrawal is linked to at most one payment
+    for new_idx, master_idx in pair_transactions(new_payments, master_withdrawals, max_days=5):
+        payment_date = new_payments.loc[new_idx, 'Date']
+        print(f" -> Match found: Linking checking withdrawal on {master_withdrawals.loc[master_idx, 'Date'].date()} to CC payment on {payment_date.date()}.")
         
-        for master_idx, withdrawal in master_withdrawals.iterrows():
-            if abs(withdrawal['Amount'] + payment_amount) < 0.01 and abs((withdrawal['Date'] - payment_date).days) <= 5:
-                print(f" -> Match found: Linking checking withdrawal on {withdrawal['Date'].date()} to CC payment on {payment_date.date()}.")
-                
-                # Generate a unique ID for the pair
-                rec_id = f"REC-{hashlib.md5(str(time.time()).encode()).hexdigest()[:12]}"
-                
-                # Assign the shared ID and mark both as reviewed
-                df_master.loc[master_idx, 'ReconciliationID'] = rec_id
-                df_new.loc[new_idx, 'ReconciliationID'] = rec_id
-                df_master.loc[master_idx, 'Reviewed'] = True
-                df_new.loc[new_idx, 'Reviewed'] = True
-                
-                reconciled_count += 1
-                
-                # Remove the matched withdrawal from the pool to prevent it from being matched again
-                master_withdrawals.drop(master_idx, inplace=True)
-                break 
+        # Generate a unique ID for the pair
+        rec_id = f"REC-{hashlib.md5(f'{time.time()}-{new_idx}'.encode()).hexdigest()[:12]}"
+        
+        # Assign the shared ID and mark both as reviewed
+        df_master.loc[master_idx, 'ReconciliationID'] = rec_id
+        df_new.loc[new_idx, 'ReconciliationID'] = rec_id
+        df_master.loc[master_idx, 'Reviewed'] = True
+        df_new.loc[new_idx, 'Reviewed'] = True
+        
+        reconciled_count += 1
 
     print(f"{reconciled_count} payment(s) were successfully reconciled and linked.")
     
@@ -169,43 +134,29 @@ def create_and_reconcile_wf_payments(df_master):
 def main():
     print("--- Smart Transaction Importer ---")
     try:
-        api_key = os.environ.get("GOOGLE_API_KEY")
-        if not api_key: raise KeyError("GOOGLE_API_KEY not found.")
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = ai_categorizer.get_model()
     except Exception as e:
         print(f"\n❌ ERROR: Could not configure AI model. {e}")
         sys.exit(1)
 
-    rules = {}
-    if os.path.exists(RULES_FILE_PATH):
-        with open(RULES_FILE_PATH, 'r', encoding='utf-8') as f:
-            rules = json.load(f)
+    rules = rule_engine.load_rules(RULES_FILE_PATH)
     
     df_master = pd.DataFrame()
-    if os.path.exists(MASTER_FILE_PATH):
-        df_master = pd.read_csv(MASTER_FILE_PATH, dtype={'Category': 'object'})
-        if 'Date' in df_master.columns:
-            df_master['Date'] = pd.to_datetime(df_master['Date'], format='mixed').dt.date
-        
-        # --- Ensure new ID columns exist ---
-        for col in ['Reviewed', 'ReconciliationID', 'SourceTransactionID']:
-            if col not in df_master.columns:
-                df_master[col] = None if 'ID' in col else False
-        df_master['Reviewed'] = df_master['Reviewed'].fillna(False).astype(bool)
+    if ledger_exists(MASTER_FILE_PATH):
+        # The ledger store guarantees the ID/flag columns and parsed dates.
+        df_master = load_ledger(MASTER_FILE_PATH, for_update=True)
 
     filepath = input("Please provide the path to your 'processed_...' CSV file: ").strip().replace("'", "").replace('"', '')
     df_new = pd.read_csv(filepath, dtype={'Category': 'object'})
-    df_new['Date'] = pd.to_datetime(df_new['Date'], format='mixed').dt.date
+    df_new['Date'] = pd.to_datetime(df_new['Date'], format='mixed')
     
     # --- Ensure new ID columns exist in the new dataframe too ---
     for col in ['ReconciliationID', 'SourceTransactionID']:
         if col not in df_new.columns:
             df_new[col] = None
 
-    if not df_master.empty:
-        existing_ids = set(df_master['TransactionID'])
-        df_new = df_new[~df_new['TransactionID'].isin(existing_ids)].copy()
+    # --- Dedup against the ledger's TransactionID index, not a rebuilt set ---
+    df_new = filter_new_transactions(df_new, MASTER_FILE_PATH)
     
     if df_new.empty:
         print("\n✅ No genuinely new transactions found to process.")
@@ -213,6 +164,8 @@ def main():
         sys.exit(0)
         
     print(f"\nFound {len(df_new)} new transactions to process.")
+    if rule_engine.profile_requested():
+        rule_engine.run_rule_profile(df_new, rules)
     df_new['Reviewed'] = False
     
     account_name = df_new['Account'].iloc[0] if not df_new.empty else ""
@@ -237,19 +190,17 @@ def main():
         if ruled_indices:
             categorized_df = fast_approve_ruled_transactions(categorized_df, ruled_indices)
 
+        # Learned from the reviewed ledger before the new rows join it
+        classifier = local_classifier.train(df_master, CATEGORIES) if not df_master.empty else None
+        if classifier is not None:
+            categorized_df = run_local_classifier(categorized_df, classifier)
+
         finalized_df = run_ai_categorization(categorized_df, model)
         df_master = pd.concat([df_master, finalized_df], ignore_index=True)
         print(f"\n✅ Success! Added/updated {len(finalized_df)} transactions.")
 
-    # --- Ensure all columns are present before saving ---
-    final_df_to_save = df_master.copy()
-    for col in MASTER_COLUMNS:
-        if col not in final_df_to_save.columns:
-            final_df_to_save[col] = None
-    final_df_to_save = final_df_to_save[MASTER_COLUMNS] # Ensure correct order
-
-    final_df_to_save['Date'] = pd.to_datetime(final_df_to_save['Date'], format='mixed').dt.strftime('%Y-%m-%d')
-    final_df_to_save.to_csv(MASTER_FILE_PATH, index=False, encoding='utf-8-sig')
+    # --- save_ledger restores the canonical column set and order ---
+    save_ledger(df_master, MASTER_FILE_PATH)
     print(f"\nMaster file saved with {len(df_master)} total transactions.")
 
     input("\nPress Enter to exit...")
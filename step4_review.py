@@ -6,6 +6,12 @@ import time
 import re
 from datetime import datetime
 import hashlib
+from ledger_store import load_ledger, save_ledger, ledger_exists, using_sqlite, row_keys, file_store_version, LedgerConflictError
+from ledger_store import AMOUNT_CENTS_COLUMN, amount_cents, to_cents
+import ledger_db
+import ledger_journal
+import ledger_history
+import rule_engine
 
 # --- Configuration & Helper Functions ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -26,95 +32,89 @@ CATEGORIES = [
     "Transfer", "Venmo Unsorted", "NEEDS RECONCILIATION", "NEEDS REVIEW",
     "Cash Spending", "Non-Taxable Income: Rewards"
 ]
-# --- UPDATED: Added 'Duplicate_Ignored' to the master list of columns ---
-MASTER_COLUMNS = [
-    'Date', 'Account', 'Description', 'Payee', 'Amount', 'Category',
-    'Is_Tax_Deductible', 'Is_Reimbursable', 'Source', 'TransactionID', 'Reviewed', 'Rule_Ignored', 'Duplicate_Ignored'
-]
 
 def load_rules():
-    """Loads categorization rules from the JSON file with UTF-8 encoding."""
-    if os.path.exists(RULES_FILE_PATH):
-        with open(RULES_FILE_PATH, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {"rules": []}
+    """Loads categorization rules from the JSON file."""
+    return rule_engine.load_rules(RULES_FILE_PATH)
 
 def save_rules(rules):
-    """Saves categorization rules to the JSON file with UTF-8 encoding."""
-    with open(RULES_FILE_PATH, 'w', encoding='utf-8') as f:
-        json.dump(rules, f, indent=4)
-
-def check_condition(condition, row):
-    """
-    Checks if a single, simple condition is met by the transaction row.
-    """
-    if 'field' not in condition:
-        return False
-
-    field = condition['field']
-    operator = condition['operator']
-    value = condition['value']
-    row_value = row.get(field)
-
-    if pd.isna(row_value):
-        return False
-
-    if isinstance(row_value, str):
-        row_value_upper = row_value.upper()
-        value_upper = str(value).upper()
+    """Saves categorization rules to the JSON file."""
+    rule_engine.save_rules(rules, RULES_FILE_PATH)
+
+# --- Ledger Write-Through ---
+# With the SQLite backend every edit is written to its row immediately (a row_id
+# seek). With the file store every edit is appended to the ledger journal as it
+# happens and folded into the ledger on "Quit and Save", so a crash loses nothing.
+ledger_conn = None
+ledger_keys = None # Row key of each DataFrame index, as recorded in the journal
+
+def update_row(df, idx, kind='edit', **fields):
+    """Applies an edit to one transaction and persists it (SQLite row or journal record)."""
+    update_rows(df, {idx: fields}, kind)
+
+def update_rows(df, updates, kind='edit'):
+    """Applies {index: {column: value}} edits and persists them in one batch."""
+    if ledger_conn is None:
+        old = {idx: ledger_journal.old_values(df, idx, fields) for idx, fields in updates.items()}
+    columns = dict.fromkeys(col for fields in updates.values() for col in fields)
+    for col in columns:
+        indices = [idx for idx, fields in updates.items() if col in fields]
+        df.loc[indices, col] = [updates[idx][col] for idx in indices]
+        if col == 'Amount':
+            df.loc[indices, AMOUNT_CENTS_COLUMN] = [to_cents(updates[idx][col]) for idx in indices]
+    if ledger_conn is not None:
+        ledger_db.update_transactions(ledger_conn, updates)
     else:
-        row_value_upper = row_value
-        value_upper = value
-
-    if operator == 'contains':
-        return value_upper in row_value_upper
-    elif operator == 'not_contains':
-        return value_upper not in row_value_upper
-    elif operator == 'equals':
-        if isinstance(row_value, float):
-            return abs(row_value - value) < 0.001
-        return row_value == value
-    elif operator == 'greater_than':
-        return row_value > value
-    elif operator == 'less_than':
-        return row_value < value
-    return False
-
-def evaluate_conditions(conditions, row):
-    """
-    Recursively evaluates a block of conditions.
-    """
-    if 'all_of' in conditions:
-        return all(evaluate_conditions(cond, row) for cond in conditions['all_of'])
-    if 'any_of' in conditions:
-        return any(evaluate_conditions(cond, row) for cond in conditions['any_of'])
-    return check_condition(conditions, row)
-
-def find_matching_rule(row, rules_data):
-    """
-    Finds the first rule that matches the transaction row.
-    """
-    for i, rule in enumerate(rules_data.get('rules', [])):
-        if evaluate_conditions(rule['conditions'], row):
-            return i, rule['category']
-    return None, None
+        mutations = [('update', ledger_keys[idx], fields, kind, old[idx]) for idx, fields in updates.items()]
+        ledger_journal.append_records(mutations, MASTER_FILE_PATH)
+
+def delete_rows(df, indices):
+    """Removes transactions and persists the deletion (SQLite rows or journal records)."""
+    if ledger_conn is None:
+        mutations = [('delete', ledger_keys[idx], None, 'delete', ledger_journal.old_values(df, idx, [])) for idx in indices]
+    df.drop(indices, inplace=True)
+    if ledger_conn is not None:
+        ledger_db.delete_transactions(ledger_conn, indices)
+    else:
+        ledger_journal.append_records(mutations, MASTER_FILE_PATH)
+
+def insert_row(df, transaction):
+    """Appends a new transaction; with SQLite the row keeps the row_id it was stored under."""
+    new_df = pd.DataFrame([transaction])
+    new_df[AMOUNT_CENTS_COLUMN] = amount_cents(new_df['Amount'])
+    if ledger_conn is not None:
+        new_df.index = ledger_db.insert_transactions(ledger_conn, new_df)
+        return pd.concat([df, new_df])
+
+    new_index = (df.index.max() + 1) if len(df) else 0
+    new_df.index = [new_index]
+    existing_keys = set(ledger_keys)
+    key = transaction['TransactionID']
+    repeat = 0
+    while key in existing_keys:
+        repeat += 1
+        key = f"{transaction['TransactionID']}#{repeat}"
+    ledger_keys.loc[new_index] = key
+    ledger_journal.append_record('insert', key, transaction, 'insert', MASTER_FILE_PATH)
+    return pd.concat([df, new_df])
+
+# First-match rule index of every row, kept up to date as rules are added and edited
+rule_matches = None
 
 def apply_rules_and_rescan(df, rules_data, indices_to_scan=None):
     """Applies all rules to a specific scope of transactions, skipping ignored ones."""
-    categorized_count = 0
-    scan_indices = indices_to_scan if indices_to_scan is not None else df.index
+    scope = df[df.index.isin(indices_to_scan)] if indices_to_scan is not None else df
+    scope = scope[~scope['Rule_Ignored'].astype(bool)]
 
-    for index in scan_indices:
-        if df.loc[index, 'Rule_Ignored']:
-            continue
-            
-        row = df.loc[index]
-        _, new_category = find_matching_rule(row, rules_data)
-        
-        if new_category and df.loc[index, 'Category'] != new_category:
-            df.loc[index, 'Category'] = new_category
-            df.loc[index, 'Reviewed'] = True
-            categorized_count += 1
+    # Only the rules changed since the last scan are evaluated; only rows whose category changes are written.
+    if rule_matches is not None:
+        first = rule_engine.refresh_first_matches(rule_matches, df, rules_data).loc[scope.index]
+        new_categories = rule_engine.rule_categories(first, rules_data).dropna()
+    else:
+        new_categories = rule_engine.categorize(scope, rules_data, use_cache=True).dropna()
+    changed = new_categories[scope.loc[new_categories.index, 'Category'] != new_categories]
+    update_rows(df, {index: {'Category': category, 'Reviewed': True} for index, category in changed.items()}, kind='category')
+    categorized_count = len(changed)
             
     return df, categorized_count
 
@@ -143,7 +143,7 @@ def review_transactions(df, indices_to_review, rules_data, category_name=None, r
         else:
             print(f"--- Reviewing Unreviewed Transactions ({i + 1}/{len(original_indices)}) ---")
 
-        print(f"  Date: {row['Date']} | Account: {row.get('Account', 'N/A')}")
+        print(f"  Date: {row['Date'].date()} | Account: {row.get('Account', 'N/A')}")
         print(f"  Payee: {row.get('Payee', 'N/A')}")
         print(f"  Description: {row['Description']}")
         print(f"  Amount: {row.get('Amount', 0.0):.2f}")
@@ -157,7 +157,7 @@ def review_transactions(df, indices_to_review, rules_data, category_name=None, r
         choice = input("\nEnter your choice: ").lower()
 
         if choice == 's' or choice == '':
-            df.loc[idx, 'Reviewed'] = True
+            update_row(df, idx, kind='review', Reviewed=True)
             i += 1
             continue
         elif choice == 'q':
@@ -172,7 +172,7 @@ def review_transactions(df, indices_to_review, rules_data, category_name=None, r
         elif choice == 'd':
             confirm = input("Type 'DELETE' to permanently delete this transaction: ").strip()
             if confirm == 'DELETE':
-                df.drop(idx, inplace=True)
+                delete_rows(df, [idx])
                 original_indices.pop(i)
                 print(" -> Transaction deleted.")
                 time.sleep(1)
@@ -182,20 +182,22 @@ def review_transactions(df, indices_to_review, rules_data, category_name=None, r
                 time.sleep(1)
                 continue
         elif choice == 'f':
-            df.loc[idx, 'Amount'] = -df.loc[idx, 'Amount']
+            update_row(df, idx, kind='flip', Amount=-df.loc[idx, 'Amount'])
             print(" -> Amount sign flipped.")
             time.sleep(1)
             continue
         elif choice == 'e':
-            new_date = input(f"  Edit Date ({row['Date']}) or press Enter: ").strip()
-            if new_date: df.loc[idx, 'Date'] = new_date
+            new_date = input(f"  Edit Date ({row['Date'].date()}) or press Enter: ").strip()
+            if new_date:
+                try: update_row(df, idx, Date=pd.to_datetime(new_date))
+                except ValueError: print("Invalid date. Keeping original.")
             new_desc = input(f"  Edit Description ({row['Description']}) or press Enter: ").strip()
-            if new_desc: df.loc[idx, 'Description'] = new_desc
+            if new_desc: update_row(df, idx, Description=new_desc)
             new_payee = input(f"  Edit Payee ({row['Payee']}) or press Enter: ").strip()
-            if new_payee: df.loc[idx, 'Payee'] = new_payee
+            if new_payee: update_row(df, idx, Payee=new_payee)
             new_amount = input(f"  Edit Amount ({row['Amount']}) or press Enter: ").strip()
             if new_amount:
-                try: df.loc[idx, 'Amount'] = float(new_amount)
+                try: update_row(df, idx, Amount=float(new_amount))
                 except ValueError: print("Invalid amount. Keeping original.")
             print(" -> Details updated.")
             time.sleep(1)
@@ -210,9 +212,9 @@ def review_transactions(df, indices_to_review, rules_data, category_name=None, r
                 cat_choice = int(cat_choice_str)
                 if 1 <= cat_choice <= len(CATEGORIES):
                     chosen_category = CATEGORIES[cat_choice - 1]
-                    df.loc[idx, 'Category'] = chosen_category
+                    update_row(df, idx, kind='category', Category=chosen_category)
                     
-                    rule_index, rule_category = find_matching_rule(row, rules_data)
+                    rule_index, rule_category = rule_engine.find_matching_rule(row, rules_data)
                     if rule_index is not None and rule_category == original_category and chosen_category != original_category:
                         print(f"\nWarning: This transaction was categorized by a rule.")
                         conflict_choice = input("Do you want to (o)verride & ignore future rules, (u)pdate the rule, or (d)elete the rule? ").lower()
@@ -225,7 +227,7 @@ def review_transactions(df, indices_to_review, rules_data, category_name=None, r
                             save_rules(rules_data)
                             print(f" -> Rule deleted.")
                         else:
-                            df.loc[idx, 'Rule_Ignored'] = True
+                            update_row(df, idx, kind='rule_ignore', Rule_Ignored=True)
                             print(" -> Overriding category and ignoring future rules for this item.")
                     else:
                         create_rule = input("Create a rule for this? (y/n): ").lower()
@@ -254,7 +256,7 @@ def review_transactions(df, indices_to_review, rules_data, category_name=None, r
                                     rescan_requested = True
                                     break
                     
-                    df.loc[idx, 'Reviewed'] = True
+                    update_row(df, idx, kind='review', Reviewed=True)
                     i += 1
                 else:
                     print("Invalid category number.")
@@ -293,15 +295,14 @@ def add_manual_transaction(df):
         transaction_id = hashlib.md5(id_string).hexdigest()
 
         new_transaction = {
-            'Date': date, 'Account': account, 'Description': description,
+            'Date': pd.Timestamp(date), 'Account': account, 'Description': description,
             'Payee': description.split('*')[0].strip().title(), 'Amount': amount,
             'Category': category, 'Is_Tax_Deductible': False,
             'Is_Reimbursable': False, 'Source': 'Manual Entry',
             'TransactionID': transaction_id, 'Reviewed': True, 'Rule_Ignored': False, 'Duplicate_Ignored': False
         }
         
-        new_df = pd.DataFrame([new_transaction])
-        df = pd.concat([df, new_df], ignore_index=True)
+        df = insert_row(df, new_transaction)
         print("\n✅ Transaction added successfully.")
         time.sleep(2)
 
@@ -320,18 +321,19 @@ def review_potential_duplicates(df):
     
     df_to_scan = df[df['Duplicate_Ignored'] == False]
     
-    duplicates = df_to_scan.groupby(['Date', 'Amount', 'Account']).filter(lambda x: len(x) >= 2)
+    duplicates = df_to_scan.groupby(['Date', AMOUNT_CENTS_COLUMN, 'Account']).filter(lambda x: len(x) >= 2)
     
     if duplicates.empty:
         print("No potential duplicate groups found.")
         time.sleep(2)
         return df
 
-    unique_groups = duplicates[['Date', 'Amount', 'Account']].drop_duplicates().values.tolist()
+    unique_groups = duplicates[['Date', AMOUNT_CENTS_COLUMN, 'Account']].drop_duplicates().values.tolist()
     indices_to_delete = []
 
-    for i, (date, amount, account) in enumerate(unique_groups):
-        current_indices = df[(df['Date'] == date) & (df['Amount'] == amount) & (df['Account'] == account)].index
+    for i, (date, cents, account) in enumerate(unique_groups):
+        amount = cents / 100
+        current_indices = df[(df['Date'] == date) & (df[AMOUNT_CENTS_COLUMN] == cents) & (df['Account'] == account)].index
         
         if any(idx in indices_to_delete for idx in current_indices):
             continue
@@ -356,7 +358,7 @@ def review_potential_duplicates(df):
             continue
         elif choice == 'i':
             for idx in group_df.index:
-                df.loc[idx, 'Duplicate_Ignored'] = True
+                update_row(df, idx, kind='duplicate_ignore', Duplicate_Ignored=True)
             print(" -> Group marked to be ignored in future scans.")
             time.sleep(1)
             continue
@@ -389,7 +391,7 @@ def review_potential_duplicates(df):
     if indices_to_delete:
         unique_indices_to_delete = list(set(indices_to_delete))
         print(f"\nDeleting {len(unique_indices_to_delete)} marked transaction(s)...")
-        df.drop(unique_indices_to_delete, inplace=True)
+        delete_rows(df, unique_indices_to_delete)
         print("✅ Duplicates removed.")
     else:
         print("\nNo changes were made to the master file.")
@@ -399,21 +401,48 @@ def review_potential_duplicates(df):
 
 
 def main():
-    if not os.path.exists(MASTER_FILE_PATH):
+    global ledger_conn, ledger_keys, rule_matches
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
-    df = pd.read_csv(MASTER_FILE_PATH, dtype={'Category': 'object'})
+    df = load_ledger(MASTER_FILE_PATH, for_update=True)
     rules = load_rules()
+    if using_sqlite():
+        ledger_conn = ledger_db.connect(MASTER_FILE_PATH)
+        session_start = df.copy() # Edits bypass save_ledger, so the session is versioned on quit
+    else:
+        ledger_keys = row_keys(df)
+        pending = ledger_journal.read_journal(MASTER_FILE_PATH)
+        resumed = []
+        if pending:
+            print(f"⚠️ Found {len(pending)} unsaved edit(s) from a previous session that did not finish.")
+            resume = input("Do you want to (r)esume with those edits or (d)iscard them? ").lower()
+            if resume == 'd':
+                print(" -> Previous edits discarded.")
+            else:
+                # Edits another tool has since changed underneath are listed before anything is overwritten
+                check = ledger_journal.ledger_changed_since(MASTER_FILE_PATH)
+                kept_df, kept_keys, conflicts, resumed = ledger_journal.apply_journal(df.copy(), pending, ledger_keys, check, overwrite=False)
+                if conflicts:
+                    print(f"⚠️ The ledger was changed by another tool since those edits were made; {len(conflicts)} cell(s) conflict:")
+                    ledger_journal.print_conflicts(conflicts)
+                    choice = input("Do you want to (o)verwrite those cells with your edits or (k)eep the ledger's values? ").lower()
+                    if choice == 'o':
+                        kept_df, kept_keys, _, resumed = ledger_journal.apply_journal(df, pending, ledger_keys, check)
+                df, ledger_keys = kept_df, kept_keys
+                print(" -> Previous edits restored.")
+            time.sleep(1)
+        # The journal starts over from the ledger as loaded, holding the resumed edits (if any)
+        ledger_journal.rewrite_journal(resumed, file_store_version(MASTER_FILE_PATH), MASTER_FILE_PATH)
     
-    if 'Reviewed' not in df.columns: df['Reviewed'] = False
-    if 'Rule_Ignored' not in df.columns: df['Rule_Ignored'] = False
-    if 'Duplicate_Ignored' not in df.columns: df['Duplicate_Ignored'] = False
-    
-    df['Reviewed'] = df['Reviewed'].fillna(False).astype(bool)
-    df['Rule_Ignored'] = df['Rule_Ignored'].fillna(False).astype(bool)
-    df['Duplicate_Ignored'] = df['Duplicate_Ignored'].fillna(False).astype(bool)
+    # The ledger store already provides bool flags and parsed dates.
     df['Category'] = df['Category'].fillna('')
+    rule_matches = rule_engine.first_match_state(df, rules)
+    match_bits = rule_engine.build_match_bits(df, rules)
+    if rule_engine.profile_requested():
+        rule_engine.run_rule_profile(df, rules)
+        input("\nPress Enter to continue to the review menu...")
 
     while True:
         os.system('cls' if os.name == 'nt' else 'clear')
@@ -473,11 +502,8 @@ def main():
                             time.sleep(2)
                             continue
                         
-                        rule_count = 0
-                        for idx in review_indices:
-                            rule_key, _ = find_matching_rule(df.loc[idx], rules)
-                            if rule_key is not None:
-                                rule_count += 1
+                        rule_engine.refresh_match_bits(match_bits, df, rules)
+                        rule_count = rule_engine.count_matching_rows(match_bits, review_indices)
                         
                         df, rules, rescan_needed = review_transactions(df, review_indices, rules, category_name=chosen_cat, rule_count=rule_count)
                         
@@ -501,17 +527,31 @@ def main():
             time.sleep(1)
 
     # --- Safe Save Logic ---
+    if ledger_conn is not None:
+        ledger_conn.close()
+        ledger_history.record_version(session_start, df, MASTER_FILE_PATH)
+        print("\n✅ All changes were saved to the ledger database as you made them.")
+        return
+
+    # Fold the journal into the ledger; it is only cleared once the save succeeded.
     while True:
         try:
-            df.to_csv(MASTER_FILE_PATH, index=False, encoding='utf-8-sig')
+            save_ledger(df, MASTER_FILE_PATH)
+            ledger_journal.discard_journal(MASTER_FILE_PATH)
             print("\n✅ All changes have been saved to your master file!")
             break
+        except LedgerConflictError as e:
+            print(f"\n❌ ERROR: {e}")
+            print("   Your edits are kept in the journal. Run this tool again and choose (r)esume: any")
+            print("   edit the other tool has changed underneath is listed before you decide whether to overwrite it.")
+            break
         except PermissionError:
             print(f"\n❌ ERROR: Could not save to '{MASTER_FILE_PATH}'.")
             print("   The file is likely open in another program (like Excel).")
             input("   Please close the file and press Enter to try again...")
         except Exception as e:
             print(f"\n❌ An unexpected error occurred during save: {e}")
+            print("   Your edits are kept in the journal and will be offered again next time.")
             break
 
 if __name__ == "__main__":
@@ -2,6 +2,7 @@ import pandas as pd
 import os
 import sys
 import hashlib
+from ledger_store import load_ledger, save_ledger, ledger_exists, filter_new_transactions
 
 # --- Configuration ---
 MASTER_COLUMNS = [
@@ -58,10 +59,10 @@ def main():
         non_amazon_path = os.path.join(input_dir, "categorized_non_amazon_transactions.csv")
         manual_charges_path = os.path.join(input_dir, "categorized_manual_charges.csv")
 
-        if not os.path.exists(master_path):
+        if not ledger_exists(master_path):
             print(f"\n❌ ERROR: Master file not found at '{master_path}'.")
             sys.exit(1)
-        df_master = pd.read_csv(master_path)
+        df_master = load_ledger(master_path, for_update=True)
         print(f"\n✅ Master file loaded. Contains {len(df_master)} transactions.")
 
     except Exception as e:
@@ -90,8 +91,7 @@ def main():
     print("\nStep 2: Merging new data into master file...")
     
     # Safety check to ensure we don't re-add transactions if the script is run twice
-    existing_ids = set(df_master['TransactionID'])
-    df_to_append = df_to_append[~df_to_append['TransactionID'].isin(existing_ids)]
+    df_to_append = filter_new_transactions(df_to_append, master_path)
     
     if df_to_append.empty:
         print("\nNo genuinely new transactions to add. Master file is already up to date.")
@@ -100,7 +100,7 @@ def main():
     
     df_final_master = pd.concat([df_master, df_to_append], ignore_index=True)
     
-    df_final_master.to_csv(master_path, index=False, encoding='utf-8-sig')
+    save_ledger(df_final_master, master_path)
     
     print(f"\n✅ Success! Master file updated. It now contains {len(df_final_master)} total transactions.")
     print("The Chase reconciliation is now complete.")
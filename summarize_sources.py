@@ -1,6 +1,7 @@
 import pandas as pd
 import os
 import sys
+from ledger_store import load_ledger, ledger_exists
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -13,12 +14,12 @@ def summarize_transaction_sources():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Transaction Source Auditor ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH)
+        df = load_ledger(MASTER_FILE_PATH, columns=['Source'])
         print(f"✅ Master file loaded. Analyzing {len(df)} transactions...\n")
 
         if 'Source' not in df.columns:
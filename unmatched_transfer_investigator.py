@@ -1,6 +1,7 @@
 import pandas as pd
 import os
 import sys
+from ledger_store import load_ledger, ledger_exists
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -14,12 +15,12 @@ def investigate_unmatched_transfers():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Unmatched Transfer Investigator ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         sys.exit(1)
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH)
+        df = load_ledger(MASTER_FILE_PATH, columns=['Account', 'Description', 'Amount', 'Category', 'ReconciliationID'])
 
         if 'ReconciliationID' not in df.columns:
             print("❌ ERROR: The 'ReconciliationID' column has not been created yet.")
@@ -40,12 +41,12 @@ def investigate_unmatched_transfers():
         credits = unmatched_df[unmatched_df['Amount'] > 0]
         debits = unmatched_df[unmatched_df['Amount'] < 0]
 
-        credit_summary = credits.groupby('Account')['Amount'].agg(
+        credit_summary = credits.groupby('Account', observed=True)['Amount'].agg(
             Credit_Count='count',
             Unmatched_Credits='sum'
         ).reset_index()
 
-        debit_summary = debits.groupby('Account')['Amount'].agg(
+        debit_summary = debits.groupby('Account', observed=True)['Amount'].agg(
             Debit_Count='count',
             Unmatched_Debits='sum'
         ).reset_index()
@@ -1,6 +1,5 @@
-import pandas as pd
-import os
 import re
+from ledger_store import load_ledger, save_ledger, ledger_exists
 
 MASTER_FILE_PATH = "master_transactions.csv"
 
@@ -20,15 +19,17 @@ def main():
     """
     print("--- Upgrading Master File to New Data Model ---")
     
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         return
 
-    df = pd.read_csv(MASTER_FILE_PATH)
+    # The ledger store always provides every column, so "missing" now means blank
+    df = load_ledger(MASTER_FILE_PATH, for_update=True)
 
-    # --- 1. Add 'Account' Column (if it doesn't exist) ---
-    if 'Account' not in df.columns:
-        print("Adding 'Account' column...")
+    # --- 1. Fill in 'Account' (where it is blank) ---
+    missing_account = df['Account'].isna() | (df['Account'] == '')
+    if missing_account.any():
+        print(f"Assigning an 'Account' to {missing_account.sum()} transaction(s)...")
         account_mapping = {
             'US Bank Checking': ['Checking - 6055'],
             'Chase CC': ['chasecredit'],
@@ -36,33 +37,29 @@ def main():
             'Amex CC': ['amex', 'activity'],
             'Discover CC': ['Discover']
         }
-        df['Account'] = 'Unassigned'
+        df.loc[missing_account, 'Account'] = 'Unassigned'
         for account_name, keywords in account_mapping.items():
             for keyword in keywords:
-                mask = df['Source'].str.contains(keyword, case=False, na=False)
+                mask = missing_account & df['Source'].str.contains(keyword, case=False, na=False)
                 df.loc[mask, 'Account'] = account_name
     else:
-        print("'Account' column already exists.")
+        print("Every transaction already has an 'Account'.")
 
-    # --- 2. Add 'Payee' Column (if it doesn't exist) ---
-    if 'Payee' not in df.columns:
-        print("Adding 'Payee' column with best-guess names...")
-        df['Payee'] = df['Description'].apply(get_clean_payee)
+    # --- 2. Fill in 'Payee' with best-guess names (where it is blank) ---
+    missing_payee = df['Payee'].isna() | (df['Payee'] == '')
+    if missing_payee.any():
+        print(f"Adding best-guess 'Payee' names to {missing_payee.sum()} transaction(s)...")
+        df.loc[missing_payee, 'Payee'] = df.loc[missing_payee, 'Description'].apply(get_clean_payee)
     else:
-        print("'Payee' column already exists.")
+        print("Every transaction already has a 'Payee'.")
 
-    # --- 3. Add Flag Columns (if they don't exist) ---
-    if 'Is_Tax_Deductible' not in df.columns:
-        print("Adding 'Is_Tax_Deductible' column...")
-        df['Is_Tax_Deductible'] = False
-    if 'Is_Reimbursable' not in df.columns:
-        print("Adding 'Is_Reimbursable' column...")
-        df['Is_Reimbursable'] = False
+    # --- 3. Flag Columns ---
+    # 'Is_Tax_Deductible' and 'Is_Reimbursable' come from the ledger store as False where unset.
 
-    # --- Save the Upgraded File ---
-    df.to_csv(MASTER_FILE_PATH, index=False)
+    # --- Save the Upgraded Ledger ---
+    save_ledger(df, MASTER_FILE_PATH)
     
-    print("\n✅ Upgrade complete! Your master_transactions.csv is now using the new data model.")
+    print("\n✅ Upgrade complete! Your master ledger is now using the new data model.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
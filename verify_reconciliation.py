@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+from ledger_store import load_ledger, ledger_exists, ledger_cents
 
 # --- Configuration ---
 MASTER_FILE_PATH = "master_transactions.csv"
@@ -12,12 +13,12 @@ def verify_reconciliation_links():
     os.system('cls' if os.name == 'nt' else 'clear')
     print("--- Reconciliation Link Verifier ---")
 
-    if not os.path.exists(MASTER_FILE_PATH):
+    if not ledger_exists(MASTER_FILE_PATH):
         print(f"❌ ERROR: Master file not found at '{MASTER_FILE_PATH}'.")
         return
 
     try:
-        df = pd.read_csv(MASTER_FILE_PATH, dtype={'ReconciliationID': 'object'})
+        df = load_ledger(MASTER_FILE_PATH, columns=['Date', 'Account', 'Description', 'Amount', 'ReconciliationID'])
 
         if 'ReconciliationID' not in df.columns or df['ReconciliationID'].isna().all():
             print("\n✅ No reconciliation links found to verify.")
@@ -42,7 +43,7 @@ def verify_reconciliation_links():
                 continue
 
             # Check 2: Ensure the amounts in the group sum to zero
-            if not abs(group['Amount'].sum()) < 0.01:
+            if ledger_cents(group).sum() != 0:
                 print(f"\n❌ ERROR: Group '{rec_id}' does not sum to zero. Net amount is {group['Amount'].sum():.2f}.")
                 print(group[['Date', 'Account', 'Description', 'Amount']].to_string())
                 errors_found += 1